@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:42:17 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+# %%
+'''
+回放时维护的整簿挂单时长直方图：age_hist[field, side, amt_bucket, age_bucket]，int64，读取为 O(1)。
+
+age_bounds 为升序的挂单时长边界（毫秒，配置 age_bucket_bounds 以秒为单位），
+age_bucket = 满足 age >= age_bounds[k] 的 k 的个数，因此“最近 age_bounds[k] 内的挂单（age < age_bounds[k]）”
+即 age_bucket <= k，最后一桶为挂单时长不小于 age_bounds[-1] 的订单。
+挂单时长 age = ts - on_ts_org；开启 age_bucket_exclude_noon 时同 get_residue_time 扣除午休。
+amt_bucket 与 core.side_aggregates 相同，为 on_amt_org 在 agg_thresholds 中所在的区间，未配置阈值时只有一个区间。
+
+各字段为已挂单订单（[0, n_active) 前缀）之和，金额未除以 10000：
+    COUNT       订单数（含已全部撤单/成交的订单）
+    REMAIN_QTY  on_qty_remain
+    REMAIN_AMT  on_px * on_qty_remain
+    ORG_AMT     on_px * on_qty_org
+
+有效订单按首次挂单顺序排列，on_ts_org 非降，挂单时长不足某一边界的订单恰为后缀：age_start[seg, k] 为
+首个 age < age_bounds[k] 的订单下标。时钟推进到目标时间点时 age_start 只会前移，越过的订单从第 k 桶移入第 k + 1 桶，
+每步代价取决于越过边界的订单数，与订单总数无关；订单事件前后按其所在时长桶减去、加回贡献，所在桶由 age_start 得出。
+
+扣除午休时，13:00 之后上午挂单的时长整体少 90 分钟，与下午挂单不再同序：
+时钟首次到达 13:00 时（age_clock[NOON_PASSED] 置 1）以 11:31 为界把订单分为两段，age_clock[SPLIT] 为分界下标
+（此前为 n_orders，即只有一段），各段分别维护 age_start 并全量重建一次。
+age_clock 随 age_hist 一同发布给指标，读取 age_clock[EXCLUDE_NOON] 即可得知直方图的时长口径。
+age_bounds 为空（未配置 age_bucket_bounds）时 age_hist 的时长桶维为 0，不做任何维护。
+'''
+COUNT, REMAIN_QTY, REMAIN_AMT, ORG_AMT = range(4)
+AGE_BUCKET_FIELDS = ('count', 'remain_qty', 'remain_amt', 'org_amt')
+SPLIT, EXCLUDE_NOON, NOON_PASSED = range(3)
+
+# 同 utils.assist_calc.get_residue_time
+MORNING_END = 11 * 60 + 30  # 上午结束时间：11:30，单位分钟
+AFTERNOON_START = 13 * 60  # 下午开始时间：13:00，单位分钟
+NON_TRADING_INTERVAL = 90 * 60 * 1000  # 非交易时段90分钟，单位毫秒
+DAY_MS = 1440 * 60000
+
+
+def init_age_buckets(age_bucket_bounds, agg_thresholds, n_orders, exclude_noon=False):
+    age_bounds = np.sort(np.asarray(age_bucket_bounds if age_bucket_bounds is not None else [], dtype=np.float64))
+    age_bounds = np.round(age_bounds * 1000).astype(np.int64)
+    n_age_buckets = len(age_bounds) + 1 if len(age_bounds) > 0 else 0
+    age_hist = np.zeros((len(AGE_BUCKET_FIELDS), 2, len(agg_thresholds) + 1, n_age_buckets), dtype=np.int64)
+    age_start = np.zeros((2, len(age_bounds)), dtype=np.int64)
+    age_start[1] = n_orders  # 分段前第二段为空
+    age_clock = np.array([n_orders, int(exclude_noon), 0], dtype=np.int64)
+    return age_bounds, age_start, age_clock, age_hist
+
+
+# %% kernels
+@njit(types.int64(types.int64, types.int64, types.boolean), cache=True)
+def get_order_age(ts, ts_org, exclude_noon):
+    # 同 get_residue_time：13:00 之后计算 11:30 及之前挂单的时长时扣除午休，不小于 0
+    age = ts - ts_org
+    if exclude_noon and (ts // 60000) % 1440 >= AFTERNOON_START and (ts_org // 60000) % 1440 <= MORNING_END:
+        age = max(0, age - NON_TRADING_INTERVAL)
+    return age
+
+
+@njit(types.int64(types.int32, types.int64[:, :], types.int64[:]), cache=True)
+def get_age_bucket(no_idx, age_start, age_clock):
+    seg = 1 if no_idx >= age_clock[SPLIT] else 0
+    bucket = 0
+    for k in range(age_start.shape[1]):
+        if no_idx < age_start[seg, k]:
+            bucket += 1
+    return bucket
+
+
+@njit(types.void(
+    types.int32,  # no_idx
+    types.int64,  # sign
+    types.int64,  # bucket
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_org
+    types.int64[:],  # on_qty_remain
+    types.int32[:],  # on_agg_bucket
+    types.int64[:, :, :, :],  # age_hist
+    ), cache=True)
+def add_age_contribution(no_idx, sign, bucket, on_side, on_px, on_qty_org, on_qty_remain, on_agg_bucket, age_hist):
+    side = on_side[no_idx]
+    amt_bucket = on_agg_bucket[no_idx]
+    age_hist[COUNT, side, amt_bucket, bucket] += sign
+    age_hist[REMAIN_QTY, side, amt_bucket, bucket] += sign * on_qty_remain[no_idx]
+    age_hist[REMAIN_AMT, side, amt_bucket, bucket] += sign * on_px[no_idx] * on_qty_remain[no_idx]
+    age_hist[ORG_AMT, side, amt_bucket, bucket] += sign * on_px[no_idx] * on_qty_org[no_idx]
+
+
+@njit(types.void(
+    types.int32,  # no_idx
+    types.int64,  # sign
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_org
+    types.int64[:],  # on_qty_remain
+    types.float64[:],  # on_amt_org
+    types.float64[:],  # agg_thresholds
+    types.int32[:],  # on_agg_bucket
+    types.int64[:, :],  # age_start
+    types.int64[:],  # age_clock
+    types.int64[:, :, :, :],  # age_hist
+    ), cache=True)
+def update_age_buckets(no_idx, sign, on_side, on_px, on_qty_org, on_qty_remain, on_amt_org, agg_thresholds,
+                       on_agg_bucket, age_start, age_clock, age_hist):
+    """sign 为 -1 时从所在时长桶减去订单 no_idx 的贡献，为 1 时按其当前金额区间加回"""
+    if sign > 0:
+        on_agg_bucket[no_idx] = np.searchsorted(agg_thresholds, on_amt_org[no_idx], side='right')
+    add_age_contribution(no_idx, sign, get_age_bucket(no_idx, age_start, age_clock),
+                         on_side, on_px, on_qty_org, on_qty_remain, on_agg_bucket, age_hist)
+
+
+@njit(types.void(
+    types.int64,  # ts
+    types.int64,  # n_active
+    types.int64[:],  # on_ts_org
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_org
+    types.int64[:],  # on_qty_remain
+    types.int32[:],  # on_agg_bucket
+    types.int64[:],  # age_bounds
+    types.int64[:, :],  # age_start
+    types.int64[:],  # age_clock
+    types.int64[:, :, :, :],  # age_hist
+    ), cache=True)
+def advance_age_buckets(ts, n_active, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, on_agg_bucket,
+                        age_bounds, age_start, age_clock, age_hist):
+    """把时长桶推进到目标时间点 ts：各边界的 age_start 前移，越过边界的订单移入下一桶"""
+    if age_hist.shape[3] == 0:
+        return
+    exclude_noon = age_clock[EXCLUDE_NOON] != 0
+    if exclude_noon and age_clock[NOON_PASSED] == 0 and (ts // 60000) % 1440 >= AFTERNOON_START:
+        # 首次到达 13:00：上午挂单时长回退，分段后全部订单从第 0 桶重新推进
+        noon_ts = ts - ts % DAY_MS + (MORNING_END + 1) * 60000
+        split = np.searchsorted(on_ts_org[:n_active], noon_ts, side='left')
+        age_clock[SPLIT] = split
+        age_clock[NOON_PASSED] = 1
+        age_start[0, :] = 0
+        age_start[1, :] = split
+        age_hist[:] = 0
+        for i in range(n_active):
+            add_age_contribution(np.int32(i), 1, 0, on_side, on_px, on_qty_org, on_qty_remain, on_agg_bucket, age_hist)
+
+    split = age_clock[SPLIT]
+    for seg in range(2):
+        end = min(split, n_active) if seg == 0 else n_active
+        # 边界按升序推进：越过第 k 个边界的订单此前已越过更小的边界，恰在第 k 桶
+        for k in range(len(age_bounds)):
+            i = age_start[seg, k]
+            while i < end and get_order_age(ts, on_ts_org[i], exclude_noon) >= age_bounds[k]:
+                add_age_contribution(np.int32(i), -1, k, on_side, on_px, on_qty_org, on_qty_remain,
+                                     on_agg_bucket, age_hist)
+                add_age_contribution(np.int32(i), 1, k + 1, on_side, on_px, on_qty_org, on_qty_remain,
+                                     on_agg_bucket, age_hist)
+                i += 1
+            age_start[seg, k] = i
+
+
+@njit(types.void(
+    types.int64,  # ts
+    types.int64,  # n_active
+    types.int64[:],  # on_ts_org
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_org
+    types.int64[:],  # on_qty_remain
+    types.float64[:],  # on_amt_org
+    types.float64[:],  # agg_thresholds
+    types.int64[:],  # age_bounds
+    types.boolean,  # exclude_noon
+    types.int64[:, :, :, :],  # out
+    ), cache=True)
+def recompute_age_buckets(ts, n_active, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, on_amt_org,
+                          agg_thresholds, age_bounds, exclude_noon, out):
+    """对 [0, n_active) 按目标时间点 ts 全量重算 age_hist，用于校验增量维护的结果"""
+    out[:] = 0
+    for i in range(n_active):
+        side = on_side[i]
+        amt_bucket = np.searchsorted(agg_thresholds, on_amt_org[i], side='right')
+        bucket = np.searchsorted(age_bounds, get_order_age(ts, on_ts_org[i], exclude_noon), side='right')
+        out[COUNT, side, amt_bucket, bucket] += 1
+        out[REMAIN_QTY, side, amt_bucket, bucket] += on_qty_remain[i]
+        out[REMAIN_AMT, side, amt_bucket, bucket] += on_px[i] * on_qty_remain[i]
+        out[ORG_AMT, side, amt_bucket, bucket] += on_px[i] * on_qty_org[i]
+
+
+@njit(types.int64(types.int64[:], types.float64), cache=True)
+def get_age_bound_idx(age_bounds, seconds):
+    """
+    挂单时长 < seconds 秒的订单即 age_bucket <= 返回值的订单，age_hist[field, side, :, :返回值 + 1] 求和即可；
+    seconds 须为 age_bucket_bounds 之一，否则无法由分桶直方图得到，返回 -1。
+    """
+    bound = np.int64(np.round(seconds * 1000))
+    k = np.searchsorted(age_bounds, bound, side='left')
+    if k >= len(age_bounds) or age_bounds[k] != bound:
+        return -1
+    return k
@@ -20,7 +20,7 @@ import gc
 # %% import self_defined
 from core.go_through_book import GoThroughBookStepper
 from utils.speedutils import timeit
-from indicators.chatgpt import *
+from indicators.registry import load_indicator, validate_indicator_param
 from core.plot_lob import visualize_order_book
 
 
@@ -34,8 +34,8 @@ class GroupGenerate(GoThroughBookStepper):
         self.date = date
         
         self._init_dataset()
-        self._get_ind_funcs()
         self._preprocess_param()
+        self._get_ind_funcs()
     
     def _init_indicator_related(self):
         factor_idx_mapping = self.param['factor_idx_mapping']
@@ -47,11 +47,17 @@ class GroupGenerate(GoThroughBookStepper):
         pass
     
     def _init_curr_dataset(self):
+        # 每个 (ind_cate, view) 在 recorded_dataset 中占一段连续列，按 (因子, Bid/Ask) 排列，
+        # 取为 (n_ts, count, 2) 的视图，kernel 直接写入当步的 (count, 2) 切片，无需再逐个拷贝
         indxview_count = self.param['indxview_count']
+        factor_idx_mapping = self.param['factor_idx_mapping']
+        n_ts = len(self.recorded_dataset)
         
         self.curr_dataset = {}
-        for indxview, count in indxview_count.items():
-            self.curr_dataset[indxview] = np.full((count, 2), fill_value=np.nan, dtype=np.float64)
+        for (ind_cate, view_name), count in indxview_count.items():
+            start = factor_idx_mapping[(ind_cate, view_name, 0, 0)]
+            self.curr_dataset[(ind_cate, view_name)] = (
+                self.recorded_dataset[:, start:start+count*2].reshape(n_ts, count, 2))
     
     def _init_dataset(self):
         self.dataset = {}
@@ -68,27 +74,23 @@ class GroupGenerate(GoThroughBookStepper):
     def _get_ind_funcs(self):
         ind_cates = self.param['ind_cates']
 
+        # 从注册表按名字加载，只 import 并编译本次配置用到的 ind_cates
         self.ind_funcs = {}
         for ind_cate in ind_cates:
-            self.ind_funcs[ind_cate] = globals()[ind_cate]
+            self.ind_funcs[ind_cate] = load_indicator(ind_cate, self.param[ind_cate].get('module'))
       
     def _preprocess_param(self):
         ind_cates = self.param['ind_cates']
         
         for ind_cate in ind_cates:
             ind_param = self.param[ind_cate]
-            inputs = ind_param['inputs']
             param_dict = ind_param.get('param', {})
-            for ipt_name in inputs:
-                assert ipt_name in self.dataset or ipt_name in param_dict or ipt_name == 'curr_dataset', ipt_name
-                assert not (ipt_name in self.dataset and ipt_name in param_dict), ipt_name
+            validate_indicator_param(ind_cate, ind_param, self.dataset)
             ind_param['param'] = {k: np.array(v, dtype=np.float64) for k, v in param_dict.items()}
 
     def run(self):
         ind_cates = self.param['ind_cates']
-        indxview_count = self.param['indxview_count']
         view_infos = self.param['view_infos']
-        factor_idx_mapping = self.param['factor_idx_mapping']
 
         for ts_idx, ts in self.stepper:
             ts_dataset = self._update_valid_data(ts)
@@ -103,15 +105,10 @@ class GroupGenerate(GoThroughBookStepper):
                 
                 for ind_cate in ind_cates:
                     ind_func = self.ind_funcs[ind_cate]
-                    input_dict = self._fill_ind_x_view_input(ind_cate, view_name, view_dataset)
-                    indxview_len = indxview_count[(ind_cate, view_name)]
+                    input_dict = self._fill_ind_x_view_input(ts_idx, ind_cate, view_name, view_dataset)
 
                     try:
                         ind_func(*input_dict.values())
-                        for idx in range(indxview_len):
-                            for side in (0, 1):
-                                self.recorded_dataset[ts_idx, factor_idx_mapping[(ind_cate, view_name, idx, side)]] = (
-                                    self.curr_dataset[(ind_cate, view_name)][idx, side])
                     except:
                         print(ind_func.__name__)
                         traceback.print_exc()
@@ -129,7 +126,7 @@ class GroupGenerate(GoThroughBookStepper):
                 dataset[col] = self.dataset[col]
         return dataset
 
-    def _fill_ind_x_view_input(self, ind_cate, view_name, view_dataset):
+    def _fill_ind_x_view_input(self, ts_idx, ind_cate, view_name, view_dataset):
         input_dict = {}
         ind_param = self.param[ind_cate]
         inputs = ind_param['inputs']
@@ -141,7 +138,7 @@ class GroupGenerate(GoThroughBookStepper):
             elif ipt_name in param_dict:
                 input_dict[ipt_name] = param_dict[ipt_name]
             elif ipt_name == 'curr_dataset':
-                input_dict[ipt_name] = self.curr_dataset[(ind_cate, view_name)]
+                input_dict[ipt_name] = self.curr_dataset[(ind_cate, view_name)][ts_idx]
         return input_dict
              
     def final(self):
@@ -15,18 +15,33 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 import numpy as np
 import traceback
 import gc
+from numba.core.errors import NumbaError
+from numba.core.dispatcher import Dispatcher
 
 
 # %% import self_defined
-from core.go_through_book_full import GoThroughBookStepper
+from core.go_through_book_full import GoThroughBookStepper, TRACKED_FIELDS
+from core.book_snapshot import get_snapshot_dir, SnapshotBook
+from core.loop import FixedTimeIntervalLoop
+from core.step_plan import StepPlan
+from core.predicates import PredicateMemo, get_trade_type_flags, PREDICATE_KIND_INPUTS
+from core.sorted_stats import SortedStats, SORTED_STATS_INPUTS
+from core.side_moments import SIDE_MOMENT_DRIFT_TOL
 from utils.speedutils import timeit
-from indicators.chatgpt import *
+from indicators.registry import load_indicator, validate_indicator_param
 # from core.plot_lob import visualize_order_book
 
 
 # %%
+# 回放维护的整簿结构：不随视图切分，只能在不切分视图的配置中作为指标输入，否则各视图得到相同的值
+WHOLE_BOOK_INPUTS = ('side_agg', 'ladder_tree', 'top_levels', 'side_moments', 'age_hist')
+
+
 class GroupGenerate(GoThroughBookStepper):
     
+    # 买一或卖一为 0 时是否跳过各视图
+    requires_best_px = False
+    
     def __init__(self, symbol, date, order_data, trade_data, param):
         super().__init__(symbol, date, order_data, trade_data, param)
         
@@ -34,8 +49,50 @@ class GroupGenerate(GoThroughBookStepper):
         self.date = date
         
         self._init_dataset()
+        self._init_view_layout()
+        self._preprocess_param()
         self._get_ind_funcs()
+        
+    def _get_replay_fields(self, param):
+        # lean_replay: 回放只维护本次配置的指标输入与视图谓词用到的可选逐单列，其余列不写入且不参与视图切分
+        if not param.get('lean_replay', False):
+            return None
+        return self._get_required_fields(param)
+    
+    def _get_required_fields(self, param):
+        """指标输入及视图谓词读取的逐单列；重写了 _cut_view 却未声明谓词的子类无从得知，返回 None（全部维护）"""
+        if '_get_view_predicates' not in vars(self._get_cut_view_owner()):
+            return None
+        fields = {ipt_name for ind_cate in param['ind_cates'] for ipt_name in param[ind_cate]['inputs']}
+        for view_info in param['view_infos'].values():
+            for kind, _ in self._get_view_predicates(view_info):
+                fields.update(PREDICATE_KIND_INPUTS[kind])
+        return fields
+        
+    @classmethod
+    def attach(cls, book, date, param):
+        """
+        挂接到已在回放的订单簿 book 上，共享其订单/盘口数组而不再单独回放，
+        由 MultiVersionGenerate 每步调用 _process_one_ts。
+        """
+        self = cls.__new__(cls)
+        self.__dict__.update(vars(book))
+        self.param = param
+        self.symbol = book.symbol
+        self.date = date
+        
+        self._init_indicator_related()
+        self._init_dataset()
+        self._init_view_layout()
         self._preprocess_param()
+        self._get_ind_funcs()
+        return self
+    
+    @classmethod
+    def from_snapshot(cls, symbol, date, param):
+        """在 param['snapshot_dir'] 下已落盘的快照上计算指标，不回放事件"""
+        snapshot_dir = get_snapshot_dir(param['snapshot_dir'], symbol, date)
+        return cls.attach(SnapshotBook(snapshot_dir, symbol), date, param)
     
     def _init_indicator_related(self):
         factor_idx_mapping = self.param['factor_idx_mapping']
@@ -47,11 +104,17 @@ class GroupGenerate(GoThroughBookStepper):
         pass
     
     def _init_curr_dataset(self):
+        # 每个 (ind_cate, view) 在 recorded_dataset 中占一段连续列，按 (因子, Bid/Ask) 排列，
+        # 取为 (n_ts, count, 2) 的视图，kernel 直接写入当步的 (count, 2) 切片，无需再逐个拷贝
         indxview_count = self.param['indxview_count']
+        factor_idx_mapping = self.param['factor_idx_mapping']
+        n_ts = len(self.recorded_dataset)
         
         self.curr_dataset = {}
-        for indxview, count in indxview_count.items():
-            self.curr_dataset[indxview] = np.full((count, 2), fill_value=np.nan, dtype=np.float64)
+        for (ind_cate, view_name), count in indxview_count.items():
+            start = factor_idx_mapping[(ind_cate, view_name, 0, 0)]
+            self.curr_dataset[(ind_cate, view_name)] = (
+                self.recorded_dataset[:, start:start+count*2].reshape(n_ts, count, 2))
     
     def _init_dataset(self):
         self.dataset = {}
@@ -74,68 +137,187 @@ class GroupGenerate(GoThroughBookStepper):
         self.dataset['on_qty_t_n'] = self.on_qty_t_n  # 集合竞价成交量
         self.dataset['on_amt_t_n'] = self.on_amt_t_n  # 集合竞价成交金额
         
+        # 引擎维护的金额列：on_px * on_qty_org / 10000 与 on_px * on_qty_remain / 10000
+        self.dataset['on_amt_org'] = self.on_amt_org  # 原始挂单金额
+        self.dataset['on_amt_remain'] = self.on_amt_remain  # 剩余挂单金额
+        
         self.dataset['best_px'] = self.best_px_post_match
+        if getattr(self, 'side_agg', np.zeros((0, 0, 0))).shape[2] > 0:
+            # 整簿分方向、分金额区间的累计量（见 core.side_aggregates），不随视图切分
+            self.dataset['side_agg'] = self.side_agg
+            self.dataset['agg_thresholds'] = self.agg_thresholds
+        if getattr(self, 'side_moments', np.zeros((0, 0, 0))).shape[2] > 0:
+            # 整簿分方向幂和（见 core.side_moments），不随视图切分
+            self.dataset['side_moments'] = self.side_moments
+        if getattr(self, 'age_hist', np.zeros((0, 0, 0, 0))).shape[3] > 0:
+            # 整簿分方向、分金额区间的挂单时长直方图（见 core.age_buckets），回放在每个目标时间点推进，不随视图切分
+            self.dataset['age_hist'] = self.age_hist
+            self.dataset['age_bounds'] = self.age_bounds
+            self.dataset['age_clock'] = self.age_clock  # age_clock[EXCLUDE_NOON] 为挂单时长口径
+            self.dataset['agg_thresholds'] = self.agg_thresholds
+        if getattr(self, 'ladder_tree', np.zeros((0, 0, 0))).shape[2] > 0:
+            # 档位树状数组与价格档位，价格区间深度用 core.price_ladder.get_band_depth 查询，不随视图切分
+            self.dataset['ladder_tree'] = self.ladder_tree
+            self.dataset['ladder_prices'] = self.unique_prices
+        if getattr(self, 'top_levels', np.zeros((0, 0, 0))).shape[2] > 0:
+            # 盘口前 K 档（价格、挂单量、订单数），回放在每个目标时间点更新，见 core.price_ladder.update_top_levels
+            self.dataset['top_levels'] = self.top_levels
         self.dataset['ts'] = 0
         
         self.list_to_check_valid = ['on_ts_org', 'on_ts_d', 'on_ts_t', 'on_side', 'on_px', 
                                     'on_qty_org', 'on_qty_remain', 'on_qty_d', 'on_qty_t', 'on_amt_t',
                                     'on_qty_t_a', 'on_amt_t_a', 'on_qty_t_p', 'on_amt_t_p', 
-                                    'on_qty_t_n', 'on_amt_t_n']  # 修改：新增主动被动集合竞价字段
+                                    'on_qty_t_n', 'on_amt_t_n',  # 修改：新增主动被动集合竞价字段
+                                    'on_amt_org', 'on_amt_remain']
+        # lean_replay 未维护的列长度为 0，保留在 dataset 中但不按有效订单切分
+        tracked_fields = getattr(self, 'tracked_fields', TRACKED_FIELDS)
+        self.list_to_check_valid = [col for col in self.list_to_check_valid 
+                                    if col not in TRACKED_FIELDS or col in tracked_fields]
+   
+    def _init_view_layout(self):
+        # 视图由 _get_view_predicates 声明为谓词的“与”时，各谓词每步只算一次，逐步计算与编译的执行计划
+        # 共用同一谓词缓存（见 core.predicates）；重写了 _cut_view 却未声明谓词的子类不经缓存
+        self.memo = None
+        self.price_sorted = False
+        # resting_views: 只在剩余量 > 0 的订单上切分视图、计算指标，有效订单取自回放时增量维护的集合，
+        # 每步代价随当前盘口深度增长；已全部撤单/成交的订单不再出现在视图中，且集合内不保持到达顺序，默认关闭
+        self.resting = self.param.get('resting_views', False) and hasattr(self, 'rest_idx')
+        if '_get_view_predicates' not in vars(self._get_cut_view_owner()):
+            return
+        # price_sorted_views: 每步把有效订单按 (档位, 方向) 重排一次，价格区间视图即为连续切片，各视图共用这次重排；
+        # 视图内订单不再按到达顺序排列，浮点求和顺序随之改变，默认关闭
+        self.price_sorted = self.param.get('price_sorted_views', False) and hasattr(self, 'px_perm')
+        view_predicates = {view_name: self._get_view_predicates(view_info) 
+                           for view_name, view_info in self.param['view_infos'].items()}
+        ladder = (self.unique_prices, self.level_offsets) if self.price_sorted else (None, None)
+        self.memo = PredicateMemo(view_predicates, len(self.on_px), self.requires_best_px, *ladder)
+        
+    def _get_cut_view_owner(self):
+        return next(klass for klass in type(self).__mro__ if '_cut_view' in vars(klass))
    
     def _get_ind_funcs(self):
         ind_cates = self.param['ind_cates']
 
+        # 从注册表按名字加载，只 import 并编译本次配置用到的 ind_cates
         self.ind_funcs = {}
         for ind_cate in ind_cates:
-            self.ind_funcs[ind_cate] = globals()[ind_cate]
+            self.ind_funcs[ind_cate] = load_indicator(ind_cate, self.param[ind_cate].get('module'))
       
     def _preprocess_param(self):
         ind_cates = self.param['ind_cates']
         
         for ind_cate in ind_cates:
             ind_param = self.param[ind_cate]
-            inputs = ind_param['inputs']
             param_dict = ind_param.get('param', {})
-            for ipt_name in inputs:
-                assert ipt_name in self.dataset or ipt_name in param_dict or ipt_name == 'curr_dataset', ipt_name
-                assert not (ipt_name in self.dataset and ipt_name in param_dict), ipt_name
+            validate_indicator_param(ind_cate, ind_param, [*self.dataset, *SORTED_STATS_INPUTS])
             ind_param['param'] = {k: np.array(v, dtype=np.float64) for k, v in param_dict.items()}
+        self._check_whole_book_inputs()
+            
+        # 有指标以排序统计量为输入时，每步每个视图排序一次供各指标共用（见 core.sorted_stats）
+        uses_sorted_stats = any(ipt_name in SORTED_STATS_INPUTS 
+                                for ind_cate in ind_cates for ipt_name in self.param[ind_cate]['inputs'])
+        self.sorted_stats = SortedStats(len(self.on_px)) if uses_sorted_stats else None
 
-    def run(self):
-        ind_cates = self.param['ind_cates']
-        indxview_count = self.param['indxview_count']
+    def _check_whole_book_inputs(self):
+        # 只有一个且未切分的视图时整簿结构才是该视图的值；重写了 _cut_view 却未声明谓词的子类视为切分
         view_infos = self.param['view_infos']
-        factor_idx_mapping = self.param['factor_idx_mapping']
+        is_cut = (len(view_infos) > 1 
+                  or '_get_view_predicates' not in vars(self._get_cut_view_owner())
+                  or any(self._get_view_predicates(view_info) for view_info in view_infos.values()))
+        if not is_cut:
+            return
+        for ind_cate in self.param['ind_cates']:
+            whole_book_inputs = [ipt_name for ipt_name in self.param[ind_cate]['inputs'] if ipt_name in WHOLE_BOOK_INPUTS]
+            if whole_book_inputs:
+                raise ValueError(f'{ind_cate}: {whole_book_inputs} cover the whole book and are not cut by view, '
+                                 f'compute it with GroupGenerate and no shared_param instead of {type(self).__name__} '
+                                 f'with views {list(view_infos)}')
 
+    def run(self):
+        if self._can_use_step_plan():
+            return self._run_step_plan()
+        return self._run_stepwise()
+    
+    def _run_stepwise(self):
         for ts_idx, ts in self.stepper:
-            ts_dataset = self._update_valid_data(ts)
-            # visualize_order_book(ts_dataset)
-            # if ts_idx == 41:
-            #     breakpoint()
-            for view_name, view_info in view_infos.items():
-                view_dataset, status = self._cut_view(view_name, view_info, ts_dataset)
-                
-                if status != 0:
-                    continue
-                
-                for ind_cate in ind_cates:
-                    ind_func = self.ind_funcs[ind_cate]
-                    input_dict = self._fill_ind_x_view_input(ind_cate, view_name, view_dataset)
-                    indxview_len = indxview_count[(ind_cate, view_name)]
-
-                    try:
-                        ind_func(*input_dict.values())
-                        for idx in range(indxview_len):
-                            for side in (0, 1):
-                                self.recorded_dataset[ts_idx, factor_idx_mapping[(ind_cate, view_name, idx, side)]] = (
-                                    self.curr_dataset[(ind_cate, view_name)][idx, side])
-                    except:
-                        print(ind_func.__name__)
-                        traceback.print_exc()
+            self._process_one_ts(ts_idx, ts)
+        return self.final()
+    
+    def _can_use_step_plan(self):
+        # 快照录制/载入与累计量校验需逐步回到 Python；未声明视图谓词的子类也逐步计算
+        if not self.param.get('step_plan', True) or type(self.stepper) is not FixedTimeIntervalLoop:
+            return False
+        if any(self.param.get(key, 0) for key in ('side_aggregate_check_interval', 'side_moment_check_interval', 
+                                                  'age_bucket_check_interval')):
+            return False
+        # 编译的执行计划只能调用 njit kernel，有纯 Python 指标时直接逐步计算
+        if not all(isinstance(ind_func, Dispatcher) for ind_func in self.ind_funcs.values()):
+            return False
+        return self.memo is not None
+    
+    def _run_step_plan(self):
+        try:
+            plan = StepPlan(self, self.memo)
+            plan.compile()
+        except (NumbaError, ValueError, OSError):
+            traceback.print_exc()
+            print(f'{self.symbol} {self.date}: step plan unavailable, fall back to stepwise run')
+            return self._run_stepwise()
+        
+        self.stepper.start_idx, self.stepper.ts_idx = plan.run()
+        plan.report_errors()
         return self.final()
+    
+    def _process_one_ts(self, ts_idx, ts):
+        ind_cates = self.param['ind_cates']
+        view_infos = self.param['view_infos']
+        
+        check_interval = self.param.get('side_aggregate_check_interval', 0)
+        if check_interval and ts_idx % check_interval == 0:
+            self.check_side_aggregates()
+        moment_interval = self.param.get('side_moment_check_interval', 0)
+        if moment_interval and ts_idx % moment_interval == 0:
+            # 幂和为浮点增量维护：定期全量重算并重置，漂移超过容差时提示
+            drift = self.check_side_moments()
+            if drift > self.param.get('side_moment_drift_tol', SIDE_MOMENT_DRIFT_TOL):
+                print(f'{self.symbol} {self.date}: side moments drifted by {drift:.3e} at step {ts_idx}, reset')
+        age_interval = self.param.get('age_bucket_check_interval', 0)
+        if age_interval and ts_idx % age_interval == 0:
+            self.check_age_buckets(ts)
+        ts_dataset = self._update_valid_data(ts)
+        # visualize_order_book(ts_dataset)
+        # if ts_idx == 41:
+        #     breakpoint()
+        for view_name, view_info in view_infos.items():
+            view_dataset, status = self._cut_view(view_name, view_info, ts_dataset)
+            if status != 0:
+                continue
+            if self.sorted_stats is not None:
+                self.sorted_stats.update(view_dataset)
+            
+            for ind_cate in ind_cates:
+                ind_func = self.ind_funcs[ind_cate]
+                input_dict = self._fill_ind_x_view_input(ts_idx, ind_cate, view_name, view_dataset)
+
+                try:
+                    ind_func(*input_dict.values())
+                except:
+                    # kernel 直接写入 recorded_dataset，中途出错时丢弃已写入的部分，该步保持 NaN
+                    self.curr_dataset[(ind_cate, view_name)][ts_idx] = np.nan
+                    print(ind_func.__name__)
+                    traceback.print_exc()
 
     def _update_valid_data(self, ts):
-        valid_idx = (self.on_side != -1) & (self.on_ts_org > 0) #& (self.on_qty_remain > 0)
+        # 订单按首次挂单顺序排列，有效订单即 [0, n_active) 前缀，直接取视图不拷贝
+        n_active = self.n_active[0]
+        if self.price_sorted:
+            # 按价格分组重排一次，之后各价格区间视图直接切片
+            self.update_price_index(self.resting)
+            valid_idx = self.px_perm[:self.n_resting[0] if self.resting else n_active]
+        elif self.resting:
+            valid_idx = self.rest_idx[:self.n_resting[0]]
+        else:
+            valid_idx = slice(0, n_active)
         dataset = {}
         for col in self.dataset:
             if col in self.list_to_check_valid:
@@ -144,9 +326,11 @@ class GroupGenerate(GoThroughBookStepper):
                 dataset[col] = ts
             else:
                 dataset[col] = self.dataset[col]
+        if self.memo is not None:
+            self.memo.evaluate(dataset)
         return dataset
 
-    def _fill_ind_x_view_input(self, ind_cate, view_name, view_dataset):
+    def _fill_ind_x_view_input(self, ts_idx, ind_cate, view_name, view_dataset):
         input_dict = {}
         ind_param = self.param[ind_cate]
         inputs = ind_param['inputs']
@@ -158,7 +342,7 @@ class GroupGenerate(GoThroughBookStepper):
             elif ipt_name in param_dict:
                 input_dict[ipt_name] = param_dict[ipt_name]
             elif ipt_name == 'curr_dataset':
-                input_dict[ipt_name] = self.curr_dataset[(ind_cate, view_name)]
+                input_dict[ipt_name] = self.curr_dataset[(ind_cate, view_name)][ts_idx]
         return input_dict
              
     def final(self):
@@ -169,171 +353,153 @@ class GroupGenerate(GoThroughBookStepper):
     def _cut_view(self, view_name, view_info, dataset):
         return dataset, 0
     
+    def _get_view_predicates(self, view_info):
+        """视图的谓词列表 [(kind, arg), ...]，各谓词取“与”，见 core.predicates"""
+        return []
     
-# %% cut price range
-class GGCutPriceRange(GroupGenerate):
-    # @timeit
-    def _cut_view(self, view_name, view_info, ts_dataset):
-        price_range = view_info['price_range']
-        
-        best_px = ts_dataset['best_px']
-        on_px = ts_dataset['on_px']
-        
-        bid1 = best_px[0]
-        ask1 = best_px[1]
-        
-        if bid1 == 0 or ask1 == 0:
-            return None, 1
-        
-        mid_price = (bid1 + ask1) / 2
-        lower_bound = mid_price * (1 - price_range)
-        upper_bound = mid_price * (1 + price_range)
-        
-        idx_in_price_range = (on_px >= lower_bound) & (on_px <= upper_bound)
-        # print(np.sum(idx_in_price_range))
+    def _cut_view_by_predicates(self, view_name, ts_dataset):
+        status, start, end, mask = self.memo.select(view_name, ts_dataset['best_px'], len(ts_dataset['on_px']))
+        if status != 0:
+            return None, status
         
         view_dataset = {}
         for col in ts_dataset:
             if col in self.list_to_check_valid:
-                view_dataset[col] = ts_dataset[col][idx_in_price_range]
+                view_dataset[col] = ts_dataset[col][start:end] if len(mask) == 0 else ts_dataset[col][start:end][mask]
             else:
                 view_dataset[col] = ts_dataset[col]
         return view_dataset, 0
     
+    
+# %% cut price range
+class GGCutPriceRange(GroupGenerate):
+    requires_best_px = True
+    
+    def _get_view_predicates(self, view_info):
+        return [('price_band', view_info['price_range'])]
+    
+    # @timeit
+    def _cut_view(self, view_name, view_info, ts_dataset):
+        return self._cut_view_by_predicates(view_name, ts_dataset)
+    
 
 class GGCutPriceRangeNOrderAmount(GroupGenerate):
+    requires_best_px = True
+    
+    def _get_view_predicates(self, view_info):
+        return [('price_band', view_info['price_range']), ('amount', view_info['amount_thres'])]
+    
     # @timeit
     def _cut_view(self, view_name, view_info, ts_dataset):
-        price_range = view_info['price_range']
-        amount_thres = view_info['amount_thres']
-        
-        best_px = ts_dataset['best_px']
-        on_px = ts_dataset['on_px']
-        on_qty_org = ts_dataset['on_qty_org']
-        
-        bid1 = best_px[0]
-        ask1 = best_px[1]
-        
-        if bid1 == 0 or ask1 == 0:
-            return None, 1
-        
-        mid_price = (bid1 + ask1) / 2
-        lower_bound = mid_price * (1 - price_range)
-        upper_bound = mid_price * (1 + price_range)
-        
-        idx_in_price_range = (on_px >= lower_bound) & (on_px <= upper_bound)
-        idx_in_amount_thres = (on_px * on_qty_org / 10000 >= amount_thres)
-        
-        view_dataset = {}
-        for col in ts_dataset:
-            if col in self.list_to_check_valid:
-                view_dataset[col] = ts_dataset[col][idx_in_price_range & idx_in_amount_thres]
-            else:
-                view_dataset[col] = ts_dataset[col]
-        return view_dataset, 0
+        return self._cut_view_by_predicates(view_name, ts_dataset)
     
     
 class GGCutOrderAmount(GroupGenerate):
+    requires_best_px = True
+    
+    def _get_view_predicates(self, view_info):
+        return [('amount', view_info['amount_thres'])]
+    
     # @timeit
     def _cut_view(self, view_name, view_info, ts_dataset):
-        amount_thres = view_info['amount_thres']
-        
-        best_px = ts_dataset['best_px']
-        on_px = ts_dataset['on_px']
-        on_qty_org = ts_dataset['on_qty_org']
-        
-        bid1 = best_px[0]
-        ask1 = best_px[1]
-        
-        if bid1 == 0 or ask1 == 0:
-            return None, 1
-
-        idx_in_amount_thres = (on_px * on_qty_org / 10000 >= amount_thres)
-        
-        view_dataset = {}
-        for col in ts_dataset:
-            if col in self.list_to_check_valid:
-                view_dataset[col] = ts_dataset[col][idx_in_amount_thres]
-            else:
-                view_dataset[col] = ts_dataset[col]
-        return view_dataset, 0
+        return self._cut_view_by_predicates(view_name, ts_dataset)
 
 
 # %% 基于成交类型的视图切分类
 class GGCutTradeType(GroupGenerate):
     """基于成交类型进行数据筛选的视图切分器（主动/被动/集合竞价）"""
     
+    requires_best_px = True
+    
+    def _get_view_predicates(self, view_info):
+        return [('trade_type', get_trade_type_flags(view_info))]
+    
     def _cut_view(self, view_name, view_info, ts_dataset):
-        trade_types = view_info.get('trade_types', ['active', 'passive', 'auction'])  # 默认包含所有类型
-        
-        best_px = ts_dataset['best_px']
-        
-        bid1 = best_px[0]
-        ask1 = best_px[1]
-        
-        if bid1 == 0 or ask1 == 0:
-            return None, 1
-        
-        # 根据成交类型筛选订单
-        idx_mask = np.zeros(len(ts_dataset['on_px']), dtype=bool)
-        
-        if 'active' in trade_types:
-            idx_mask |= (ts_dataset['on_qty_t_a'] > 0)
-        if 'passive' in trade_types:
-            idx_mask |= (ts_dataset['on_qty_t_p'] > 0)
-        if 'auction' in trade_types:
-            idx_mask |= (ts_dataset['on_qty_t_n'] > 0)
-        
-        view_dataset = {}
-        for col in ts_dataset:
-            if col in self.list_to_check_valid:
-                view_dataset[col] = ts_dataset[col][idx_mask]
-            else:
-                view_dataset[col] = ts_dataset[col]
-        return view_dataset, 0
+        return self._cut_view_by_predicates(view_name, ts_dataset)
 
 
 class GGCutPriceRangeNTradeType(GroupGenerate):
     """结合价格范围和成交类型进行数据筛选的视图切分器"""
     
+    requires_best_px = True
+    
+    def _get_view_predicates(self, view_info):
+        return [('price_band', view_info['price_range']), ('trade_type', get_trade_type_flags(view_info))]
+    
     def _cut_view(self, view_name, view_info, ts_dataset):
-        price_range = view_info['price_range']
-        trade_types = view_info.get('trade_types', ['active', 'passive', 'auction'])
-        
-        best_px = ts_dataset['best_px']
-        on_px = ts_dataset['on_px']
-        
-        bid1 = best_px[0]
-        ask1 = best_px[1]
-        
-        if bid1 == 0 or ask1 == 0:
-            return None, 1
-        
-        mid_price = (bid1 + ask1) / 2
-        lower_bound = mid_price * (1 - price_range)
-        upper_bound = mid_price * (1 + price_range)
-        
-        idx_in_price_range = (on_px >= lower_bound) & (on_px <= upper_bound)
+        return self._cut_view_by_predicates(view_name, ts_dataset)
+
+
+# %% 多版本共用一次回放
+class MultiVersionGenerate(GoThroughBookStepper):
+    """
+    多个指标版本共用一次回放：订单簿只回放一遍，每个目标时间点的快照依次交给各版本的
+    _cut_view + 指标计算，各版本结果互不影响。
+    
+    params / ind_classes 均为 {ind_ver_name: ...}，各版本的 target_ts、tick_ladder 及 side_aggregate_thresholds 等回放参数须一致。
+    """
+    
+    def __init__(self, symbol, date, order_data, trade_data, params, ind_classes):
+        check_shared_replay_params(params)
+        self.symbol = symbol
+        self.date = date
+        self.ind_classes = ind_classes
+        self.params = params
+        super().__init__(symbol, date, order_data, trade_data, next(iter(params.values())))
+        
+        self.versions = {ind_ver_name: ind_classes[ind_ver_name].attach(self, date, param)
+                         for ind_ver_name, param in params.items()}
+        
+    def _get_replay_fields(self, param):
+        # 各版本所需列的并集，任一版本需全部维护时全部维护
+        if not param.get('lean_replay', False):
+            return None
+        fields = set()
+        for ind_ver_name, version_param in self.params.items():
+            ind_class = self.ind_classes[ind_ver_name]
+            version_fields = ind_class.__new__(ind_class)._get_required_fields(version_param)
+            if version_fields is None:
+                return None
+            fields.update(version_fields)
+        return fields
         
-        # 根据成交类型筛选订单
-        idx_in_trade_type = np.zeros(len(on_px), dtype=bool)
+    def _init_indicator_related(self):
+        pass
         
-        if 'active' in trade_types:
-            idx_in_trade_type |= (ts_dataset['on_qty_t_a'] > 0)
-        if 'passive' in trade_types:
-            idx_in_trade_type |= (ts_dataset['on_qty_t_p'] > 0)
-        if 'auction' in trade_types:
-            idx_in_trade_type |= (ts_dataset['on_qty_t_n'] > 0)
+    def _init_indicator_dtype(self):
+        pass
+    
+    def _init_curr_dataset(self):
+        pass
         
-        view_dataset = {}
-        for col in ts_dataset:
-            if col in self.list_to_check_valid:
-                view_dataset[col] = ts_dataset[col][idx_in_price_range & idx_in_trade_type]
-            else:
-                view_dataset[col] = ts_dataset[col]
-        return view_dataset, 0
+    def run(self):
+        for ts_idx, ts in self.stepper:
+            for version in self.versions.values():
+                version._process_one_ts(ts_idx, ts)
+        return self.final()
+    
+    def final(self):
+        return {ind_ver_name: version.final() for ind_ver_name, version in self.versions.items()}
+    
+    
+# 决定回放本身（及其维护的附加结构）的参数，共用一次回放的各版本须一致
+SHARED_REPLAY_PARAMS = ('target_ts', 'tick_ladder', 'side_aggregate_thresholds', 'ladder_tree', 'top_levels', 
+                        'side_moments', 'age_bucket_bounds', 'age_bucket_exclude_noon', 'auction_fast_forward', 
+                        'lean_replay')
 
 
+def check_shared_replay_params(params):
+    """共用一次回放要求各版本的回放相关参数一致"""
+    ind_ver_names = list(params)
+    base = params[ind_ver_names[0]]
+    for ind_ver_name in ind_ver_names[1:]:
+        param = params[ind_ver_name]
+        for key in SHARED_REPLAY_PARAMS:
+            if param.get(key) != base.get(key):
+                raise ValueError(f'{key} of {ind_ver_name} differs from {ind_ver_names[0]}, '
+                                 'versions cannot share one replay')
+    
+    
 # %% 移除原有的基于成交方向的视图切分类，替换为基于成交类型的实现
 # 以下是原来基于 trade_direction 的类，现在已被上面基于成交类型的类替代
 
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:12:08 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import json
+import numpy as np
+from pathlib import Path
+
+
+# %%
+'''
+逐步订单簿快照：回放时在每个目标时间点记录有效订单列与 best_px_post_match，
+之后新指标可直接扫描快照，不必重新回放事件。
+
+相邻两步之间只有少量订单变化，因此每隔 base_interval 步存一次完整状态（base），
+其余步只存相对上一步的增量（delta）：发生变化的旧订单与新到订单的下标及其各列新值。
+base_interval 为 1 时每步都是完整状态。
+
+目录结构（每个 symbol-day 一个目录）：
+    meta.json          各列 dtype 与 base_interval
+    {col}.bin          各 base 步有效订单 [0, n_active) 依次拼接的原始数组，可 np.memmap
+    offsets.npy        (n_base + 1,) 第 j 个 base 在 {col}.bin 中的范围为 offsets[j]:offsets[j+1]
+    delta_idx.bin / delta_{col}.bin    各步增量的订单下标与新值
+    delta_offsets.npy  (n_steps + 1,) 第 i 步增量的范围，base 步为空
+    n_active.npy / ts_idx.npy / ts.npy / best_px.npy   每步的有效订单数、(ts_idx, ts) 与 best_px_post_match
+    target_ts.npy      完整目标时间序列，与 FixedTimeIntervalLoop.target_ts 一致
+'''
+SNAPSHOT_COLUMNS = ('on_ts_org', 'on_ts_d', 'on_ts_t', 'on_side', 'on_px',
+                    'on_qty_org', 'on_qty_remain', 'on_qty_d', 'on_qty_t', 'on_amt_t',
+                    'on_qty_t_a', 'on_amt_t_a', 'on_qty_t_p', 'on_amt_t_p',
+                    'on_qty_t_n', 'on_amt_t_n', 'on_amt_org', 'on_amt_remain')
+SNAPSHOT_BASE_INTERVAL = 60
+# 引擎维护的金额列 -> 换算所用的数量列，早于这两列的快照中没有，载入时逐步换算
+DERIVED_AMOUNT_COLUMNS = {'on_amt_org': 'on_qty_org', 'on_amt_remain': 'on_qty_remain'}
+
+
+def get_snapshot_dir(snapshot_root, symbol, date):
+    return Path(snapshot_root) / date / symbol
+
+
+# %% write
+class BookSnapshotWriter:
+
+    def __init__(self, snapshot_dir, book, target_ts, columns=SNAPSHOT_COLUMNS, 
+                 base_interval=SNAPSHOT_BASE_INTERVAL):
+        # base_interval 为 0 时同 1，每步都写完整快照；须在建目录前检查，避免留下写了一半的快照
+        if base_interval < 0:
+            raise ValueError(f'snapshot_base_interval must be >= 0, got {base_interval}')
+        base_interval = max(int(base_interval), 1)
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.book = book
+        self.target_ts = target_ts
+        self.columns = columns
+        self.base_interval = base_interval
+
+        self.files = {col: open(self.snapshot_dir / f'{col}.bin', 'wb') for col in columns}
+        self.offsets = [0]
+        if base_interval > 1:
+            self.delta_idx_file = open(self.snapshot_dir / 'delta_idx.bin', 'wb')
+            self.delta_files = {col: open(self.snapshot_dir / f'delta_{col}.bin', 'wb') for col in columns}
+            # 上一步的状态，用于找出变化的订单
+            self.prev = {col: np.empty_like(getattr(book, col)) for col in columns}
+        self.delta_offsets = [0]
+        self.n_prev = 0
+        self.n_active_list = []
+        self.ts_idx_list = []
+        self.ts_list = []
+        self.best_px_list = []
+
+    def record(self, ts_idx, ts):
+        n_active = self.book.n_active[0]
+        if len(self.ts_list) % self.base_interval == 0:
+            self._record_base(n_active)
+        else:
+            self._record_delta(n_active)
+        if self.base_interval > 1:
+            for col in self.columns:
+                self.prev[col][:n_active] = getattr(self.book, col)[:n_active]
+        self.n_prev = n_active
+        self.n_active_list.append(n_active)
+        self.ts_idx_list.append(ts_idx)
+        self.ts_list.append(ts)
+        self.best_px_list.append(self.book.best_px_post_match.copy())
+
+    def _record_base(self, n_active):
+        for col in self.columns:
+            self.files[col].write(getattr(self.book, col)[:n_active].tobytes())
+        self.offsets.append(self.offsets[-1] + n_active)
+        self.delta_offsets.append(self.delta_offsets[-1])
+
+    def _record_delta(self, n_active):
+        n_prev = self.n_prev
+        changed = np.zeros(n_prev, dtype=bool)
+        for col in self.columns:
+            changed |= getattr(self.book, col)[:n_prev] != self.prev[col][:n_prev]
+        delta_idx = np.concatenate([np.flatnonzero(changed), np.arange(n_prev, n_active)]).astype(np.int32)
+        self.delta_idx_file.write(delta_idx.tobytes())
+        for col in self.columns:
+            self.delta_files[col].write(getattr(self.book, col)[delta_idx].tobytes())
+        self.delta_offsets.append(self.delta_offsets[-1] + len(delta_idx))
+
+    def close(self):
+        if self.files is None:
+            return
+        for f in self.files.values():
+            f.close()
+        self.files = None
+        if self.base_interval > 1:
+            self.delta_idx_file.close()
+            for f in self.delta_files.values():
+                f.close()
+
+        np.save(self.snapshot_dir / 'offsets.npy', np.array(self.offsets, dtype=np.int64))
+        np.save(self.snapshot_dir / 'delta_offsets.npy', np.array(self.delta_offsets, dtype=np.int64))
+        np.save(self.snapshot_dir / 'n_active.npy', np.array(self.n_active_list, dtype=np.int64))
+        np.save(self.snapshot_dir / 'ts_idx.npy', np.array(self.ts_idx_list, dtype=np.int64))
+        np.save(self.snapshot_dir / 'ts.npy', np.array(self.ts_list, dtype=np.int64))
+        np.save(self.snapshot_dir / 'best_px.npy', np.array(self.best_px_list, dtype=np.int64).reshape(-1, 2))
+        np.save(self.snapshot_dir / 'target_ts.npy', np.asarray(self.target_ts).astype(np.int64))
+        # meta 最后写入，作为快照完整的标志
+        meta = {
+            'columns': {col: getattr(self.book, col).dtype.str for col in self.columns},
+            'base_interval': self.base_interval,
+            }
+        with open(self.snapshot_dir / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=4)
+
+
+class SnapshotRecordingLoop:
+    """包装 FixedTimeIntervalLoop，每走完一步记录一次快照，迭代结束时落盘"""
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.target_ts = loop.target_ts
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            ts_idx, ts = next(self.loop)
+        except StopIteration:
+            self.writer.close()
+            raise
+        self.writer.record(ts_idx, ts)
+        return ts_idx, ts
+
+
+# %% read
+class BookSnapshot:
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = Path(snapshot_dir)
+        with open(self.snapshot_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        self.columns = tuple(meta['columns'])
+        self.dtypes = {col: np.dtype(dtype) for col, dtype in meta['columns'].items()}
+        self.base_interval = meta.get('base_interval', 1)
+
+        self.offsets = np.load(self.snapshot_dir / 'offsets.npy')
+        self.ts_idx = np.load(self.snapshot_dir / 'ts_idx.npy')
+        self.ts = np.load(self.snapshot_dir / 'ts.npy')
+        self.best_px = np.load(self.snapshot_dir / 'best_px.npy')
+        self.target_ts = np.load(self.snapshot_dir / 'target_ts.npy')
+        if self.base_interval > 1:
+            self.n_active = np.load(self.snapshot_dir / 'n_active.npy')
+            self.delta_offsets = np.load(self.snapshot_dir / 'delta_offsets.npy')
+        else:
+            self.n_active = np.diff(self.offsets)
+            self.delta_offsets = np.zeros(len(self.ts) + 1, dtype=np.int64)
+        
+        self.data = {col: self._memmap(f'{col}.bin', self.dtypes[col], self.offsets[-1]) 
+                     for col in self.columns}
+        self.delta_idx = self._memmap('delta_idx.bin', np.int32, self.delta_offsets[-1])
+        self.delta_data = {col: self._memmap(f'delta_{col}.bin', self.dtypes[col], self.delta_offsets[-1]) 
+                           for col in self.columns}
+
+    def _memmap(self, file_name, dtype, size):
+        if size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.snapshot_dir / file_name, dtype=dtype, mode='r', shape=(size,))
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def max_n_active(self):
+        return int(np.max(self.n_active, initial=0))
+
+    def apply_step(self, i, arrays):
+        """
+        把第 i 步写入 arrays（{col: 数组}）的 [0, n_active) 前缀：base 步整体覆盖，
+        其余步在上一步状态上打增量，调用方需保证 arrays 当前为第 i - 1 步。
+        """
+        if i % self.base_interval == 0:
+            j = i // self.base_interval
+            start, end = self.offsets[j], self.offsets[j+1]
+            for col in self.columns:
+                arrays[col][:end-start] = self.data[col][start:end]
+        else:
+            start, end = self.delta_offsets[i], self.delta_offsets[i+1]
+            delta_idx = self.delta_idx[start:end]
+            for col in self.columns:
+                arrays[col][delta_idx] = self.delta_data[col][start:end]
+        return self.n_active[i]
+
+    def load_step(self, i, arrays):
+        """随机访问：从最近的 base 步起逐步打增量，原地还原第 i 步"""
+        base_step = i - i % self.base_interval
+        for step in range(base_step, i + 1):
+            n_active = self.apply_step(step, arrays)
+        return n_active
+
+
+class SnapshotBook:
+    """
+    从快照还原的订单簿：与 GoThroughBook 同名的 on_* / n_active / best_px_post_match 数组，
+    stepper 每步把快照原地写入这些数组，可直接 GroupGenerate.attach 复用指标计算。
+    """
+
+    def __init__(self, snapshot_dir, symbol):
+        self.symbol = symbol
+        self.snapshot = BookSnapshot(snapshot_dir)
+
+        max_n_active = self.snapshot.max_n_active
+        for col in self.snapshot.columns:
+            setattr(self, col, np.zeros(max_n_active, dtype=self.snapshot.dtypes[col]))
+        self.derived_columns = [col for col in DERIVED_AMOUNT_COLUMNS if col not in self.snapshot.columns]
+        for col in self.derived_columns:
+            setattr(self, col, np.zeros(max_n_active, dtype=np.float64))
+        self.n_active = np.zeros(1, dtype=np.int64)
+        self.best_px_post_match = np.zeros(2, dtype=np.int64)
+        self.stepper = SnapshotLoop(self)
+    
+    def update_derived_columns(self, n_active):
+        for col in self.derived_columns:
+            qty_col = DERIVED_AMOUNT_COLUMNS[col]
+            getattr(self, col)[:n_active] = self.on_px[:n_active] * getattr(self, qty_col)[:n_active] / 10000
+
+
+class SnapshotLoop:
+    """与 FixedTimeIntervalLoop 接口一致，但不回放事件，只逐步载入快照"""
+
+    def __init__(self, book):
+        self.book = book
+        self.snapshot = book.snapshot
+        self.target_ts = self.snapshot.target_ts
+        self.arrays = {col: getattr(book, col) for col in self.snapshot.columns}
+        self.step = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.step >= len(self.snapshot):
+            raise StopIteration
+        step = self.step
+        self.step += 1
+
+        self.book.n_active[0] = self.snapshot.apply_step(step, self.arrays)
+        self.book.update_derived_columns(self.book.n_active[0])
+        self.book.best_px_post_match[:] = self.snapshot.best_px[step]
+        return self.snapshot.ts_idx[step], self.snapshot.ts[step]
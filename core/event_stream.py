@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:21:54 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+from utils.market import Action, Side, DataType
+from utils.timeutils import adjust_timestamp_precision
+
+
+# %%
+# 列式事件表：每个字段一条连续数组，回放内核按下标顺序扫描，只读取用到的列
+EVENT_COLUMNS = {
+    'time': np.int64,
+    'px': np.int64,
+    'qty': np.int32,
+    'buyno': np.int64,  # 仅预处理使用
+    'sellno': np.int64,  # 仅预处理使用
+    'buy_idx': np.int32,
+    'sell_idx': np.int32,
+    'px_idx': np.int32,
+    'data_type': np.int8,
+    'action': np.int8,
+    'side': np.int8,
+    'is_auction': np.int8,
+}
+KERNEL_COLUMNS = ('time', 'px', 'px_idx', 'qty', 'buy_idx', 'sell_idx', 'action', 'side', 'is_auction')
+
+
+def get_kernel_columns(events):
+    """回放内核的事件列参数，以 ev_ 为前缀"""
+    return {f'ev_{col}': events[col] for col in KERNEL_COLUMNS}
+
+
+# %% merge
+@njit(types.boolean(types.int64[:], types.int64[:]), cache=True)
+def is_sorted_by_time_seq(time_arr, seq_arr):
+    for i in range(1, time_arr.size):
+        if time_arr[i] < time_arr[i-1] or (time_arr[i] == time_arr[i-1] and seq_arr[i] < seq_arr[i-1]):
+            return False
+    return True
+
+
+@njit(types.Tuple((types.int8[:], types.int64[:]))(types.int64[:], types.int64[:]), cache=True)
+def merge_two_feeds(order_time, trade_time):
+    """
+    两路已按时间排好序的数据归并为一路，同一时刻 order 排在 trade 之前。
+    
+    :return: (data_type_arr, pos_arr)，pos_arr 为事件在各自数据中的位置
+    """
+    len_order = order_time.size
+    len_trade = trade_time.size
+    data_type_arr = np.empty(len_order + len_trade, dtype=np.int8)
+    pos_arr = np.empty(len_order + len_trade, dtype=np.int64)
+    i_o = 0
+    i_t = 0
+    for c_idx in range(len_order + len_trade):
+        if i_t >= len_trade or (i_o < len_order and order_time[i_o] <= trade_time[i_t]):
+            data_type_arr[c_idx] = DataType.Order.value
+            pos_arr[c_idx] = i_o
+            i_o += 1
+        else:
+            data_type_arr[c_idx] = DataType.Trade.value
+            pos_arr[c_idx] = i_t
+            i_t += 1
+    return data_type_arr, pos_arr
+
+
+def get_feed_order(time_arr, seq_arr):
+    """单路数据按 (time, SeqNum) 的顺序；交易所推送本身有序时直接返回，不做排序"""
+    if is_sorted_by_time_seq(time_arr, seq_arr):
+        return np.arange(time_arr.size)
+    return np.lexsort((seq_arr, time_arr))
+
+
+def get_raw_time(time_values):
+    time_values = np.asarray(time_values)
+    if np.issubdtype(time_values.dtype, np.datetime64):
+        time_values = time_values.astype('datetime64[ns]')
+    return time_values.astype(np.int64)
+
+
+# %% build
+def round_px(px):
+    return (np.round(px / 10) * 10).astype(np.int64)
+
+
+def build_event_stream(order_data, trade_data):
+    """
+    委托与成交按 (time, data_type, SeqNum) 归并为一条事件流，等价于原 concat + sort_values，
+    但两路数据各自有序时只需 O(n) 归并。结果为 {列名: 数组} 的列式事件表，各列 dtype 见 EVENT_COLUMNS。
+    
+    order 事件的订单号写在其方向对应的 buyno / sellno 中，另一侧记为 -1；
+    trade 事件的 side 为主动方向（集合竞价为 Side.N）。*_idx 字段由 GoThroughBook 在映射订单号与价格后填充。
+    """
+    order_time = get_raw_time(order_data['OrderTime'].values)
+    order_seq = order_data['SeqNum'].values.astype(np.int64)
+    trade_time = get_raw_time(trade_data['datetime'].values)
+    trade_seq = trade_data['SeqNum'].values.astype(np.int64)
+    
+    order_sorted = get_feed_order(order_time, order_seq)
+    trade_sorted = get_feed_order(trade_time, trade_seq)
+    data_type_arr, pos_arr = merge_two_feeds(order_time[order_sorted], trade_time[trade_sorted])
+    
+    is_order = data_type_arr == DataType.Order.value
+    is_trade = ~is_order
+    order_idx = order_sorted[pos_arr[is_order]]
+    trade_idx = trade_sorted[pos_arr[is_trade]]
+    
+    len_combined = len(data_type_arr)
+    events = {col: np.zeros(len_combined, dtype=dtype) for col, dtype in EVENT_COLUMNS.items()}
+    events['data_type'][:] = data_type_arr
+    raw_time = np.empty(len_combined, dtype=np.int64)
+    raw_time[is_order] = order_time[order_idx]
+    raw_time[is_trade] = trade_time[trade_idx]
+    if len_combined > 0:
+        events['time'][:] = adjust_timestamp_precision(raw_time)
+    
+    # order
+    order_side = np.where(order_data['Side'].values[order_idx] == b'B', Side.Bid.value, Side.Ask.value)
+    orderno = order_data['OrderNo'].values[order_idx].astype(np.int64)
+    order_qty = order_data['OrderQty'].values[order_idx]
+    events['px'][is_order] = round_px(order_data['OrderPx'].values[order_idx])
+    events['qty'][is_order] = order_qty
+    events['side'][is_order] = order_side
+    events['action'][is_order] = np.where(order_data['OrderType'].values[order_idx] == b'D', 
+                                          Action.D.value, Action.A.value)
+    events['buyno'][is_order] = np.where(order_side == Side.Bid.value, orderno, -1)
+    events['sellno'][is_order] = np.where(order_side == Side.Ask.value, orderno, -1)
+    
+    # trade
+    trade_side_raw = trade_data['Side'].values[trade_idx]
+    trade_side = np.select([trade_side_raw == b'B', trade_side_raw == b'S', trade_side_raw == b'N'],
+                           [Side.Bid.value, Side.Ask.value, Side.N.value], default=-1)
+    trade_qty = trade_data['tradv'].values[trade_idx]
+    events['px'][is_trade] = round_px(trade_data['tradp'].values[trade_idx])
+    events['qty'][is_trade] = trade_qty
+    events['side'][is_trade] = trade_side
+    events['action'][is_trade] = Action.T.value
+    events['is_auction'][is_trade] = trade_side == Side.N.value
+    events['buyno'][is_trade] = trade_data['buyno'].values[trade_idx]
+    events['sellno'][is_trade] = trade_data['sellno'].values[trade_idx]
+    
+    # qty 以 int32 存储，单笔委托/成交量远小于其上限，这里防御性检查一次
+    qty_max = max(np.max(order_qty, initial=0), np.max(trade_qty, initial=0))
+    assert qty_max <= np.iinfo(np.int32).max, f'qty overflow int32: {qty_max}'
+    return events
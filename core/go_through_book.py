@@ -12,111 +12,56 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 
 """
 # %% imports
-import pandas as pd
 import numpy as np
-from numba import njit, types, typed, from_dtype
+from numba import njit, types
 from functools import partial
-from numba.types import DictType
 from abc import ABC, abstractmethod
 
 
 from core.loop import FixedTimeIntervalLoop
 from utils.market import get_exchange, Action, Exchange, Side, DataType, MINIMUM_SIZE_FILTER, DefaultPx
-from utils.timeutils import adjust_timestamp_precision
+from utils.mapping import map_to_dense_idx
+from core.price_ladder import (get_price_ladder, get_ladder_idx, init_level_bitmap, 
+                               update_level_bit, find_prev_level, find_next_level)
+from core.event_stream import build_event_stream, get_kernel_columns
 
 
 # %%
 class GoThroughBook:
     
-    def __init__(self, symbol, order_data, trade_data):
+    def __init__(self, symbol, order_data, trade_data, tick_ladder=False):
         self.exchange = get_exchange(symbol)
+        self.tick_ladder = tick_ladder
         self._preprocess_data(order_data, trade_data)
         self._init_containers(order_data)
+        self._map_to_dense_idx()
         self.loop_func = self._init_loop_func()
         
     def _preprocess_data(self, order_data, trade_data):
         # print('order', len(order_data))
         # print('trade', len(trade_data))
-        order_data_extracted = order_data[['OrderTime', 'SeqNum']].rename(columns={'OrderTime': 'time'})
-        order_data_extracted['index'] = order_data.index
-        order_data_extracted['data_type'] = DataType.Order.value
-
-        trade_data_extracted = trade_data[['datetime', 'SeqNum']].rename(columns={'datetime': 'time'})
-        trade_data_extracted['index'] = trade_data.index
-        trade_data_extracted['data_type'] = DataType.Trade.value
-
-        combined_data = pd.concat([order_data_extracted, trade_data_extracted], ignore_index=True)
-        combined_data = combined_data.sort_values(by=['time', 'data_type', 'SeqNum'],  
-                                                  ascending=[True, True, True]).reset_index(drop=True)
-        len_combined = len(combined_data)
-        data_type_arr = combined_data['data_type'].values.astype('i4')
-        index_arr = combined_data['index'].values.astype('i8')
-        time_arr = (combined_data['time'].values.astype('int64') // 1_000).astype('i8')
-        time_arr = adjust_timestamp_precision(combined_data['time'].values)
-
-        order_named_arr = np.zeros(len(order_data), dtype=order_dtype)
-        order_named_arr['orderno'] = order_data['OrderNo'].values
-        order_named_arr['px'] = (np.round(order_data['OrderPx'].values / 10) * 10).astype(np.int64)
-        order_named_arr['qty'] = order_data['OrderQty'].values
-        order_named_arr['side'] = np.where(order_data['Side'].values == b'B', Side.Bid.value, Side.Ask.value)
-        order_named_arr['ordertype'] = np.where(order_data['OrderType'].values == b'D', b'D', b'A').astype('S1')
-# =============================================================================
-#         seqnum_in_trade = order_data['SeqNum'].isin(trade_data['SeqNum'])
-#         ts_after_930 = order_data['OrderTime'].dt.time >= pd.to_datetime('09:30:00').time()
-#         order_named_arr['is_trade_fill'] = (seqnum_in_trade & ts_after_930).astype(np.int32)
-# =============================================================================
-
-        trade_named_arr = np.zeros(len(trade_data), dtype=trade_dtype)
-        trade_named_arr['tradp'] = (np.round(trade_data['tradp'].values / 10) * 10).astype(np.int64)
-        trade_named_arr['tradv'] = trade_data['tradv'].values
-        trade_named_arr['buyno'] = trade_data['buyno'].values
-        trade_named_arr['sellno'] = trade_data['sellno'].values
-        conditions = [
-            trade_data['Side'].values == b'B',
-            trade_data['Side'].values == b'S',
-            trade_data['Side'].values == b'N'
-        ]
-        choices = [Side.Bid.value, Side.Ask.value, Side.N.value]
-        trade_named_arr['side'] = np.select(conditions, choices, default=np.nan)
-        # trade_named_arr['side'] = np.where(trade_data['Side'].values == b'B', Side.Bid.value, Side.Ask.value)
-        # open_auction = trade_data['datetime'].dt.time < pd.to_datetime('09:30:00').time()
-        # close_auction = trade_data['datetime'].dt.time > pd.to_datetime('14:57:00').time()
-        pre_defined_auction = trade_named_arr['side'] == Side.N.value
-        trade_named_arr['is_auction'] = pre_defined_auction.astype(np.int32)
+        events = build_event_stream(order_data, trade_data)
         
-        self.len_combined = len_combined
-        self.data_type_arr = data_type_arr
-        self.index_arr = index_arr
-        self.time_arr = time_arr
-        self.order_named_arr = order_named_arr
-        self.trade_named_arr = trade_named_arr
+        self.len_combined = len(events['time'])
+        self.events = events
         
     def _init_containers(self, order_data):
         unique_orderno = np.sort(np.unique(order_data['OrderNo'])).astype(np.int64)
-        # orderno_mapping = {orderno: idx for idx, orderno in enumerate(unique_orderno)} # TODO: 改numbadict
-        orderno_mapping = typed.Dict.empty(
-            key_type=types.int64,
-            value_type=types.int64
-        )
-        for idx, orderno in enumerate(unique_orderno):
-            orderno_mapping[orderno] = idx
         on_ts_org = np.zeros_like(unique_orderno, dtype='i8') #'M8[ms]'
         on_side = np.full_like(unique_orderno, fill_value=-1, dtype='int32')
         on_px = np.zeros_like(unique_orderno, dtype=np.int64)
+        on_px_idx = np.full_like(unique_orderno, fill_value=-1, dtype=np.int32)
         on_qty_org = np.zeros_like(unique_orderno, dtype=np.int64)
         on_qty_remain = np.zeros_like(unique_orderno, dtype=np.int64)
 
-        unique_prices = np.sort(np.unique(self.order_named_arr['px'])).astype(np.int64)
+        # tick_ladder 时为等距价格网格，价格可直接算术换算为档位下标
+        order_px = self.events['px'][self.events['data_type'] == DataType.Order.value]
+        unique_prices, px_tick = get_price_ladder(order_px, self.tick_ladder)
         len_of_price = len(unique_prices)
-        # price_mapping = {px: idx for idx, px in enumerate(unique_prices)}
-        price_mapping = typed.Dict.empty(
-            key_type=types.int64,
-            value_type=types.int64
-        )
-        for idx, px in enumerate(unique_prices):
-            price_mapping[px] = idx
         lob_bid = np.zeros(len_of_price, dtype=np.int64)
         lob_ask = np.zeros(len_of_price, dtype=np.int64)
+        lob_bid_bitmap = init_level_bitmap(len_of_price)
+        lob_ask_bitmap = init_level_bitmap(len_of_price)
 
         best_px = np.zeros(2, dtype=np.int64)
         best_px_post_match = np.zeros(2, dtype=np.int64)
@@ -125,31 +70,38 @@ class GoThroughBook:
         best_if_lost[1] = 0  # True as integer 1
         
         self.unique_orderno = unique_orderno
-        self.orderno_mapping = orderno_mapping
         self.on_ts_org = on_ts_org
         self.on_side = on_side
         self.on_px = on_px
+        self.on_px_idx = on_px_idx
         self.on_qty_org = on_qty_org
         self.on_qty_remain = on_qty_remain
         
         self.unique_prices = unique_prices
-        self.price_mapping = price_mapping
+        self.px_tick = px_tick
         self.lob_bid = lob_bid
         self.lob_ask = lob_ask
+        self.lob_bid_bitmap = lob_bid_bitmap
+        self.lob_ask_bitmap = lob_ask_bitmap
         self.best_px = best_px
         self.best_px_post_match = best_px_post_match
         self.best_if_lost = best_if_lost
+        
+    def _map_to_dense_idx(self):
+        # 预处理阶段将订单号与价格一次性映射为数组下标，回放时直接下标访问
+        events = self.events
+        events['buy_idx'][:] = map_to_dense_idx(events['buyno'], self.unique_orderno)
+        events['sell_idx'][:] = map_to_dense_idx(events['sellno'], self.unique_orderno)
+        events['px_idx'][:] = get_ladder_idx(events['px'], self.unique_prices, self.px_tick)
 
     def _init_loop_func(self):
-        loop_func = partial(loop_until_next_ts_wrapper, len_combined=self.len_combined, 
-                            data_type_arr=self.data_type_arr, index_arr=self.index_arr, time_arr=self.time_arr,
-                            order_named_arr=self.order_named_arr, trade_named_arr=self.trade_named_arr, 
-                            orderno_mapping=self.orderno_mapping, price_mapping=self.price_mapping,
-                            on_ts_org=self.on_ts_org, on_side=self.on_side, on_px=self.on_px, 
+        loop_func = partial(loop_until_next_ts_wrapper, len_combined=self.len_combined, **get_kernel_columns(self.events),
+                            on_ts_org=self.on_ts_org, on_side=self.on_side, on_px=self.on_px, on_px_idx=self.on_px_idx, 
                             on_qty_org=self.on_qty_org, on_qty_remain=self.on_qty_remain,
                             best_px=self.best_px, best_px_post_match=self.best_px_post_match, 
                             best_if_lost=self.best_if_lost, 
                             unique_prices=self.unique_prices, lob_bid=self.lob_bid, lob_ask=self.lob_ask,
+                            lob_bid_bitmap=self.lob_bid_bitmap, lob_ask_bitmap=self.lob_ask_bitmap,
                             exchange=self.exchange)
         return loop_func
     
@@ -157,7 +109,7 @@ class GoThroughBook:
 class GoThroughBookStepper(GoThroughBook, ABC):
     
     def __init__(self, symbol, date, order_data, trade_data, param):
-        super().__init__(symbol, order_data, trade_data)
+        super().__init__(symbol, order_data, trade_data, tick_ladder=param.get('tick_ladder', False))
         self.param = param
         target_ts_param = self.param['target_ts']
         self.stepper = FixedTimeIntervalLoop(date, self.loop_func, target_ts_param, self.len_combined)
@@ -187,25 +139,10 @@ class GoThroughBookStepper(GoThroughBook, ABC):
         return res
     
 
-# %%
-order_dtype = np.dtype([
-    ('orderno', 'int64'), ('px', 'int64'), ('qty', 'int64'),
-    ('side', 'int32'), ('ordertype', 'S1') #, ('is_trade_fill', 'int32')
-])
-order_type = from_dtype(order_dtype)
-
-
-trade_dtype = np.dtype([
-    ('tradp', 'int64'), ('tradv', 'int64'), ('buyno', 'int64'), ('sellno', 'int64'),
-    ('side', 'int32'), ('is_auction', 'int32')
-])
-trade_type = from_dtype(trade_dtype)
-
-
 # %% loop
 @njit(types.void(
     types.int32, types.int64, types.int64, types.int64[:], types.int32[:]
-))
+), cache=True)
 def update_best_px(side, price, size, best_px, best_if_lost):
     if side == Side.Bid.value:
         if size > MINIMUM_SIZE_FILTER and (price > best_px[0] or best_px[0] == 0):
@@ -220,49 +157,43 @@ def update_best_px(side, price, size, best_px, best_if_lost):
             
 
 @njit(types.void(
-    types.int64, types.int64, types.int32, types.int64, types.int64,
-    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:],
-    types.int64[:], types.int64[:], types.int64[:], types.int32[:],
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64)
-))
-def process_a(orderno, ts, side, px, qty, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-              lob_bid, lob_ask, best_px, best_if_lost,
-              orderno_mapping, price_mapping):
+    types.int32, types.int64, types.int32, types.int64, types.int32, types.int64,
+    types.int64[:], types.int32[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:],
+    types.int64[:], types.int64[:], types.uint64[:], types.uint64[:], types.int64[:], types.int32[:]
+), cache=True)
+def process_a(no_idx, ts, side, px, px_idx, qty, on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+              lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost):
     # update no related
-    if orderno not in orderno_mapping:
-        print('a', orderno)
-    no_idx = orderno_mapping[orderno]
     on_qty_org[no_idx] += qty
     on_qty_remain[no_idx] += qty
     if on_ts_org[no_idx] == 0:
         on_ts_org[no_idx] = ts
         on_side[no_idx] = side
         on_px[no_idx] = px
+        on_px_idx[no_idx] = px_idx
     if (side == Side.Bid.value and px > on_px[no_idx]) or (side == Side.Ask.value and px < on_px[no_idx]):
         on_px[no_idx] = px
+        on_px_idx[no_idx] = px_idx
     # update lob related
-    lob_idx = price_mapping[px]
     target_lob = lob_bid if side == Side.Bid.value else lob_ask
-    target_lob[lob_idx] += qty
+    target_lob[px_idx] += qty
+    update_level_bit(lob_bid_bitmap if side == Side.Bid.value else lob_ask_bitmap, px_idx, target_lob[px_idx])
     # update best price
-    update_best_px(side, px, target_lob[lob_idx], best_px, best_if_lost)
+    update_best_px(side, px, target_lob[px_idx], best_px, best_if_lost)
             
 
 @njit(types.void(
-    types.int64, types.int32, types.int64, types.int64, types.int64[:], 
-    types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int32[:],
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64),
-    types.int32, types.int32, types.int32
-))
-def process_d_or_t(orderno, side, px, qty, on_qty_remain, on_px,
-                   lob_bid, lob_ask, best_px, best_if_lost,
-                   orderno_mapping, price_mapping, 
+    types.int32, types.int32, types.int64, types.int32, types.int64, types.int64[:], 
+    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.uint64[:], types.uint64[:], 
+    types.int64[:], types.int32[:], types.int32, types.int32, types.int32
+), cache=True)
+def process_d_or_t(target_no_idx, side, px, px_idx, qty, on_qty_remain, on_px, on_px_idx,
+                   lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost,
                    action_type, exchange, is_auction):
     # update no related
-    if orderno not in orderno_mapping:
-        print('d or t', orderno)
+    ## 订单号不在委托数据中（预处理时映射为 -1），直接跳过
+    if target_no_idx < 0:
         return
-    target_no_idx = orderno_mapping[orderno]
     on_qty_remain[target_no_idx] -= qty
     # try:
     #     assert on_qty_remain[target_no_idx] >= 0
@@ -289,11 +220,13 @@ def process_d_or_t(orderno, side, px, qty, on_qty_remain, on_px,
         #     except:
         #         breakpoint()
     else:
-        lob_idx = price_mapping[order_px]
+        lob_idx = px_idx if use_data_px else on_px_idx[target_no_idx]
+        assert lob_idx >= 0
         target_lob = lob_bid if side == Side.Bid.value else lob_ask
         target_lob[lob_idx] -= qty
         # try:
         assert target_lob[lob_idx] >= 0
+        update_level_bit(lob_bid_bitmap if side == Side.Bid.value else lob_ask_bitmap, lob_idx, target_lob[lob_idx])
         # except:
         #     breakpoint()
         # update best price
@@ -301,39 +234,42 @@ def process_d_or_t(orderno, side, px, qty, on_qty_remain, on_px,
 
 
 @njit(types.void(
-    types.int32, types.int64[:], types.int32[:],
-    DictType(types.int64, types.int64), types.int64[:], types.int64[:]
-))    
-def relocate_best_px(side, best_px, best_if_lost, price_mapping, prices, lob_side):
+    types.int32, types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.uint64[:]
+), cache=True)    
+def relocate_best_px(side, best_px, best_if_lost, prices, lob_side, level_bitmap):
     fake_best_px = best_px[side]
-    px_idx = price_mapping[fake_best_px]
+    px_idx = np.searchsorted(prices, fake_best_px)
+    # 借助档位占用位图直接跳到下一个非空档位
     if side == Side.Bid.value:
+        px_idx = find_prev_level(level_bitmap, px_idx)
         while px_idx >= 0 and lob_side[px_idx] <= MINIMUM_SIZE_FILTER:
-            px_idx -= 1
+            px_idx = find_prev_level(level_bitmap, px_idx - 1)
         best_px[side] = prices[px_idx] if px_idx >= 0 else DefaultPx.Bid.value
     elif side == Side.Ask.value:
+        px_idx = find_next_level(level_bitmap, px_idx, lob_side.size)
         while px_idx < lob_side.size and lob_side[px_idx] <= MINIMUM_SIZE_FILTER:
-            px_idx += 1
+            px_idx = find_next_level(level_bitmap, px_idx + 1, lob_side.size)
         best_px[side] = prices[px_idx] if px_idx < lob_side.size else DefaultPx.Ask.value
     best_if_lost[side] = 0
 
 
 @njit(types.void(
-    types.int64[:], types.int32[:], DictType(types.int64, types.int64),
-    types.int64[:], types.int64[:], types.int64[:]
-))
-def check_relocate_best_px(best_px, best_if_lost, price_mapping, prices, lob_bid, lob_ask):
+    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:]
+), cache=True)
+def check_relocate_best_px(best_px, best_if_lost, prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap):
     if best_if_lost[0] == 1:
-        relocate_best_px(0, best_px, best_if_lost, price_mapping, prices, lob_bid)
+        relocate_best_px(0, best_px, best_if_lost, prices, lob_bid, lob_bid_bitmap)
     if best_if_lost[1] == 1:
-        relocate_best_px(1, best_px, best_if_lost, price_mapping, prices, lob_ask)
+        relocate_best_px(1, best_px, best_if_lost, prices, lob_ask, lob_ask_bitmap)
         
 
 @njit(types.void(
-    types.int64[:], types.int64[:], DictType(types.int64, types.int64),
-    types.int64[:], types.int64[:], types.int64[:]
-))
-def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping, prices, lob_bid, lob_ask):
+    types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:]
+), cache=True)
+def estimate_theoretical_best_price(best_px, best_px_post_match, prices, lob_bid, lob_ask, 
+                                    lob_bid_bitmap, lob_ask_bitmap):
     best_bid = best_px[0]
     best_ask = best_px[1]
     if best_bid < best_ask:
@@ -342,8 +278,8 @@ def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping,
     else:
     # print('best_px', best_px)
     # print('best_px_post_match', best_px_post_match)
-        best_bid_idx = price_mapping[best_bid]
-        best_ask_idx = price_mapping[best_ask]
+        best_bid_idx = np.searchsorted(prices, best_bid)
+        best_ask_idx = np.searchsorted(prices, best_ask)
         len_lob = prices.size
         best_bid_remain = lob_bid[best_bid_idx]
         best_ask_remain = lob_ask[best_ask_idx]
@@ -353,11 +289,11 @@ def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping,
             best_bid_remain -= matched
             best_ask_remain -= matched
             
-            while best_bid_remain == 0 and best_bid_idx > 0:
-                best_bid_idx -= 1
+            if best_bid_remain == 0 and best_bid_idx > 0:
+                best_bid_idx = max(find_prev_level(lob_bid_bitmap, best_bid_idx - 1), 0)
                 best_bid_remain = lob_bid[best_bid_idx]
-            while best_ask_remain == 0 and best_ask_idx < len_lob - 1:
-                best_ask_idx += 1
+            if best_ask_remain == 0 and best_ask_idx < len_lob - 1:
+                best_ask_idx = min(find_next_level(lob_ask_bitmap, best_ask_idx + 1, len_lob), len_lob - 1)
                 best_ask_remain = lob_ask[best_ask_idx]
             if best_bid_idx == 0 or best_ask_idx == len_lob - 1:
                 break
@@ -373,75 +309,67 @@ def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping,
 
 
 @njit(types.int64(
-    types.int64, types.int64, types.int64, types.int32[:], types.int64[:], types.int64[:],
-    order_type[:], trade_type[:],
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64),
-    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:],
-    types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], types.int32
-))
-def loop_until_next_ts(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                       order_named_arr, trade_named_arr, 
-                       orderno_mapping, price_mapping,
-                       on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-                       best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange):      
+    types.int64, types.int64, types.int64, 
+    types.int64[:], types.int64[:], types.int32[:], types.int32[:], types.int32[:], types.int32[:], 
+    types.int8[:], types.int8[:], types.int8[:],
+    types.int64[:], types.int32[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:],
+    types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:], types.int32
+), cache=True)
+def loop_until_next_ts(start_idx, nxt_target_ts, len_combined, 
+                       ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                       on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+                       best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, 
+                       lob_bid_bitmap, lob_ask_bitmap, exchange):      
     ts_pre = 0
     
     for c_i, c_idx in enumerate(range(start_idx, len_combined)):
         # read target data
-        data_type = data_type_arr[c_idx]
-        idx = index_arr[c_idx]
-        ts = time_arr[c_idx]
+        ts = ev_time[c_idx]
         
         if c_i != 0 and ts != ts_pre:
             if best_px[0] != 0 and best_px[1] != 0:
                 # step1: 找当前真实存在挂单的最优价
-                check_relocate_best_px(best_px, best_if_lost, price_mapping, unique_prices, lob_bid, lob_ask)
+                check_relocate_best_px(best_px, best_if_lost, unique_prices, lob_bid, lob_ask, 
+                                       lob_bid_bitmap, lob_ask_bitmap)
                 # step2: 模拟撮合后的最优价
-                estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping, unique_prices, 
-                                                lob_bid, lob_ask)
+                estimate_theoretical_best_price(best_px, best_px_post_match, unique_prices, lob_bid, lob_ask, 
+                                                lob_bid_bitmap, lob_ask_bitmap)
             # step3: 检查是否退出
             if ts > nxt_target_ts:
                 return c_idx
             
-        if data_type == 0:
-            row = order_named_arr[idx]
-            orderno = row['orderno']
-            px = row['px']
-            qty = row['qty']
-            side = row['side']
-            ordertype = row['ordertype']
-            if ordertype == b'A':
-                process_a(orderno, ts, side, px, qty, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-                          lob_bid, lob_ask, best_px, best_if_lost,
-                          orderno_mapping, price_mapping)
-            elif ordertype == b'D':
-                process_d_or_t(orderno, side, px, qty, on_qty_remain, on_px,
-                               lob_bid, lob_ask, best_px, best_if_lost,
-                               orderno_mapping, price_mapping, 
-                               Action.D.value, exchange, 0)
-        if data_type == 1:
-            row = trade_named_arr[idx]
-            tradp = row['tradp']
-            tradv = row['tradv']
-            buyno = row['buyno']
-            sellno = row['sellno']
-            side = row['side']
-            is_auction = row['is_auction']
-            for target_order_no, target_side in zip((buyno, sellno), (0, 1)):
-                process_d_or_t(target_order_no, target_side, tradp, tradv, on_qty_remain, on_px,
-                               lob_bid, lob_ask, best_px, best_if_lost,
-                               orderno_mapping, price_mapping, 
+        action = ev_action[c_idx]
+        px = ev_px[c_idx]
+        px_idx = ev_px_idx[c_idx]
+        qty = np.int64(ev_qty[c_idx])
+        side = np.int32(ev_side[c_idx])
+        if action == Action.T.value:
+            is_auction = np.int32(ev_is_auction[c_idx])
+            for target_no_idx, target_side in zip((ev_buy_idx[c_idx], ev_sell_idx[c_idx]), (0, 1)):
+                process_d_or_t(target_no_idx, target_side, px, px_idx, qty, on_qty_remain, on_px, on_px_idx,
+                               lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost,
                                Action.T.value, exchange, is_auction)
+        else:
+            no_idx = ev_buy_idx[c_idx] if side == Side.Bid.value else ev_sell_idx[c_idx]
+            if action == Action.A.value:
+                process_a(no_idx, ts, side, px, px_idx, qty, 
+                          on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+                          lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost)
+            elif action == Action.D.value:
+                process_d_or_t(no_idx, side, px, px_idx, qty, on_qty_remain, on_px, on_px_idx,
+                               lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost,
+                               Action.D.value, exchange, 0)
     return len_combined
     
 
-def loop_until_next_ts_wrapper(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                               order_named_arr, trade_named_arr, 
-                               orderno_mapping, price_mapping,
-                               on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-                               best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange):
-    return loop_until_next_ts(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                              order_named_arr, trade_named_arr, 
-                              orderno_mapping, price_mapping,
-                              on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-                              best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange)
\ No newline at end of file
+def loop_until_next_ts_wrapper(start_idx, nxt_target_ts, len_combined, 
+                               ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                               on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+                               best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, 
+                               lob_bid_bitmap, lob_ask_bitmap, exchange):
+    return loop_until_next_ts(start_idx, nxt_target_ts, len_combined, 
+                              ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                              on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+                              best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, 
+                              lob_bid_bitmap, lob_ask_bitmap, exchange)
\ No newline at end of file
@@ -12,128 +12,144 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 
 """
 # %% imports
-import pandas as pd
 import numpy as np
-from numba import njit, types, typed, from_dtype
+from numba import njit, types
 from functools import partial
-from numba.types import DictType
 from abc import ABC, abstractmethod
 
 
 from core.loop import FixedTimeIntervalLoop
 from utils.market import get_exchange, Action, Exchange, Side, DataType, TradeDirection, MINIMUM_SIZE_FILTER, DefaultPx
-from utils.timeutils import adjust_timestamp_precision
+from utils.mapping import map_to_dense_idx
+from core.price_ladder import (get_price_ladder, get_ladder_idx, init_level_bitmap, 
+                               update_level_bit, find_prev_level, find_next_level, update_price_index,
+                               update_subset_price_index, init_ladder_tree, update_ladder_tree,
+                               init_top_levels, update_top_levels)
+from core.event_stream import build_event_stream, get_kernel_columns
+from core.side_aggregates import init_side_aggregates, update_side_aggregates, recompute_side_aggregates
+from core.side_moments import init_side_moments, update_side_moments, recompute_side_moments
+from core.age_buckets import init_age_buckets, update_age_buckets, advance_age_buckets, recompute_age_buckets
+from core.book_snapshot import (get_snapshot_dir, BookSnapshotWriter, SnapshotRecordingLoop, 
+                                SNAPSHOT_BASE_INTERVAL)
 
 
 # %%
+# 可选维护的逐单撤单/成交列：回放只写入 replay_fields 中的列，其余列长度为 0；
+# 挂单相关列（on_ts_org, on_side, on_px, on_qty_org, on_qty_remain 及金额列）始终维护
+TRACKED_FIELDS = ('on_ts_d', 'on_ts_t', 'on_qty_d', 'on_qty_t', 'on_amt_t', 
+                  'on_qty_t_a', 'on_amt_t_a', 'on_qty_t_p', 'on_amt_t_p', 'on_qty_t_n', 'on_amt_t_n')
+# 回放附加结构依赖的可选列
+SIDE_AGGREGATE_INPUTS = ('on_qty_d', 'on_amt_t_a', 'on_amt_t_p')
+
+
 class GoThroughBook:
     
-    def __init__(self, symbol, order_data, trade_data):
+    def __init__(self, symbol, order_data, trade_data, tick_ladder=False, agg_thresholds=None, ladder_tree=False,
+                 top_levels=0, side_moments=False, age_bucket_bounds=None, age_exclude_noon=False, replay_fields=None):
+        self.symbol = symbol
         self.exchange = get_exchange(symbol)
+        self.tick_ladder = tick_ladder
+        self.agg_thresholds = agg_thresholds
+        self.ladder_tree = ladder_tree
+        self.top_levels = top_levels
+        self.side_moments = side_moments
+        self.age_bucket_bounds = age_bucket_bounds
+        self.age_exclude_noon = age_exclude_noon
+        self.tracked_fields = self._get_tracked_fields(replay_fields)
         self._preprocess_data(order_data, trade_data)
         self._init_containers(order_data)
+        self._map_to_dense_idx()
         self.loop_func = self._init_loop_func()
         
+    def _get_tracked_fields(self, replay_fields):
+        """replay_fields 为 None 时维护全部可选列，否则只维护其中的列及附加结构所需的列"""
+        if replay_fields is None:
+            return TRACKED_FIELDS
+        required = set(replay_fields)
+        if self.agg_thresholds is not None and len(self.agg_thresholds) > 0:
+            required.update(SIDE_AGGREGATE_INPUTS)
+        return tuple(field for field in TRACKED_FIELDS if field in required)
+        
     def _preprocess_data(self, order_data, trade_data):
         # print('order', len(order_data))
         # print('trade', len(trade_data))
-        order_data_extracted = order_data[['OrderTime', 'SeqNum']].rename(columns={'OrderTime': 'time'})
-        order_data_extracted['index'] = order_data.index
-        order_data_extracted['data_type'] = DataType.Order.value
-
-        trade_data_extracted = trade_data[['datetime', 'SeqNum']].rename(columns={'datetime': 'time'})
-        trade_data_extracted['index'] = trade_data.index
-        trade_data_extracted['data_type'] = DataType.Trade.value
-
-        combined_data = pd.concat([order_data_extracted, trade_data_extracted], ignore_index=True)
-        combined_data = combined_data.sort_values(by=['time', 'data_type', 'SeqNum'],  
-                                                  ascending=[True, True, True]).reset_index(drop=True)
-        len_combined = len(combined_data)
-        data_type_arr = combined_data['data_type'].values.astype('i4')
-        index_arr = combined_data['index'].values.astype('i8')
-        time_arr = (combined_data['time'].values.astype('int64') // 1_000).astype('i8')
-        time_arr = adjust_timestamp_precision(combined_data['time'].values)
-
-        order_named_arr = np.zeros(len(order_data), dtype=order_dtype)
-        order_named_arr['orderno'] = order_data['OrderNo'].values
-        order_named_arr['px'] = (np.round(order_data['OrderPx'].values / 10) * 10).astype(np.int64)
-        order_named_arr['qty'] = order_data['OrderQty'].values
-        order_named_arr['side'] = np.where(order_data['Side'].values == b'B', Side.Bid.value, Side.Ask.value)
-        order_named_arr['ordertype'] = np.where(order_data['OrderType'].values == b'D', b'D', b'A').astype('S1')
-
-        trade_named_arr = np.zeros(len(trade_data), dtype=trade_dtype)
-        trade_named_arr['tradp'] = (np.round(trade_data['tradp'].values / 10) * 10).astype(np.int64)
-        trade_named_arr['tradv'] = trade_data['tradv'].values
-        trade_named_arr['buyno'] = trade_data['buyno'].values
-        trade_named_arr['sellno'] = trade_data['sellno'].values
-        conditions = [
-            trade_data['Side'].values == b'B',
-            trade_data['Side'].values == b'S',
-            trade_data['Side'].values == b'N'
-        ]
-        choices = [Side.Bid.value, Side.Ask.value, Side.N.value]
-        trade_named_arr['side'] = np.select(conditions, choices, default=np.nan)
-        pre_defined_auction = trade_named_arr['side'] == Side.N.value
-        trade_named_arr['is_auction'] = pre_defined_auction.astype(np.int32)
+        events = build_event_stream(order_data, trade_data)
         
-        self.len_combined = len_combined
-        self.data_type_arr = data_type_arr
-        self.index_arr = index_arr
-        self.time_arr = time_arr
-        self.order_named_arr = order_named_arr
-        self.trade_named_arr = trade_named_arr
+        self.len_combined = len(events['time'])
+        self.events = events
         
     def _init_containers(self, order_data):
-        unique_orderno = np.sort(np.unique(order_data['OrderNo'])).astype(np.int64)
-        orderno_mapping = typed.Dict.empty(
-            key_type=types.int64,
-            value_type=types.int64
-        )
-        for idx, orderno in enumerate(unique_orderno):
-            orderno_mapping[orderno] = idx
+        unique_orderno = self._get_orderno_by_arrival(order_data)
+        # 未维护的可选列长度为 0，回放时不写入
+        tracked_len = {field: len(unique_orderno) if field in self.tracked_fields else 0 for field in TRACKED_FIELDS}
         on_ts_org = np.zeros_like(unique_orderno, dtype='i8')
-        on_ts_d = np.zeros_like(unique_orderno, dtype='i8')
-        on_ts_t = np.zeros_like(unique_orderno, dtype='i8')
+        on_ts_d = np.zeros(tracked_len['on_ts_d'], dtype='i8')
+        on_ts_t = np.zeros(tracked_len['on_ts_t'], dtype='i8')
         on_side = np.full_like(unique_orderno, fill_value=-1, dtype='int32')
         on_px = np.zeros_like(unique_orderno, dtype=np.int64)
+        on_px_idx = np.full_like(unique_orderno, fill_value=-1, dtype=np.int32)
         on_qty_org = np.zeros_like(unique_orderno, dtype=np.int64)
         on_qty_remain = np.zeros_like(unique_orderno, dtype=np.int64)
-        on_qty_d = np.zeros_like(unique_orderno, dtype=np.int64)
-        on_qty_t = np.zeros_like(unique_orderno, dtype=np.int64)
-        on_amt_t = np.zeros_like(unique_orderno, dtype=np.int64)
+        on_qty_d = np.zeros(tracked_len['on_qty_d'], dtype=np.int64)
+        on_qty_t = np.zeros(tracked_len['on_qty_t'], dtype=np.int64)
+        on_amt_t = np.zeros(tracked_len['on_amt_t'], dtype=np.int64)
         
         # 新增：主动、被动和集合竞价成交量及金额
-        on_qty_t_a = np.zeros_like(unique_orderno, dtype=np.int64)  # 主动成交量
-        on_amt_t_a = np.zeros_like(unique_orderno, dtype=np.int64)  # 主动成交金额
-        on_qty_t_p = np.zeros_like(unique_orderno, dtype=np.int64)  # 被动成交量
-        on_amt_t_p = np.zeros_like(unique_orderno, dtype=np.int64)  # 被动成交金额
-        on_qty_t_n = np.zeros_like(unique_orderno, dtype=np.int64)  # 集合竞价成交量
-        on_amt_t_n = np.zeros_like(unique_orderno, dtype=np.int64)  # 集合竞价成交金额
-
-        unique_prices = np.sort(np.unique(self.order_named_arr['px'])).astype(np.int64)
+        on_qty_t_a = np.zeros(tracked_len['on_qty_t_a'], dtype=np.int64)  # 主动成交量
+        on_amt_t_a = np.zeros(tracked_len['on_amt_t_a'], dtype=np.int64)  # 主动成交金额
+        on_qty_t_p = np.zeros(tracked_len['on_qty_t_p'], dtype=np.int64)  # 被动成交量
+        on_amt_t_p = np.zeros(tracked_len['on_amt_t_p'], dtype=np.int64)  # 被动成交金额
+        on_qty_t_n = np.zeros(tracked_len['on_qty_t_n'], dtype=np.int64)  # 集合竞价成交量
+        on_amt_t_n = np.zeros(tracked_len['on_amt_t_n'], dtype=np.int64)  # 集合竞价成交金额
+        
+        # 引擎维护的金额列（on_px * qty / 10000），指标不必每步重算：原始金额在挂单时写入，剩余金额随撤单/成交更新
+        on_amt_org = np.zeros_like(unique_orderno, dtype=np.float64)
+        on_amt_remain = np.zeros_like(unique_orderno, dtype=np.float64)
+
+        # tick_ladder 时为等距价格网格，价格可直接算术换算为档位下标
+        order_px = self.events['px'][self.events['data_type'] == DataType.Order.value]
+        unique_prices, px_tick = get_price_ladder(order_px, self.tick_ladder)
         len_of_price = len(unique_prices)
-        price_mapping = typed.Dict.empty(
-            key_type=types.int64,
-            value_type=types.int64
-        )
-        for idx, px in enumerate(unique_prices):
-            price_mapping[px] = idx
         lob_bid = np.zeros(len_of_price, dtype=np.int64)
         lob_ask = np.zeros(len_of_price, dtype=np.int64)
+        lob_bid_bitmap = init_level_bitmap(len_of_price)
+        lob_ask_bitmap = init_level_bitmap(len_of_price)
+        # 档位树状数组，与 lob_bid / lob_ask 同步维护，价格区间深度 O(log 档位数) 可得（见 core.price_ladder）
+        ladder_tree = init_ladder_tree(len_of_price, self.ladder_tree)
+        # 盘口前 K 档快照及所需的各档剩余订单数，每个目标时间点由回放更新（见 core.price_ladder）
+        lob_count, top_levels = init_top_levels(len_of_price, self.top_levels)
 
         best_px = np.zeros(2, dtype=np.int64)
         best_px_post_match = np.zeros(2, dtype=np.int64)
         best_if_lost = np.zeros(2, dtype=np.int32)
         best_if_lost[0] = 0
         best_if_lost[1] = 0
+        n_active = np.zeros(1, dtype=np.int64)
+        # 此时间点（含）之前的时间戳不做模拟撮合，见 GoThroughBookStepper 的 auction_fast_forward
+        match_from_ts = np.zeros(1, dtype=np.int64)
+        # 剩余量 > 0 的订单集合，回放时增量维护：rest_idx[:n_resting] 为订单下标（无序），
+        # rest_pos 为各订单在其中的位置，不在集合中为 -1
+        rest_idx = np.zeros_like(unique_orderno, dtype=np.int32)
+        rest_pos = np.full_like(unique_orderno, fill_value=-1, dtype=np.int32)
+        n_resting = np.zeros(1, dtype=np.int64)
+        # 分方向、分金额区间的累计量（见 core.side_aggregates），未配置阈值时不维护
+        agg_thresholds, on_agg_bucket, side_agg = init_side_aggregates(self.agg_thresholds, len(unique_orderno))
+        # 分方向剩余金额/数量的幂和（见 core.side_moments），未开启时不维护
+        side_moments = init_side_moments(self.side_moments)
+        # 分方向、分金额区间、分挂单时长的直方图（见 core.age_buckets），未配置时长边界时不维护
+        age_bounds, age_start, age_clock, age_hist = init_age_buckets(self.age_bucket_bounds, agg_thresholds, 
+                                                                      len(unique_orderno), self.age_exclude_noon)
+        # 按 (档位, 方向) 分组的有效订单索引，按需由 update_price_index 更新
+        px_perm = np.zeros_like(unique_orderno, dtype=np.int32)
+        level_offsets = np.zeros(2 * len_of_price + 1, dtype=np.int64)
         
         self.unique_orderno = unique_orderno
-        self.orderno_mapping = orderno_mapping
         self.on_ts_org = on_ts_org
         self.on_ts_d = on_ts_d
         self.on_ts_t = on_ts_t
         self.on_side = on_side
         self.on_px = on_px
+        self.on_px_idx = on_px_idx
         self.on_qty_org = on_qty_org
         self.on_qty_remain = on_qty_remain
         self.on_qty_d = on_qty_d
@@ -145,43 +161,154 @@ class GoThroughBook:
         self.on_amt_t_p = on_amt_t_p  # 新增
         self.on_qty_t_n = on_qty_t_n  # 新增
         self.on_amt_t_n = on_amt_t_n  # 新增
+        self.on_amt_org = on_amt_org
+        self.on_amt_remain = on_amt_remain
         
         self.unique_prices = unique_prices
-        self.price_mapping = price_mapping
+        self.px_tick = px_tick
         self.lob_bid = lob_bid
         self.lob_ask = lob_ask
+        self.lob_bid_bitmap = lob_bid_bitmap
+        self.lob_ask_bitmap = lob_ask_bitmap
+        self.ladder_tree = ladder_tree
+        self.lob_count = lob_count
+        self.top_levels = top_levels
         self.best_px = best_px
         self.best_px_post_match = best_px_post_match
         self.best_if_lost = best_if_lost
+        self.n_active = n_active
+        self.match_from_ts = match_from_ts
+        self.rest_idx = rest_idx
+        self.rest_pos = rest_pos
+        self.n_resting = n_resting
+        self.agg_thresholds = agg_thresholds
+        self.on_agg_bucket = on_agg_bucket
+        self.side_agg = side_agg
+        self.side_moments = side_moments
+        self.age_bounds = age_bounds
+        self.age_start = age_start
+        self.age_clock = age_clock
+        self.age_hist = age_hist
+        self.px_perm = px_perm
+        self.level_offsets = level_offsets
+        
+    def _get_orderno_by_arrival(self, order_data):
+        """
+        按首次挂单(A)在事件流中的先后顺序排列订单号，从未挂单的订单号排在最后。
+        这样已挂单的订单恒为 [0, n_active) 的前缀，且只增不减。
+        """
+        events = self.events
+        is_add = events['action'] == Action.A.value
+        add_orderno = np.where(events['side'][is_add] == Side.Bid.value, 
+                               events['buyno'][is_add], events['sellno'][is_add])
+        added_orderno, first_idx = np.unique(add_orderno, return_index=True)
+        arrived_orderno = added_orderno[np.argsort(first_idx)]
+        
+        never_added = np.setdiff1d(np.unique(order_data['OrderNo']), arrived_orderno)
+        return np.concatenate([arrived_orderno, never_added]).astype(np.int64)
+    
+    def _map_to_dense_idx(self):
+        # 预处理阶段将订单号与价格一次性映射为数组下标，回放时直接下标访问
+        events = self.events
+        events['buy_idx'][:] = map_to_dense_idx(events['buyno'], self.unique_orderno)
+        events['sell_idx'][:] = map_to_dense_idx(events['sellno'], self.unique_orderno)
+        events['px_idx'][:] = get_ladder_idx(events['px'], self.unique_prices, self.px_tick)
 
     def _init_loop_func(self):
-        loop_func = partial(loop_until_next_ts_wrapper, len_combined=self.len_combined, 
-                            data_type_arr=self.data_type_arr, index_arr=self.index_arr, time_arr=self.time_arr,
-                            order_named_arr=self.order_named_arr, trade_named_arr=self.trade_named_arr, 
-                            orderno_mapping=self.orderno_mapping, price_mapping=self.price_mapping,
+        loop_func = partial(loop_until_next_ts_wrapper, len_combined=self.len_combined, **get_kernel_columns(self.events),
                             on_ts_org=self.on_ts_org, on_ts_d=self.on_ts_d, on_ts_t=self.on_ts_t, 
-                            on_side=self.on_side, on_px=self.on_px, 
+                            on_side=self.on_side, on_px=self.on_px, on_px_idx=self.on_px_idx, 
                             on_qty_org=self.on_qty_org, on_qty_remain=self.on_qty_remain,
                             on_qty_d=self.on_qty_d, on_qty_t=self.on_qty_t, on_amt_t=self.on_amt_t,
                             on_qty_t_a=self.on_qty_t_a, on_amt_t_a=self.on_amt_t_a,  # 新增
                             on_qty_t_p=self.on_qty_t_p, on_amt_t_p=self.on_amt_t_p,  # 新增
                             on_qty_t_n=self.on_qty_t_n, on_amt_t_n=self.on_amt_t_n,  # 新增
+                            on_amt_org=self.on_amt_org, on_amt_remain=self.on_amt_remain,
                             best_px=self.best_px, best_px_post_match=self.best_px_post_match, 
-                            best_if_lost=self.best_if_lost, 
+                            best_if_lost=self.best_if_lost, n_active=self.n_active, 
+                            match_from_ts=self.match_from_ts,
+                            rest_idx=self.rest_idx, rest_pos=self.rest_pos, n_resting=self.n_resting,
+                            agg_thresholds=self.agg_thresholds, on_agg_bucket=self.on_agg_bucket, 
+                            side_agg=self.side_agg, side_moments=self.side_moments,
+                            age_bounds=self.age_bounds, age_start=self.age_start, age_clock=self.age_clock, 
+                            age_hist=self.age_hist,
                             unique_prices=self.unique_prices, lob_bid=self.lob_bid, lob_ask=self.lob_ask,
+                            lob_bid_bitmap=self.lob_bid_bitmap, lob_ask_bitmap=self.lob_ask_bitmap,
+                            ladder_tree=self.ladder_tree, lob_count=self.lob_count, top_levels=self.top_levels,
                             exchange=self.exchange)
         return loop_func
     
+    def update_price_index(self, resting=False):
+        if resting:
+            update_subset_price_index(self.on_px_idx, self.on_side, self.rest_idx[:self.n_resting[0]], 
+                                      self.px_perm, self.level_offsets)
+        else:
+            update_price_index(self.on_px_idx, self.on_side, self.n_active[0], self.px_perm, self.level_offsets)
+            
+    def check_side_aggregates(self):
+        """对当前有效订单全量重算分方向累计量，与回放中增量维护的结果逐项比对"""
+        expected = np.zeros_like(self.side_agg)
+        recompute_side_aggregates(self.n_active[0], self.on_side, self.on_px, self.on_qty_remain, self.on_qty_d,
+                                  self.on_amt_t_a, self.on_amt_t_p, self.on_amt_org, self.agg_thresholds, expected)
+        if not np.array_equal(expected, self.side_agg):
+            mismatch = np.argwhere(expected != self.side_agg)
+            raise ValueError(f'{self.symbol}: side aggregates drifted from recomputation at '
+                             f'(field, side, bucket) {mismatch[:5].tolist()}')
+            
+    def check_side_moments(self):
+        """
+        全量重算分方向幂和，返回增量维护结果相对重算结果的最大漂移（相对误差，分母不小于 1），
+        并以重算结果重置，之后的增量从精确值继续累积。
+        """
+        expected = np.zeros_like(self.side_moments)
+        recompute_side_moments(self.n_active[0], self.on_side, self.on_px, self.on_qty_remain, self.on_amt_remain, 
+                               expected)
+        running = self.side_moments[0] + self.side_moments[1]
+        exact = expected[0] + expected[1]
+        drift = np.max(np.abs(running - exact) / np.maximum(np.abs(exact), 1.), initial=0.)
+        self.side_moments[:] = expected
+        return drift
+    
+    def check_age_buckets(self, ts):
+        """按目标时间点 ts 对当前有效订单全量重算挂单时长直方图，与回放中增量维护的结果逐项比对"""
+        expected = np.zeros_like(self.age_hist)
+        recompute_age_buckets(ts, self.n_active[0], self.on_ts_org, self.on_side, self.on_px, self.on_qty_org, 
+                              self.on_qty_remain, self.on_amt_org, self.agg_thresholds, self.age_bounds, 
+                              self.age_exclude_noon, expected)
+        if not np.array_equal(expected, self.age_hist):
+            mismatch = np.argwhere(expected != self.age_hist)
+            raise ValueError(f'{self.symbol}: age buckets drifted from recomputation at '
+                             f'(field, side, amt_bucket, age_bucket) {mismatch[:5].tolist()}')
+    
     
 class GoThroughBookStepper(GoThroughBook, ABC):
     
     def __init__(self, symbol, date, order_data, trade_data, param):
-        super().__init__(symbol, order_data, trade_data)
+        super().__init__(symbol, order_data, trade_data, tick_ladder=param.get('tick_ladder', False),
+                         agg_thresholds=param.get('side_aggregate_thresholds'),
+                         ladder_tree=param.get('ladder_tree', False), top_levels=param.get('top_levels', 0),
+                         side_moments=param.get('side_moments', False), 
+                         age_bucket_bounds=param.get('age_bucket_bounds'), 
+                         age_exclude_noon=param.get('age_bucket_exclude_noon', False), 
+                         replay_fields=None if 'snapshot_dir' in param else self._get_replay_fields(param))
         self.param = param
         target_ts_param = self.param['target_ts']
         self.stepper = FixedTimeIntervalLoop(date, self.loop_func, target_ts_param, self.len_combined)
+        if self.param.get('auction_fast_forward', False):
+            # 第一个目标时间点之前（集合竞价阶段）不逐时间戳估计撮合后的最优价，到达第一个目标时间点时只算一次
+            self.match_from_ts[0] = self.stepper.target_ts[0]
+        if 'snapshot_dir' in self.param:
+            # 每步落盘订单簿快照，供之后的指标回补直接扫描（见 core.book_snapshot）
+            snapshot_dir = get_snapshot_dir(self.param['snapshot_dir'], symbol, date)
+            base_interval = self.param.get('snapshot_base_interval', SNAPSHOT_BASE_INTERVAL)
+            writer = BookSnapshotWriter(snapshot_dir, self, self.stepper.target_ts, base_interval=base_interval)
+            self.stepper = SnapshotRecordingLoop(self.stepper, writer)
         self._init_indicator_related()
     
+    def _get_replay_fields(self, param):
+        """回放需维护的可选逐单列（见 TRACKED_FIELDS），None 为全部维护；快照录制时总是全部维护"""
+        return None
+    
     @abstractmethod
     def _init_indicator_dtype(self):
         pass
@@ -206,23 +333,8 @@ class GoThroughBookStepper(GoThroughBook, ABC):
         return res
     
 
-# %%
-order_dtype = np.dtype([
-    ('orderno', 'int64'), ('px', 'int64'), ('qty', 'int64'),
-    ('side', 'int32'), ('ordertype', 'S1')
-])
-order_type = from_dtype(order_dtype)
-
-
-trade_dtype = np.dtype([
-    ('tradp', 'int64'), ('tradv', 'int64'), ('buyno', 'int64'), ('sellno', 'int64'),
-    ('side', 'int32'), ('is_auction', 'int32')
-])
-trade_type = from_dtype(trade_dtype)
-
-
 # %% 判断成交是否为主动的函数
-@njit(types.boolean(types.int32, types.int32))
+@njit(types.boolean(types.int32, types.int32), cache=True)
 def is_active_trade(trade_side, order_side):
     """
     判断订单的成交是否为主动成交
@@ -240,9 +352,22 @@ def is_active_trade(trade_side, order_side):
 
 
 # %% loop
+@njit(types.void(types.int64[:], types.int32, types.int64), cache=True)
+def add_if_tracked(col, no_idx, value):
+    # 未维护的可选列长度为 0，不写入
+    if col.size > 0:
+        col[no_idx] += value
+        
+
+@njit(types.void(types.int64[:], types.int32, types.int64), cache=True)
+def set_first_ts_if_tracked(col, no_idx, ts):
+    if col.size > 0 and col[no_idx] == 0:
+        col[no_idx] = ts
+
+
 @njit(types.void(
     types.int32, types.int64, types.int64, types.int64[:], types.int32[:]
-))
+), cache=True)
 def update_best_px(side, price, size, best_px, best_if_lost):
     if side == Side.Bid.value:
         if size > MINIMUM_SIZE_FILTER and (price > best_px[0] or best_px[0] == 0):
@@ -256,77 +381,133 @@ def update_best_px(side, price, size, best_px, best_if_lost):
             best_if_lost[1] = 1
             
 
+@njit(types.void(types.int32, types.int64[:], types.int32[:], types.int32[:], types.int64[:]), cache=True)
+def update_resting_set(no_idx, on_qty_remain, rest_idx, rest_pos, n_resting):
+    # 剩余量由 0 变正时追加到末尾，归 0 时用末尾元素填补其位置，均为 O(1)
+    pos = rest_pos[no_idx]
+    if on_qty_remain[no_idx] > 0:
+        if pos < 0:
+            rest_idx[n_resting[0]] = no_idx
+            rest_pos[no_idx] = n_resting[0]
+            n_resting[0] += 1
+    elif pos >= 0:
+        last = n_resting[0] - 1
+        moved = rest_idx[last]
+        rest_idx[pos] = moved
+        rest_pos[moved] = pos
+        rest_pos[no_idx] = -1
+        n_resting[0] = last
+
+
+@njit(types.void(types.int32, types.int64, types.int32, types.int32[:], types.int64[:], types.int64[:, :]), 
+      cache=True)
+def update_level_count(no_idx, sign, side, on_px_idx, on_qty_remain, lob_count):
+    # 各档剩余订单数：事件前减去、事件后加回该订单（剩余量 > 0 时计入其自身价格档位），未开启 top_levels 时不维护
+    if lob_count.shape[1] > 0 and on_qty_remain[no_idx] > 0:
+        lob_count[side, on_px_idx[no_idx]] += sign
+
+
+@njit(types.void(
+    types.int32, types.int64, types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.int64[:], types.int64[:], types.int64[:], types.float64[:], types.float64[:], 
+    types.float64[:], types.int32[:], types.int64[:, :, :], types.float64[:, :, :], 
+    types.int64[:, :], types.int64[:], types.int64[:, :, :, :]
+), cache=True)
+def update_book_aggregates(no_idx, sign, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, on_qty_d, 
+                           on_amt_t_a, on_amt_t_p, on_amt_org, on_amt_remain, agg_thresholds, on_agg_bucket, 
+                           side_agg, side_moments, age_start, age_clock, age_hist):
+    # 整簿累计量：事件前减去、事件后加回所涉订单的贡献，未挂单的订单不计入
+    if no_idx < 0 or on_ts_org[no_idx] == 0:
+        return
+    if side_agg.shape[2] > 0:
+        update_side_aggregates(no_idx, sign, on_side, on_px, on_qty_remain, on_qty_d, 
+                               on_amt_t_a, on_amt_t_p, on_amt_org, agg_thresholds, on_agg_bucket, side_agg)
+    if side_moments.shape[2] > 0:
+        update_side_moments(no_idx, np.float64(sign), on_side, on_px, on_qty_remain, on_amt_remain, side_moments)
+    if age_hist.shape[3] > 0:
+        update_age_buckets(no_idx, sign, on_side, on_px, on_qty_org, on_qty_remain, on_amt_org, agg_thresholds, 
+                           on_agg_bucket, age_start, age_clock, age_hist)
+
+
 @njit(types.void(
-    types.int64, types.int64, types.int32, types.int64, types.int64,
-    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:],
-    types.int64[:], types.int64[:], types.int64[:], types.int32[:],
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64)
-))
-def process_a(orderno, ts, side, px, qty, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-              lob_bid, lob_ask, best_px, best_if_lost,
-              orderno_mapping, price_mapping):
+    types.int32, types.int64, types.int32, types.int64, types.int32, types.int64,
+    types.int64[:], types.int32[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:],
+    types.float64[:], types.float64[:],
+    types.int64[:], types.int64[:], types.uint64[:], types.uint64[:], types.int64[:], types.int32[:], types.int64[:],
+    types.int32[:], types.int32[:], types.int64[:], types.int64[:, :, :], types.int64[:, :]
+), cache=True)
+def process_a(no_idx, ts, side, px, px_idx, qty, on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain,
+              on_amt_org, on_amt_remain, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost, n_active,
+              rest_idx, rest_pos, n_resting, ladder_tree, lob_count):
+    update_level_count(no_idx, -1, side, on_px_idx, on_qty_remain, lob_count)
     # update no related
-    if orderno not in orderno_mapping:
-        print('a', orderno)
-    no_idx = orderno_mapping[orderno]
     on_qty_org[no_idx] += qty
     on_qty_remain[no_idx] += qty
     if on_ts_org[no_idx] == 0:
         on_ts_org[no_idx] = ts
         on_side[no_idx] = side
         on_px[no_idx] = px
+        on_px_idx[no_idx] = px_idx
+        # 订单号已按首次挂单顺序排列，新挂单恰好追加在有效前缀末尾
+        n_active[0] += 1
+    update_resting_set(no_idx, on_qty_remain, rest_idx, rest_pos, n_resting)
     if (side == Side.Bid.value and px > on_px[no_idx]) or (side == Side.Ask.value and px < on_px[no_idx]):
         on_px[no_idx] = px
+        on_px_idx[no_idx] = px_idx
+    on_amt_org[no_idx] = on_px[no_idx] * on_qty_org[no_idx] / 10000
+    on_amt_remain[no_idx] = on_px[no_idx] * on_qty_remain[no_idx] / 10000
     # update lob related
-    lob_idx = price_mapping[px]
     target_lob = lob_bid if side == Side.Bid.value else lob_ask
-    target_lob[lob_idx] += qty
+    target_lob[px_idx] += qty
+    update_level_bit(lob_bid_bitmap if side == Side.Bid.value else lob_ask_bitmap, px_idx, target_lob[px_idx])
+    update_ladder_tree(ladder_tree, side, px_idx, px, qty)
     # update best price
-    update_best_px(side, px, target_lob[lob_idx], best_px, best_if_lost)
+    update_best_px(side, px, target_lob[px_idx], best_px, best_if_lost)
+    update_level_count(no_idx, 1, side, on_px_idx, on_qty_remain, lob_count)
             
 
 @njit(types.void(
-    types.int64, types.int64, types.int32, types.int64, types.int64, types.int64[:], types.int64[:], types.int64[:], 
-    types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:], 
-    types.int64[:], types.int32[:], types.int64[:], 
+    types.int32, types.int64, types.int32, types.int64, types.int32, types.int64, 
+    types.int64[:], types.int64[:], types.int64[:], 
+    types.int64[:], types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:], types.int64[:], types.int32[:], types.int64[:], 
     types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:],  # 新增集合竞价成交量金额
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64),
+    types.float64[:], types.int32[:], types.int32[:], types.int64[:], types.int64[:, :, :], types.int64[:, :],
     types.int32, types.int32, types.int32, types.int32
-))
-def process_d_or_t(orderno, ts, side, px, qty, on_ts_d, on_ts_t, on_qty_remain, on_qty_d, on_qty_t, on_px,
-                   lob_bid, lob_ask, best_px, best_if_lost, on_amt_t,
+), cache=True)
+def process_d_or_t(target_no_idx, ts, side, px, px_idx, qty, on_ts_d, on_ts_t, on_qty_remain, 
+                   on_qty_d, on_qty_t, on_px, on_px_idx,
+                   lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost, on_amt_t,
                    on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                   orderno_mapping, price_mapping, 
-                   action_type, exchange, is_auction, trade_side):
+                   on_amt_remain, rest_idx, rest_pos, n_resting, ladder_tree, lob_count, action_type, exchange, 
+                   is_auction, trade_side):
     # update no related
-    if orderno not in orderno_mapping:
-        print('d or t', orderno)
+    ## 订单号不在委托数据中（预处理时映射为 -1），直接跳过
+    if target_no_idx < 0:
         return
-    target_no_idx = orderno_mapping[orderno]
+    update_level_count(target_no_idx, -1, side, on_px_idx, on_qty_remain, lob_count)
     on_qty_remain[target_no_idx] -= qty
     if action_type == Action.T.value:
-        on_qty_t[target_no_idx] += qty
+        add_if_tracked(on_qty_t, target_no_idx, qty)
         # 更新成交金额
         trade_amt = px * qty
-        on_amt_t[target_no_idx] += trade_amt
-        if on_ts_t[target_no_idx] == 0:
-            on_ts_t[target_no_idx] = ts
+        add_if_tracked(on_amt_t, target_no_idx, trade_amt)
+        set_first_ts_if_tracked(on_ts_t, target_no_idx, ts)
         
         # 新增：分别统计主动、被动和集合竞价成交
         if trade_side == Side.N.value:  # 集合竞价
-            on_qty_t_n[target_no_idx] += qty
-            on_amt_t_n[target_no_idx] += trade_amt
+            add_if_tracked(on_qty_t_n, target_no_idx, qty)
+            add_if_tracked(on_amt_t_n, target_no_idx, trade_amt)
         elif is_active_trade(trade_side, side):  # 主动成交
-            on_qty_t_a[target_no_idx] += qty
-            on_amt_t_a[target_no_idx] += trade_amt
+            add_if_tracked(on_qty_t_a, target_no_idx, qty)
+            add_if_tracked(on_amt_t_a, target_no_idx, trade_amt)
         else:  # 被动成交
-            on_qty_t_p[target_no_idx] += qty
-            on_amt_t_p[target_no_idx] += trade_amt
+            add_if_tracked(on_qty_t_p, target_no_idx, qty)
+            add_if_tracked(on_amt_t_p, target_no_idx, trade_amt)
             
     elif action_type == Action.D.value:
-        on_qty_d[target_no_idx] += qty
-        if on_ts_d[target_no_idx] == 0:
-            on_ts_d[target_no_idx] = ts
+        add_if_tracked(on_qty_d, target_no_idx, qty)
+        set_first_ts_if_tracked(on_ts_d, target_no_idx, ts)
     
     # update lob related
     ## 沪市非集合竞价成交，没有对应真实order，只有每笔trade反推出的order，导致每笔order价格不同
@@ -337,57 +518,68 @@ def process_d_or_t(orderno, ts, side, px, qty, on_ts_d, on_ts_t, on_qty_remain,
     if order_px == 0:
         ## 若order px为0，说明是沪市反推的order，且trade找不到对应的order，则加回一开始消耗掉的qty
         on_qty_remain[target_no_idx] += qty
+        on_amt_remain[target_no_idx] = on_px[target_no_idx] * on_qty_remain[target_no_idx] / 10000
+        update_resting_set(target_no_idx, on_qty_remain, rest_idx, rest_pos, n_resting)
     else:
-        lob_idx = price_mapping[order_px]
+        lob_idx = px_idx if use_data_px else on_px_idx[target_no_idx]
+        assert lob_idx >= 0
         target_lob = lob_bid if side == Side.Bid.value else lob_ask
         target_lob[lob_idx] -= qty
         assert target_lob[lob_idx] >= 0
+        update_level_bit(lob_bid_bitmap if side == Side.Bid.value else lob_ask_bitmap, lob_idx, target_lob[lob_idx])
+        update_ladder_tree(ladder_tree, side, lob_idx, order_px, -qty)
         # update best price
         update_best_px(side, order_px, target_lob[lob_idx], best_px, best_if_lost)
+        on_amt_remain[target_no_idx] = on_px[target_no_idx] * on_qty_remain[target_no_idx] / 10000
+        update_resting_set(target_no_idx, on_qty_remain, rest_idx, rest_pos, n_resting)
+    update_level_count(target_no_idx, 1, side, on_px_idx, on_qty_remain, lob_count)
 
 
 @njit(types.void(
-    types.int32, types.int64[:], types.int32[:],
-    DictType(types.int64, types.int64), types.int64[:], types.int64[:]
-))    
-def relocate_best_px(side, best_px, best_if_lost, price_mapping, prices, lob_side):
+    types.int32, types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.uint64[:]
+), cache=True)    
+def relocate_best_px(side, best_px, best_if_lost, prices, lob_side, level_bitmap):
     fake_best_px = best_px[side]
-    px_idx = price_mapping[fake_best_px]
+    px_idx = np.searchsorted(prices, fake_best_px)
+    # 借助档位占用位图直接跳到下一个非空档位
     if side == Side.Bid.value:
+        px_idx = find_prev_level(level_bitmap, px_idx)
         while px_idx >= 0 and lob_side[px_idx] <= MINIMUM_SIZE_FILTER:
-            px_idx -= 1
+            px_idx = find_prev_level(level_bitmap, px_idx - 1)
         best_px[side] = prices[px_idx] if px_idx >= 0 else DefaultPx.Bid.value
     elif side == Side.Ask.value:
+        px_idx = find_next_level(level_bitmap, px_idx, lob_side.size)
         while px_idx < lob_side.size and lob_side[px_idx] <= MINIMUM_SIZE_FILTER:
-            px_idx += 1
+            px_idx = find_next_level(level_bitmap, px_idx + 1, lob_side.size)
         best_px[side] = prices[px_idx] if px_idx < lob_side.size else DefaultPx.Ask.value
     best_if_lost[side] = 0
 
 
 @njit(types.void(
-    types.int64[:], types.int32[:], DictType(types.int64, types.int64),
-    types.int64[:], types.int64[:], types.int64[:]
-))
-def check_relocate_best_px(best_px, best_if_lost, price_mapping, prices, lob_bid, lob_ask):
+    types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:]
+), cache=True)
+def check_relocate_best_px(best_px, best_if_lost, prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap):
     if best_if_lost[0] == 1:
-        relocate_best_px(0, best_px, best_if_lost, price_mapping, prices, lob_bid)
+        relocate_best_px(0, best_px, best_if_lost, prices, lob_bid, lob_bid_bitmap)
     if best_if_lost[1] == 1:
-        relocate_best_px(1, best_px, best_if_lost, price_mapping, prices, lob_ask)
+        relocate_best_px(1, best_px, best_if_lost, prices, lob_ask, lob_ask_bitmap)
         
 
 @njit(types.void(
-    types.int64[:], types.int64[:], DictType(types.int64, types.int64),
-    types.int64[:], types.int64[:], types.int64[:]
-))
-def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping, prices, lob_bid, lob_ask):
+    types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:], 
+    types.uint64[:], types.uint64[:]
+), cache=True)
+def estimate_theoretical_best_price(best_px, best_px_post_match, prices, lob_bid, lob_ask, 
+                                    lob_bid_bitmap, lob_ask_bitmap):
     best_bid = best_px[0]
     best_ask = best_px[1]
     if best_bid < best_ask:
         best_px_post_match[0] = best_px[0]
         best_px_post_match[1] = best_px[1]
     else:
-        best_bid_idx = price_mapping[best_bid]
-        best_ask_idx = price_mapping[best_ask]
+        best_bid_idx = np.searchsorted(prices, best_bid)
+        best_ask_idx = np.searchsorted(prices, best_ask)
         len_lob = prices.size
         best_bid_remain = lob_bid[best_bid_idx]
         best_ask_remain = lob_ask[best_ask_idx]
@@ -397,11 +589,11 @@ def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping,
             best_bid_remain -= matched
             best_ask_remain -= matched
             
-            while best_bid_remain == 0 and best_bid_idx > 0:
-                best_bid_idx -= 1
+            if best_bid_remain == 0 and best_bid_idx > 0:
+                best_bid_idx = max(find_prev_level(lob_bid_bitmap, best_bid_idx - 1), 0)
                 best_bid_remain = lob_bid[best_bid_idx]
-            while best_ask_remain == 0 and best_ask_idx < len_lob - 1:
-                best_ask_idx += 1
+            if best_ask_remain == 0 and best_ask_idx < len_lob - 1:
+                best_ask_idx = min(find_next_level(lob_ask_bitmap, best_ask_idx + 1, len_lob), len_lob - 1)
                 best_ask_remain = lob_ask[best_ask_idx]
             if best_bid_idx == 0 or best_ask_idx == len_lob - 1:
                 break
@@ -417,89 +609,124 @@ def estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping,
 
 
 @njit(types.int64(
-    types.int64, types.int64, types.int64, types.int32[:], types.int64[:], types.int64[:],
-    order_type[:], trade_type[:],
-    DictType(types.int64, types.int64), DictType(types.int64, types.int64),
-    types.int64[:], types.int64[:], types.int64[:], types.int32[:], types.int64[:], 
+    types.int64, types.int64, types.int64, 
+    types.int64[:], types.int64[:], types.int32[:], types.int32[:], types.int32[:], types.int32[:], 
+    types.int8[:], types.int8[:], types.int8[:],
+    types.int64[:], types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int32[:], 
     types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:],
     types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:], types.int64[:],  # 新增集合竞价成交量金额
-    types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:], types.int64[:], types.int32
-))
-def loop_until_next_ts(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                       order_named_arr, trade_named_arr, 
-                       orderno_mapping, price_mapping,
-                       on_ts_org, on_ts_d, on_ts_t, on_side, on_px, 
+    types.float64[:], types.float64[:],
+    types.int64[:], types.int64[:], types.int32[:], types.int64[:], types.int64[:], 
+    types.int32[:], types.int32[:], types.int64[:],
+    types.float64[:], types.int32[:], types.int64[:, :, :], types.float64[:, :, :],
+    types.int64[:], types.int64[:, :], types.int64[:], types.int64[:, :, :, :],
+    types.int64[:], types.int64[:], types.int64[:], types.uint64[:], types.uint64[:], types.int64[:, :, :], 
+    types.int64[:, :], types.int64[:, :, :], types.int32
+), cache=True)
+def loop_until_next_ts(start_idx, nxt_target_ts, len_combined, 
+                       ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                       on_ts_org, on_ts_d, on_ts_t, on_side, on_px, on_px_idx, 
                        on_qty_org, on_qty_remain, on_qty_d, on_qty_t, on_amt_t,
                        on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                       best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange):      
+                       on_amt_org, on_amt_remain, 
+                       best_px, best_px_post_match, best_if_lost, n_active, match_from_ts, 
+                       rest_idx, rest_pos, n_resting, agg_thresholds, on_agg_bucket, side_agg, side_moments, 
+                       age_bounds, age_start, age_clock, age_hist, 
+                       unique_prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, ladder_tree, 
+                       lob_count, top_levels, exchange):      
     ts_pre = 0
     
     for c_i, c_idx in enumerate(range(start_idx, len_combined)):
         # read target data
-        data_type = data_type_arr[c_idx]
-        idx = index_arr[c_idx]
-        ts = time_arr[c_idx]
+        ts = ev_time[c_idx]
         
         if c_i != 0 and ts != ts_pre:
             if best_px[0] != 0 and best_px[1] != 0:
                 # step1: 找当前真实存在挂单的最优价
-                check_relocate_best_px(best_px, best_if_lost, price_mapping, unique_prices, lob_bid, lob_ask)
-                # step2: 模拟撮合后的最优价
-                estimate_theoretical_best_price(best_px, best_px_post_match, price_mapping, unique_prices, 
-                                                lob_bid, lob_ask)
-            # step3: 检查是否退出
+                check_relocate_best_px(best_px, best_if_lost, unique_prices, lob_bid, lob_ask, 
+                                       lob_bid_bitmap, lob_ask_bitmap)
+                # step2: 模拟撮合后的最优价；match_from_ts 之前只回放事件，退出前（ts 已超过目标时间点）才估计
+                if ts > match_from_ts[0]:
+                    estimate_theoretical_best_price(best_px, best_px_post_match, unique_prices, lob_bid, lob_ask, 
+                                                    lob_bid_bitmap, lob_ask_bitmap)
+            # step3: 检查是否退出，退出前按当前最优价更新盘口前 K 档，并把挂单时长直方图推进到目标时间点
             if ts > nxt_target_ts:
+                update_top_levels(best_px_post_match, unique_prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, 
+                                  lob_count, top_levels)
+                advance_age_buckets(nxt_target_ts, n_active[0], on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                                    on_agg_bucket, age_bounds, age_start, age_clock, age_hist)
                 return c_idx
             
-        if data_type == 0:
-            row = order_named_arr[idx]
-            orderno = row['orderno']
-            px = row['px']
-            qty = row['qty']
-            side = row['side']
-            ordertype = row['ordertype']
-            if ordertype == b'A':
-                process_a(orderno, ts, side, px, qty, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain,
-                          lob_bid, lob_ask, best_px, best_if_lost,
-                          orderno_mapping, price_mapping)
-            elif ordertype == b'D':
-                process_d_or_t(orderno, ts, side, px, qty, on_ts_d, on_ts_t, 
-                               on_qty_remain, on_qty_d, on_qty_t, on_px,
-                               lob_bid, lob_ask, best_px, best_if_lost, on_amt_t,
+        action = ev_action[c_idx]
+        px = ev_px[c_idx]
+        px_idx = ev_px_idx[c_idx]
+        qty = np.int64(ev_qty[c_idx])
+        side = np.int32(ev_side[c_idx])
+        if action == Action.T.value:
+            is_auction = np.int32(ev_is_auction[c_idx])
+            for target_no_idx, target_side in zip((ev_buy_idx[c_idx], ev_sell_idx[c_idx]), (0, 1)):
+                # 分方向累计量：事件前减去该订单的贡献，事件后加回（未挂单的订单不计入）
+                update_book_aggregates(target_no_idx, -1, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                                       on_qty_d, on_amt_t_a, on_amt_t_p, on_amt_org, on_amt_remain, agg_thresholds, 
+                                       on_agg_bucket, side_agg, side_moments, age_start, age_clock, age_hist)
+                process_d_or_t(target_no_idx, ts, target_side, px, px_idx, qty, on_ts_d, on_ts_t, 
+                               on_qty_remain, on_qty_d, on_qty_t, on_px, on_px_idx,
+                               lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost, on_amt_t,
                                on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                               orderno_mapping, price_mapping, 
-                               Action.D.value, exchange, 0, Side.N.value)
-        if data_type == 1:
-            row = trade_named_arr[idx]
-            tradp = row['tradp']
-            tradv = row['tradv']
-            buyno = row['buyno']
-            sellno = row['sellno']
-            side = row['side']
-            is_auction = row['is_auction']
-            for target_order_no, target_side in zip((buyno, sellno), (0, 1)):
-                process_d_or_t(target_order_no, ts, target_side, tradp, tradv, on_ts_d, on_ts_t, 
-                               on_qty_remain, on_qty_d, on_qty_t, on_px,
-                               lob_bid, lob_ask, best_px, best_if_lost, on_amt_t,
-                               on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                               orderno_mapping, price_mapping, 
+                               on_amt_remain, rest_idx, rest_pos, n_resting, ladder_tree, lob_count,
                                Action.T.value, exchange, is_auction, side)
+                update_book_aggregates(target_no_idx, 1, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                                       on_qty_d, on_amt_t_a, on_amt_t_p, on_amt_org, on_amt_remain, agg_thresholds, 
+                                       on_agg_bucket, side_agg, side_moments, age_start, age_clock, age_hist)
+        else:
+            no_idx = ev_buy_idx[c_idx] if side == Side.Bid.value else ev_sell_idx[c_idx]
+            update_book_aggregates(no_idx, -1, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                                   on_qty_d, on_amt_t_a, on_amt_t_p, on_amt_org, on_amt_remain, agg_thresholds, 
+                                   on_agg_bucket, side_agg, side_moments, age_start, age_clock, age_hist)
+            if action == Action.A.value:
+                process_a(no_idx, ts, side, px, px_idx, qty, 
+                          on_ts_org, on_side, on_px, on_px_idx, on_qty_org, on_qty_remain, on_amt_org, on_amt_remain,
+                          lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost, n_active,
+                          rest_idx, rest_pos, n_resting, ladder_tree, lob_count)
+            elif action == Action.D.value:
+                process_d_or_t(no_idx, ts, side, px, px_idx, qty, on_ts_d, on_ts_t, 
+                               on_qty_remain, on_qty_d, on_qty_t, on_px, on_px_idx,
+                               lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, best_px, best_if_lost, on_amt_t,
+                               on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
+                               on_amt_remain, rest_idx, rest_pos, n_resting, ladder_tree, lob_count,
+                               Action.D.value, exchange, 0, Side.N.value)
+            # 挂单后订单才计入累计量
+            update_book_aggregates(no_idx, 1, on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                                   on_qty_d, on_amt_t_a, on_amt_t_p, on_amt_org, on_amt_remain, agg_thresholds, 
+                                   on_agg_bucket, side_agg, side_moments, age_start, age_clock, age_hist)
         
         ts_pre = ts
+    update_top_levels(best_px_post_match, unique_prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, 
+                      lob_count, top_levels)
+    advance_age_buckets(nxt_target_ts, n_active[0], on_ts_org, on_side, on_px, on_qty_org, on_qty_remain, 
+                        on_agg_bucket, age_bounds, age_start, age_clock, age_hist)
     return len_combined
     
 
-def loop_until_next_ts_wrapper(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                               order_named_arr, trade_named_arr, 
-                               orderno_mapping, price_mapping,
-                               on_ts_org, on_ts_d, on_ts_t, on_side, on_px, 
+def loop_until_next_ts_wrapper(start_idx, nxt_target_ts, len_combined, 
+                               ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                               on_ts_org, on_ts_d, on_ts_t, on_side, on_px, on_px_idx, 
                                on_qty_org, on_qty_remain, on_qty_d, on_qty_t, on_amt_t,
                                on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                               best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange):
-    return loop_until_next_ts(start_idx, nxt_target_ts, len_combined, data_type_arr, index_arr, time_arr,
-                              order_named_arr, trade_named_arr, 
-                              orderno_mapping, price_mapping,
-                              on_ts_org, on_ts_d, on_ts_t, on_side, on_px, 
+                               on_amt_org, on_amt_remain, 
+                               best_px, best_px_post_match, best_if_lost, n_active, match_from_ts, 
+                               rest_idx, rest_pos, n_resting, agg_thresholds, on_agg_bucket, side_agg, side_moments, 
+                               age_bounds, age_start, age_clock, age_hist, 
+                               unique_prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, ladder_tree, 
+                               lob_count, top_levels, exchange):
+    return loop_until_next_ts(start_idx, nxt_target_ts, len_combined, 
+                              ev_time, ev_px, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side, ev_is_auction,
+                              on_ts_org, on_ts_d, on_ts_t, on_side, on_px, on_px_idx, 
                               on_qty_org, on_qty_remain, on_qty_d, on_qty_t, on_amt_t,
                               on_qty_t_a, on_amt_t_a, on_qty_t_p, on_amt_t_p, on_qty_t_n, on_amt_t_n,  # 新增集合竞价成交量金额
-                              best_px, best_px_post_match, best_if_lost, unique_prices, lob_bid, lob_ask, exchange)
\ No newline at end of file
+                              on_amt_org, on_amt_remain, 
+                              best_px, best_px_post_match, best_if_lost, n_active, match_from_ts, 
+                              rest_idx, rest_pos, n_resting, agg_thresholds, on_agg_bucket, side_agg, side_moments, 
+                              age_bounds, age_start, age_clock, age_hist, 
+                              unique_prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, ladder_tree, 
+                              lob_count, top_levels, exchange)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:25:43 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+from core.price_ladder import get_level_range
+
+
+# %%
+'''
+逐步谓词缓存：视图由若干谓词的“与”描述，每个目标时间点对有效订单把各不同谓词各算一次布尔掩码，
+所有视图共用，视图掩码只做按位与。逐步计算路径与编译的执行计划（core.step_plan）共用同一张谓词表。
+
+谓词以 (kind, arg) 标识：
+    side        on_side == arg
+    amount      on_amt_org >= arg（引擎维护的 on_px * on_qty_org / 10000）
+    price_band  on_px 在 mid_price * (1 ± arg) 内
+    trade_type  arg 为成交类型位标志（见 TRADE_TYPES），任一对应成交量 > 0
+    age         ts - on_ts_org <= arg 秒
+
+price_sorted_views 时有效订单已按价格排序（见 core.price_ladder.update_price_index），price_band 不再算掩码，
+而是换算为 [start, end) 切片，其余谓词的掩码在切片内取用。
+'''
+PREDICATE_KINDS = {'side': 0, 'amount': 1, 'price_band': 2, 'trade_type': 3, 'age': 4}
+SIDE, AMOUNT, PRICE_BAND, TRADE_TYPE, AGE = range(5)
+PREDICATE_INPUTS = ('on_side', 'on_px', 'on_amt_org', 'on_ts_org', 'on_qty_t_a', 'on_qty_t_p', 'on_qty_t_n')
+# 各类谓词读取的逐单列
+PREDICATE_KIND_INPUTS = {'side': ('on_side',), 'amount': ('on_amt_org',), 'price_band': ('on_px',), 
+                         'trade_type': ('on_qty_t_a', 'on_qty_t_p', 'on_qty_t_n'), 'age': ('on_ts_org',)}
+TRADE_TYPES = ('active', 'passive', 'auction')
+
+
+def get_trade_type_flags(view_info):
+    trade_types = view_info.get('trade_types', list(TRADE_TYPES))  # 默认包含所有类型
+    return float(sum(1 << i for i, trade_type in enumerate(TRADE_TYPES) if trade_type in trade_types))
+
+
+# %% kernels
+@njit(types.UniTuple(types.float64, 2)(types.int64[:], types.float64), cache=True)
+def get_price_bounds(best_px, price_range):
+    mid_price = (best_px[0] + best_px[1]) / 2
+    return mid_price * (1 - price_range), mid_price * (1 + price_range)
+
+
+@njit(types.void(
+    types.int64,  # kind
+    types.float64,  # arg
+    types.int64[:],  # best_px
+    types.int64,  # ts
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.float64[:],  # on_amt_org
+    types.int64[:],  # on_ts_org
+    types.int64[:],  # on_qty_t_a
+    types.int64[:],  # on_qty_t_p
+    types.int64[:],  # on_qty_t_n
+    types.boolean[:],  # out
+    ), cache=True)
+def eval_predicate(kind, arg, best_px, ts, on_side, on_px, on_amt_org, on_ts_org,
+                   on_qty_t_a, on_qty_t_p, on_qty_t_n, out):
+    n = len(out)
+    if kind == SIDE:
+        for i in range(n):
+            out[i] = on_side[i] == arg
+    elif kind == AMOUNT:
+        for i in range(n):
+            out[i] = on_amt_org[i] >= arg
+    elif kind == PRICE_BAND:
+        lower_bound, upper_bound = get_price_bounds(best_px, arg)
+        for i in range(n):
+            out[i] = on_px[i] >= lower_bound and on_px[i] <= upper_bound
+    elif kind == TRADE_TYPE:
+        flags = np.int64(arg)
+        for i in range(n):
+            out[i] = (((flags & 1) != 0 and on_qty_t_a[i] > 0) or ((flags & 2) != 0 and on_qty_t_p[i] > 0)
+                      or ((flags & 4) != 0 and on_qty_t_n[i] > 0))
+    elif kind == AGE:
+        for i in range(n):
+            out[i] = ts - on_ts_org[i] <= arg * 1000
+
+
+@njit(types.Tuple((types.int64, types.int64, types.int64, types.boolean[:]))(
+    types.int64[:],  # best_px
+    types.int64[:],  # prices
+    types.int64[:],  # level_offsets
+    types.boolean[:, :],  # pred_masks
+    types.int64,  # n_active
+    types.int64[:],  # view_preds
+    types.float64,  # view_band
+    types.boolean,  # requires_best_px
+    ), cache=True)
+def select_view(best_px, prices, level_offsets, pred_masks, n_active, view_preds, view_band, requires_best_px):
+    """
+    返回 (status, start, end, mask)：视图为有效订单 [start, end) 切片再按 mask 筛选，mask 为空表示不再筛选；
+    status != 0 时该视图当步跳过。view_band >= 0 时（仅 price_sorted_views）按价格区间切片。
+    """
+    empty = np.zeros(0, dtype=np.bool_)
+    if requires_best_px and (best_px[0] == 0 or best_px[1] == 0):
+        return 1, 0, 0, empty
+    start, end = 0, n_active
+    if view_band >= 0:
+        lower_bound, upper_bound = get_price_bounds(best_px, view_band)
+        start, end = get_level_range(prices, level_offsets, lower_bound, upper_bound)
+
+    n_preds = 0
+    for row in view_preds:
+        if row >= 0:
+            n_preds += 1
+    if n_preds == 0 or start == end:
+        return 0, start, end, empty
+    if n_preds == 1:
+        return 0, start, end, pred_masks[view_preds[0], start:end]
+    mask = pred_masks[view_preds[0], start:end].copy()
+    for row in view_preds[1:]:
+        if row >= 0:
+            mask &= pred_masks[row, start:end]
+    return 0, start, end, mask
+
+
+# %% memo
+class PredicateMemo:
+    """
+    各视图声明的谓词去重后的表与逐步掩码缓存。
+
+    view_predicates 为 {view_name: [(kind, arg), ...]}；给定 prices 与 level_offsets（price_sorted_views）时
+    price_band 换算为切片，不进谓词表。
+    """
+
+    def __init__(self, view_predicates, n_orders, requires_best_px, prices=None, level_offsets=None):
+        self.view_names = list(view_predicates)
+        self.requires_best_px = requires_best_px
+        self.price_sorted = prices is not None
+        self.prices = prices if self.price_sorted else np.zeros(0, dtype=np.int64)
+        self.level_offsets = level_offsets if self.price_sorted else np.zeros(1, dtype=np.int64)
+
+        predicates = []
+        view_rows = []
+        self.view_band = np.full(len(self.view_names), -1.0, dtype=np.float64)
+        for i_view, view_name in enumerate(self.view_names):
+            rows = []
+            for kind, arg in view_predicates[view_name]:
+                if kind not in PREDICATE_KINDS:
+                    raise ValueError(f'unknown predicate {kind} in view {view_name}')
+                if self.price_sorted and kind == 'price_band':
+                    self.view_band[i_view] = arg
+                    continue
+                predicate = (PREDICATE_KINDS[kind], float(arg))
+                if predicate not in predicates:
+                    predicates.append(predicate)
+                rows.append(predicates.index(predicate))
+            view_rows.append(rows)
+
+        self.pred_kinds = np.array([kind for kind, _ in predicates], dtype=np.int64)
+        self.pred_args = np.array([arg for _, arg in predicates], dtype=np.float64)
+        self.view_preds = np.full((len(self.view_names), max([len(rows) for rows in view_rows] + [1])),
+                                  -1, dtype=np.int64)
+        for i_view, rows in enumerate(view_rows):
+            self.view_preds[i_view, :len(rows)] = rows
+        self.pred_masks = np.zeros((len(predicates), n_orders), dtype=np.bool_)
+        self.view_idx = {view_name: i_view for i_view, view_name in enumerate(self.view_names)}
+
+    def evaluate(self, ts_dataset):
+        n_active = len(ts_dataset['on_px'])
+        best_px = ts_dataset['best_px']
+        ts = np.int64(ts_dataset['ts'])
+        columns = [ts_dataset[col] for col in PREDICATE_INPUTS]
+        for p in range(len(self.pred_kinds)):
+            eval_predicate(self.pred_kinds[p], self.pred_args[p], best_px, ts, *columns,
+                           self.pred_masks[p, :n_active])
+
+    def select(self, view_name, best_px, n_active):
+        i_view = self.view_idx[view_name]
+        return select_view(best_px, self.prices, self.level_offsets, self.pred_masks, n_active,
+                           self.view_preds[i_view], self.view_band[i_view], self.requires_best_px)
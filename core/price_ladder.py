@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 15:40:26 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+from utils.mapping import map_to_dense_idx
+
+
+# %%
+MAX_TICK_LADDER_LEVELS = 2_000_000
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+# %% ladder
+def get_price_ladder(order_px, tick_ladder=False):
+    """
+    生成价格档位数组。
+    
+    :param order_px: 当日全部委托价格
+    :param tick_ladder: False 时仅保留出现过的价格；True 时按最小价差铺满 [最低价, 最高价] 的等距网格，
+                        价格可直接算术换算为档位下标
+    :return: (prices, tick)，tick 为 0 表示非等距档位
+    """
+    unique_prices = np.unique(order_px).astype(np.int64)
+    if not tick_ladder or len(unique_prices) < 2:
+        return unique_prices, 0
+    px_min = unique_prices[0]
+    tick = int(np.gcd.reduce(unique_prices - px_min))
+    len_of_price = (unique_prices[-1] - px_min) // tick + 1
+    if len_of_price > MAX_TICK_LADDER_LEVELS:
+        # 异常价格导致网格过大时退回非等距档位
+        return unique_prices, 0
+    prices = px_min + tick * np.arange(len_of_price, dtype=np.int64)
+    return prices, tick
+
+
+def get_ladder_idx(px, prices, tick):
+    """价格映射为档位下标（int32），不在档位上的记为 -1"""
+    if tick == 0:
+        return map_to_dense_idx(px, prices)
+    offset = np.asarray(px, dtype=np.int64) - prices[0]
+    ladder_idx = offset // tick
+    on_grid = (offset % tick == 0) & (ladder_idx >= 0) & (ladder_idx < len(prices))
+    return np.where(on_grid, ladder_idx, -1).astype(np.int32)
+
+
+def init_level_bitmap(len_of_price):
+    """档位占用位图，每个 uint64 记录 64 个档位是否有挂单"""
+    return np.zeros((len_of_price + 63) // 64, dtype=np.uint64)
+
+
+# %% bitmap
+@njit(types.void(types.uint64[:], types.int64, types.int64), cache=True)
+def update_level_bit(level_bitmap, lob_idx, size):
+    word_idx = lob_idx >> 6
+    bit = np.uint64(1) << np.uint64(lob_idx & 63)
+    if size > 0:
+        level_bitmap[word_idx] |= bit
+    else:
+        level_bitmap[word_idx] &= ~bit
+
+
+@njit(types.int64(types.uint64), cache=True)
+def highest_bit(word):
+    pos = 0
+    for shift in (32, 16, 8, 4, 2, 1):
+        if word >> np.uint64(shift):
+            word >>= np.uint64(shift)
+            pos += shift
+    return pos
+
+
+@njit(types.int64(types.uint64[:], types.int64), cache=True)
+def find_prev_level(level_bitmap, lob_idx):
+    """返回 <= lob_idx 的最高非空档位下标，不存在返回 -1"""
+    if lob_idx < 0:
+        return -1
+    word_idx = lob_idx >> 6
+    word = level_bitmap[word_idx] & (ALL_ONES >> np.uint64(63 - (lob_idx & 63)))
+    while word == 0:
+        word_idx -= 1
+        if word_idx < 0:
+            return -1
+        word = level_bitmap[word_idx]
+    return (word_idx << 6) + highest_bit(word)
+
+
+@njit(types.int64(types.uint64[:], types.int64, types.int64), cache=True)
+def find_next_level(level_bitmap, lob_idx, len_of_price):
+    """返回 >= lob_idx 的最低非空档位下标，不存在返回 len_of_price"""
+    if lob_idx >= len_of_price:
+        return len_of_price
+    word_idx = lob_idx >> 6
+    word = level_bitmap[word_idx] & (ALL_ONES << np.uint64(lob_idx & 63))
+    while word == 0:
+        word_idx += 1
+        if word_idx >= level_bitmap.size:
+            return len_of_price
+        word = level_bitmap[word_idx]
+    return (word_idx << 6) + highest_bit(word & (~word + np.uint64(1)))
+
+
+# %% price index
+'''
+按 (档位, 方向) 分组的有效订单索引：对 [0, n_active) 做计数排序，得到订单置换 px_perm 与各组起始位置
+level_offsets（长度 2 * 档位数 + 1），组内保持到达顺序。
+档位 lvl、方向 side 的订单为 px_perm[level_offsets[2 * lvl + side]:level_offsets[2 * lvl + side + 1]]，
+档位区间 [lo, hi) 内的全部订单为 px_perm[level_offsets[2 * lo]:level_offsets[2 * hi]]，价格非降。
+订单可能以更优价格追加挂单而换档，因此每个目标时间点整体重排，代价 O(n_active + 档位数)。
+'''
+@njit(types.void(types.int32[:], types.int32[:], types.int64, types.int32[:], types.int64[:]), cache=True)
+def update_price_index(on_px_idx, on_side, n_active, px_perm, level_offsets):
+    level_offsets[:] = 0
+    for i in range(n_active):
+        level_offsets[2 * on_px_idx[i] + on_side[i] + 1] += 1
+    for group in range(1, len(level_offsets)):
+        level_offsets[group] += level_offsets[group-1]
+    cursor = level_offsets[:-1].copy()
+    for i in range(n_active):
+        group = 2 * on_px_idx[i] + on_side[i]
+        px_perm[cursor[group]] = i
+        cursor[group] += 1
+
+
+@njit(types.void(types.int32[:], types.int32[:], types.int32[:], types.int32[:], types.int64[:]), cache=True)
+def update_subset_price_index(on_px_idx, on_side, order_idx, px_perm, level_offsets):
+    """同 update_price_index，但只对 order_idx 中的订单（如剩余挂单集合）排序，px_perm 中为订单下标"""
+    level_offsets[:] = 0
+    for i in order_idx:
+        level_offsets[2 * on_px_idx[i] + on_side[i] + 1] += 1
+    for group in range(1, len(level_offsets)):
+        level_offsets[group] += level_offsets[group-1]
+    cursor = level_offsets[:-1].copy()
+    for i in order_idx:
+        group = 2 * on_px_idx[i] + on_side[i]
+        px_perm[cursor[group]] = i
+        cursor[group] += 1
+
+
+@njit(types.UniTuple(types.int64, 2)(types.int64[:], types.int64[:], types.float64, types.float64), cache=True)
+def get_level_range(prices, level_offsets, lower_bound, upper_bound):
+    """价格在 [lower_bound, upper_bound] 内的订单在 px_perm 中的范围"""
+    lo = np.searchsorted(prices, lower_bound, side='left')
+    hi = np.searchsorted(prices, upper_bound, side='right')
+    return level_offsets[2 * lo], level_offsets[2 * hi]
+
+
+# %% ladder tree
+'''
+档位树状数组（Fenwick tree）：ladder_tree[field, side, node]，int64，与 lob_bid / lob_ask 同步增量维护，
+field 为 LADDER_QTY（挂单量）或 LADDER_AMT（挂单金额 价格 * 量，未除以 10000）。
+单次更新与任意档位区间求和均为 O(log 档位数)，与订单数无关。
+node 维为 0（未开启 ladder_tree）时不做任何维护。
+'''
+LADDER_QTY, LADDER_AMT = 0, 1
+
+
+def init_ladder_tree(len_of_price, enabled=False):
+    return np.zeros((2, 2, len_of_price + 1 if enabled else 0), dtype=np.int64)
+
+
+@njit(types.void(types.int64[:, :, :], types.int32, types.int64, types.int64, types.int64), cache=True)
+def update_ladder_tree(ladder_tree, side, lob_idx, px, qty):
+    size = ladder_tree.shape[2]
+    if lob_idx < 0:
+        return
+    node = lob_idx + 1
+    while node < size:
+        ladder_tree[LADDER_QTY, side, node] += qty
+        ladder_tree[LADDER_AMT, side, node] += px * qty
+        node += node & -node
+
+
+@njit(types.int64(types.int64[:, :, :], types.int64, types.int64, types.int64), cache=True)
+def query_ladder_prefix(ladder_tree, field, side, hi):
+    """档位 [0, hi) 的累计量"""
+    total = 0
+    node = min(hi, ladder_tree.shape[2] - 1)
+    while node > 0:
+        total += ladder_tree[field, side, node]
+        node -= node & -node
+    return total
+
+
+@njit(types.int64(types.int64[:, :, :], types.int64[:], types.int64, types.int64, types.float64, types.float64), 
+      cache=True)
+def get_band_depth(ladder_tree, prices, field, side, lower_bound, upper_bound):
+    """价格在 [lower_bound, upper_bound] 内的档位累计量"""
+    lo = np.searchsorted(prices, lower_bound, side='left')
+    hi = np.searchsorted(prices, upper_bound, side='right')
+    if hi <= lo:
+        return 0
+    return query_ladder_prefix(ladder_tree, field, side, hi) - query_ladder_prefix(ladder_tree, field, side, lo)
+
+
+# %% top levels
+'''
+盘口前 K 档：top_levels[field, side, k]，int64，自最优价（best_px_post_match）沿档位占用位图向外逐档取非空档位，
+field 为 LEVEL_PX（价格）、LEVEL_QTY（该档挂单量）、LEVEL_COUNT（该档剩余量 > 0 的订单数，按订单自身价格计）。
+买方自买一向下、卖方自卖一向上，第 k 行为第 k+1 档，不足 K 档的行全为 0。
+回放在每个目标时间点退出前更新，代价 O(K)；k 维为 0（未设置 top_levels）时不做任何维护。
+'''
+LEVEL_PX, LEVEL_QTY, LEVEL_COUNT = 0, 1, 2
+
+
+def init_top_levels(len_of_price, n_levels=0):
+    lob_count = np.zeros((2, len_of_price if n_levels > 0 else 0), dtype=np.int64)
+    top_levels = np.zeros((3, 2, n_levels), dtype=np.int64)
+    return lob_count, top_levels
+
+
+@njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:],  # prices
+    types.int64[:],  # lob_bid
+    types.int64[:],  # lob_ask
+    types.uint64[:],  # lob_bid_bitmap
+    types.uint64[:],  # lob_ask_bitmap
+    types.int64[:, :],  # lob_count
+    types.int64[:, :, :],  # top_levels
+    ), cache=True)
+def update_top_levels(best_px, prices, lob_bid, lob_ask, lob_bid_bitmap, lob_ask_bitmap, lob_count, top_levels):
+    n_levels = top_levels.shape[2]
+    if n_levels == 0:
+        return
+    top_levels[:] = 0
+    len_of_price = prices.size
+    if best_px[0] != 0:
+        lob_idx = find_prev_level(lob_bid_bitmap, np.searchsorted(prices, best_px[0], side='right') - 1)
+        k = 0
+        while k < n_levels and lob_idx >= 0:
+            top_levels[LEVEL_PX, 0, k] = prices[lob_idx]
+            top_levels[LEVEL_QTY, 0, k] = lob_bid[lob_idx]
+            top_levels[LEVEL_COUNT, 0, k] = lob_count[0, lob_idx]
+            lob_idx = find_prev_level(lob_bid_bitmap, lob_idx - 1)
+            k += 1
+    if best_px[1] != 0:
+        lob_idx = find_next_level(lob_ask_bitmap, np.searchsorted(prices, best_px[1], side='left'), len_of_price)
+        k = 0
+        while k < n_levels and lob_idx < len_of_price:
+            top_levels[LEVEL_PX, 1, k] = prices[lob_idx]
+            top_levels[LEVEL_QTY, 1, k] = lob_ask[lob_idx]
+            top_levels[LEVEL_COUNT, 1, k] = lob_count[1, lob_idx]
+            lob_idx = find_next_level(lob_ask_bitmap, lob_idx + 1, len_of_price)
+            k += 1
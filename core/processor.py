@@ -39,6 +39,7 @@ from utils.timeutils import generate_date_range
 from utils.naming import generate_factor_names
 from utils.param import para_allocation
 from utils.speedutils import timeit
+from indicators.registry import validate_indicator_param
 
 
 # %% new test
@@ -129,14 +130,7 @@ class IndicatorProcessor:
         generate_one_symbol_one_day_func, symbols = self._init_process_one_symbol_oneday_info(date, self.params)
         futures = []
         for symbol in symbols:
-            if symbol not in self.hf_dict:
-                hdf_file_path = self.save_dir / f'{symbol}.h5'
-                try:
-                    self.hf_dict[symbol] = h5py.File(hdf_file_path, 'a')
-                except Exception as e:
-                    print(f'{symbol} failed to open h5: {e}')
-                    self.hf_dict[symbol] = h5py.File(hdf_file_path, 'w')
-            hf = self.hf_dict[symbol]
+            hf = self._get_hf(symbol)
             if not self.replace_exist:
                 if date in list(hf.keys()):
                     continue
@@ -144,6 +138,16 @@ class IndicatorProcessor:
             futures.append((generate_one_symbol_one_day_func, date, save_func, symbol))
         return futures
 
+    def _get_hf(self, symbol):
+        if symbol not in self.hf_dict:
+            hdf_file_path = self.save_dir / f'{symbol}.h5'
+            try:
+                self.hf_dict[symbol] = h5py.File(hdf_file_path, 'a')
+            except Exception as e:
+                print(f'{symbol} failed to open h5: {e}')
+                self.hf_dict[symbol] = h5py.File(hdf_file_path, 'w')
+        return self.hf_dict[symbol]
+
     def run(self):
         self.dates = generate_date_range(self.start_date, self.end_date)
         
@@ -324,11 +328,111 @@ class IndicatorProcessorByL2Batch(IndicatorProcessorByL2):
         self.params['view_infos'] = view_infos
         self.params['indxview_count'] = indxview_count
         self.params['factor_idx_mapping'] = factor_idx_mapping
+        # 启动前检查各指标配置，避免在 worker 中才报错
+        for ind_cate in ind_cates:
+            validate_indicator_param(ind_cate, self.params[ind_cate])
         
         with open(self.ind_dir / 'factors.json', 'w') as f:
             json.dump(factor_list, f, indent=4)
 
 
+# %% snapshot
+class IndicatorProcessorBySnapshot(IndicatorProcessorByL2Batch):
+    """
+    在已落盘的订单簿快照上计算指标（由带 snapshot_dir 参数的回放生成，见 core.book_snapshot），
+    不加载逐笔数据、不回放事件。ind_class 须为 GroupGenerate 子类。
+    """
+    
+    def _init_process_one_symbol_oneday_info(self, date, params):
+        snapshot_date_dir = Path(params['snapshot_dir']) / date
+        generate_one_symbol_one_day_func = partial(generate_one_symbol_one_day_snapshot, date=date,
+                                                   params=params, ind_class=self.ind_class)
+        symbols = []
+        if snapshot_date_dir.exists():
+            symbols = [snapshot_dir.name for snapshot_dir in snapshot_date_dir.iterdir() 
+                       if (snapshot_dir / 'meta.json').exists()]
+        return generate_one_symbol_one_day_func, symbols
+    
+    
+def generate_one_symbol_one_day_snapshot(symbol, date, params, ind_class):
+    try:
+        go = ind_class.from_snapshot(symbol, date, params)
+        res = go.run()
+        return res
+    except:
+        traceback.print_exc()
+        print('process', symbol, date)
+        sys.stdout.flush()
+        return None
+    
+    
+# %% multi version
+class IndicatorProcessorByL2MultiVersion(IndicatorProcessorByL2):
+    """
+    多个 Batch 版本共用一次回放：每个 symbol-day 只加载并回放一次，快照分发给各版本的
+    _cut_view + 指标，结果写入各版本自己的 by_symbol_by_date。
+    
+    ind_ver_name 为逗号分隔的版本名（或版本名列表），各版本参数须为 IndicatorProcessorByL2Batch 格式。
+    """
+    
+    def __init__(self, ind_ver_name, 
+                 start_date, end_date,
+                 n_workers, task_n_group, save_n_group, replace_exist=True, mode='init'):
+        ind_ver_names = ind_ver_name.split(',') if isinstance(ind_ver_name, str) else list(ind_ver_name)
+        self.sub_processors = {
+            name: IndicatorProcessorByL2Batch(name, start_date, end_date, 
+                                              n_workers, task_n_group, save_n_group, 
+                                              replace_exist=replace_exist, mode=mode)
+            for name in ind_ver_names
+            }
+        super().__init__(ind_ver_names, 
+                         start_date, end_date,
+                         n_workers, task_n_group, save_n_group, replace_exist=replace_exist, mode=mode)
+        
+    def _initialize_directories(self):
+        # 输出目录由各版本的 sub_processor 负责，这里只需要行情数据目录
+        file_path = Path(__file__).resolve()
+        self.project_dir = file_path.parents[1]
+        path_config = load_path_config(self.project_dir)
+        self.trade_dir = Path(path_config['trade'])
+        self.order_dir = Path(path_config['order'])
+        
+    def _load_params(self):
+        self.params = {name: sub.params for name, sub in self.sub_processors.items()}
+        
+    def _load_indicator_info(self):
+        ind_module = importlib.import_module('core.auto_generate_full')
+        ind_classes = {name: sub.ind_class for name, sub in self.sub_processors.items()}
+        ind_module.check_shared_replay_params(self.params)
+        self.ind_class = partial(ind_module.MultiVersionGenerate, ind_classes=ind_classes)
+        
+    def process_one_day(self, date):
+        generate_one_symbol_one_day_func, symbols = self._init_process_one_symbol_oneday_info(date, self.params)
+        futures = []
+        for symbol in symbols:
+            hf_by_ver = {}
+            for name, sub in self.sub_processors.items():
+                hf = sub._get_hf(symbol)
+                if not self.replace_exist and date in list(hf.keys()):
+                    continue
+                hf_by_ver[name] = hf
+            if not hf_by_ver:
+                continue
+            self.hf_dict[symbol] = hf_by_ver
+            save_func = partial(save_multi_version_res, hf_by_ver=hf_by_ver, replace_exist=self.replace_exist)
+            futures.append((generate_one_symbol_one_day_func, date, save_func, symbol))
+        return futures
+    
+    def _close_file(self):
+        for sub in self.sub_processors.values():
+            sub._close_file()
+            
+            
+def save_multi_version_res(date, res, hf_by_ver, replace_exist):
+    for ind_ver_name, hf in hf_by_ver.items():
+        save_one_res(date, res[ind_ver_name], hf, replace_exist)
+            
+
 def get_info_fr_params(params):
     
     shared_param = params.get('shared_param', {})
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:06:35 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+# %%
+'''
+回放时维护的整簿分方向累计量：side_agg[field, side, bucket]，int64，随事件增量更新，读取为 O(1)。
+
+bucket 为订单原始金额 on_amt_org 所在的金额阈值区间：agg_thresholds 升序，
+bucket = 满足 agg_thresholds[j] <= on_amt_org 的 j 的个数，因此 “on_amt_org >= agg_thresholds[j]” 即 bucket > j。
+
+各字段为已挂单订单（[0, n_active) 前缀）对应列之和，金额未除以 10000：
+    REMAIN_QTY   on_qty_remain
+    REMAIN_AMT   on_px * on_qty_remain
+    CANCEL_QTY   on_qty_d
+    ACTIVE_AMT   on_amt_t_a
+    PASSIVE_AMT  on_amt_t_p
+
+每个事件前后分别减去、加回所涉订单的全部贡献，订单追加挂单换价或换金额区间时也保持一致。
+agg_thresholds 为空（未配置 side_aggregate_thresholds）时 side_agg 的 bucket 维为 0，不做任何维护。
+'''
+REMAIN_QTY, REMAIN_AMT, CANCEL_QTY, ACTIVE_AMT, PASSIVE_AMT = range(5)
+SIDE_AGGREGATE_FIELDS = ('remain_qty', 'remain_amt', 'cancel_qty', 'active_amt', 'passive_amt')
+
+
+def init_side_aggregates(agg_thresholds, n_orders):
+    agg_thresholds = np.sort(np.asarray(agg_thresholds if agg_thresholds is not None else [], dtype=np.float64))
+    n_buckets = len(agg_thresholds) + 1 if len(agg_thresholds) > 0 else 0
+    on_agg_bucket = np.zeros(n_orders, dtype=np.int32)
+    side_agg = np.zeros((len(SIDE_AGGREGATE_FIELDS), 2, n_buckets), dtype=np.int64)
+    return agg_thresholds, on_agg_bucket, side_agg
+
+
+# %% kernels
+@njit(types.void(
+    types.int32,  # no_idx
+    types.int64,  # sign
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_remain
+    types.int64[:],  # on_qty_d
+    types.int64[:],  # on_amt_t_a
+    types.int64[:],  # on_amt_t_p
+    types.float64[:],  # on_amt_org
+    types.float64[:],  # agg_thresholds
+    types.int32[:],  # on_agg_bucket
+    types.int64[:, :, :],  # side_agg
+    ), cache=True)
+def update_side_aggregates(no_idx, sign, on_side, on_px, on_qty_remain, on_qty_d, on_amt_t_a, on_amt_t_p,
+                           on_amt_org, agg_thresholds, on_agg_bucket, side_agg):
+    """sign 为 -1 时减去订单 no_idx 的贡献，为 1 时按其当前金额区间加回"""
+    if sign > 0:
+        on_agg_bucket[no_idx] = np.searchsorted(agg_thresholds, on_amt_org[no_idx], side='right')
+    side = on_side[no_idx]
+    bucket = on_agg_bucket[no_idx]
+    side_agg[REMAIN_QTY, side, bucket] += sign * on_qty_remain[no_idx]
+    side_agg[REMAIN_AMT, side, bucket] += sign * on_px[no_idx] * on_qty_remain[no_idx]
+    side_agg[CANCEL_QTY, side, bucket] += sign * on_qty_d[no_idx]
+    side_agg[ACTIVE_AMT, side, bucket] += sign * on_amt_t_a[no_idx]
+    side_agg[PASSIVE_AMT, side, bucket] += sign * on_amt_t_p[no_idx]
+
+
+@njit(types.void(
+    types.int64,  # n_active
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_remain
+    types.int64[:],  # on_qty_d
+    types.int64[:],  # on_amt_t_a
+    types.int64[:],  # on_amt_t_p
+    types.float64[:],  # on_amt_org
+    types.float64[:],  # agg_thresholds
+    types.int64[:, :, :],  # out
+    ), cache=True)
+def recompute_side_aggregates(n_active, on_side, on_px, on_qty_remain, on_qty_d, on_amt_t_a, on_amt_t_p,
+                              on_amt_org, agg_thresholds, out):
+    """对 [0, n_active) 全量重算 side_agg，用于校验增量维护的结果"""
+    out[:] = 0
+    for i in range(n_active):
+        side = on_side[i]
+        bucket = np.searchsorted(agg_thresholds, on_amt_org[i], side='right')
+        out[REMAIN_QTY, side, bucket] += on_qty_remain[i]
+        out[REMAIN_AMT, side, bucket] += on_px[i] * on_qty_remain[i]
+        out[CANCEL_QTY, side, bucket] += on_qty_d[i]
+        out[ACTIVE_AMT, side, bucket] += on_amt_t_a[i]
+        out[PASSIVE_AMT, side, bucket] += on_amt_t_p[i]
+
+
+@njit(types.int64(types.float64[:], types.float64), cache=True)
+def get_threshold_bucket(agg_thresholds, threshold):
+    """
+    原始金额 >= threshold 的订单即 bucket >= 返回值的订单，side_agg[field, side, 返回值:] 求和即可；
+    threshold 须为 agg_thresholds 之一或不大于 0（全部订单），否则无法由分区间累计量得到，返回 -1。
+    """
+    if threshold <= 0:
+        return 0
+    j = np.searchsorted(agg_thresholds, threshold, side='left')
+    if j >= len(agg_thresholds) or agg_thresholds[j] != threshold:
+        return -1
+    return j + 1
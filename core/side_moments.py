@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:26:51 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+# %%
+'''
+回放时维护的整簿分方向幂和：side_moments[part, field, side]，float64，随事件增量更新，方差/偏度/峰度/熵类指标每步 O(1)。
+
+各字段为已挂单订单（[0, n_active) 前缀）之和，a 为剩余挂单金额 on_amt_remain，px 为 on_px，r 为 on_qty_remain：
+    COUNT        订单数（含已全部撤单/成交的订单，与 Batch3 中逐单计算的口径一致）
+    AMT1..AMT4   a, a², a³, a⁴
+    PX_AMT       a * px
+    PX2_AMT      a * px²
+    QTY          r（仅 r > 0）
+    QTY_LOG_QTY  r * log(r)（仅 r > 0）
+
+浮点增减会累积舍入误差，因此每次增减用 TwoSum 把舍入误差记入补偿项：part 0 为和，part 1 为补偿，
+取值为两者之和（get_side_moment）。另可按 side_moment_check_interval 定期全量重算、报告漂移并重置。
+side 维为 0（未开启 side_moments）时不做任何维护。
+'''
+(COUNT, AMT1, AMT2, AMT3, AMT4, PX_AMT, PX2_AMT, QTY, QTY_LOG_QTY) = range(9)
+SIDE_MOMENT_FIELDS = ('count', 'amt1', 'amt2', 'amt3', 'amt4', 'px_amt', 'px2_amt', 'qty', 'qty_log_qty')
+SIDE_MOMENT_DRIFT_TOL = 1e-9
+
+
+def init_side_moments(enabled=False):
+    return np.zeros((2, len(SIDE_MOMENT_FIELDS), 2 if enabled else 0), dtype=np.float64)
+
+
+# %% kernels
+@njit(types.void(types.float64[:, :, :], types.int64, types.int64, types.float64), cache=True)
+def add_to_moment(side_moments, field, side, x):
+    # TwoSum：s + err 恰为 旧和 + x，err 累加进补偿项
+    total = side_moments[0, field, side]
+    s = total + x
+    bp = s - total
+    err = (total - (s - bp)) + (x - bp)
+    side_moments[0, field, side] = s
+    side_moments[1, field, side] += err
+
+
+@njit(types.void(
+    types.int32,  # no_idx
+    types.float64,  # sign
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_remain
+    types.float64[:],  # on_amt_remain
+    types.float64[:, :, :],  # side_moments
+    ), cache=True)
+def update_side_moments(no_idx, sign, on_side, on_px, on_qty_remain, on_amt_remain, side_moments):
+    """sign 为 -1 时减去订单 no_idx 的贡献，为 1 时按其当前状态加回"""
+    side = on_side[no_idx]
+    a = on_amt_remain[no_idx]
+    px = np.float64(on_px[no_idx])
+    add_to_moment(side_moments, COUNT, side, sign)
+    add_to_moment(side_moments, AMT1, side, sign * a)
+    add_to_moment(side_moments, AMT2, side, sign * a * a)
+    add_to_moment(side_moments, AMT3, side, sign * a * a * a)
+    add_to_moment(side_moments, AMT4, side, sign * a * a * a * a)
+    add_to_moment(side_moments, PX_AMT, side, sign * a * px)
+    add_to_moment(side_moments, PX2_AMT, side, sign * a * px * px)
+    r = on_qty_remain[no_idx]
+    if r > 0:
+        add_to_moment(side_moments, QTY, side, sign * r)
+        add_to_moment(side_moments, QTY_LOG_QTY, side, sign * r * np.log(r))
+
+
+@njit(types.void(
+    types.int64,  # n_active
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.int64[:],  # on_qty_remain
+    types.float64[:],  # on_amt_remain
+    types.float64[:, :, :],  # out
+    ), cache=True)
+def recompute_side_moments(n_active, on_side, on_px, on_qty_remain, on_amt_remain, out):
+    """对 [0, n_active) 全量重算 side_moments，用于校验并重置增量维护的结果"""
+    out[:] = 0
+    for i in range(n_active):
+        update_side_moments(np.int32(i), 1., on_side, on_px, on_qty_remain, on_amt_remain, out)
+
+
+@njit(types.float64(types.float64[:, :, :], types.int64, types.int64), cache=True)
+def get_side_moment(side_moments, field, side):
+    return side_moments[0, field, side] + side_moments[1, field, side]
+
+
+@njit(types.UniTuple(types.float64, 3)(types.float64[:, :, :], types.int64), cache=True)
+def get_amount_central_moments(side_moments, side):
+    """剩余挂单金额的 (均值, 方差, 二阶原点矩)，总体口径（同 np.mean / np.var）"""
+    n = get_side_moment(side_moments, COUNT, side)
+    mean = get_side_moment(side_moments, AMT1, side) / n
+    raw2 = get_side_moment(side_moments, AMT2, side) / n
+    return mean, raw2 - mean ** 2, raw2
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:12:08 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import njit, types
+
+
+# %%
+'''
+逐步逐视图共用的排序统计量：分位数类指标不再各自按参数反复排序，每步每个视图只排一次，
+任一加权分位数、价格阈值下的累计金额即为一次二分查找。
+
+只有配置中某个指标以下列名字为输入时才计算，作为视图数据传入（长度均为视图订单数，买方在前、卖方在后）：
+    sorted_side_offsets   (3,) 分段边界：买方为 [offsets[0], offsets[1])，卖方为 [offsets[1], offsets[2])
+    sorted_px_order       各方向内按价格升序的订单在视图中的位置，同价保持视图内顺序
+    sorted_px             按上述顺序排列的价格
+    sorted_px_amt_cumsum  按上述顺序、各方向内从头累加的剩余挂单金额 on_amt_remain
+    sorted_amt            各方向内升序排列的剩余挂单金额
+'''
+SORTED_STATS_INPUTS = ('sorted_side_offsets', 'sorted_px_order', 'sorted_px', 'sorted_px_amt_cumsum', 'sorted_amt')
+SORTED_STATS_COLUMNS = ('on_side', 'on_px', 'on_amt_remain')
+
+
+# %% kernels
+@njit(types.void(
+    types.int32[:],  # on_side
+    types.int64[:],  # on_px
+    types.float64[:],  # on_amt_remain
+    types.int64[:],  # side_offsets
+    types.int64[:],  # px_order
+    types.int64[:],  # px_sorted
+    types.float64[:],  # px_amt_cumsum
+    types.float64[:],  # amt_sorted
+    ), cache=True)
+def compute_sorted_stats(on_side, on_px, on_amt_remain, side_offsets, px_order, px_sorted, px_amt_cumsum, amt_sorted):
+    n = len(on_side)
+    n_bid = 0
+    for i in range(n):
+        if on_side[i] == 0:
+            n_bid += 1
+    side_offsets[0] = 0
+    side_offsets[1] = n_bid
+    side_offsets[2] = n
+
+    # 先按方向分段（段内保持视图顺序），再在段内按价格稳定排序
+    cursor = np.zeros(2, dtype=np.int64)
+    cursor[1] = n_bid
+    for i in range(n):
+        side = on_side[i]
+        px_order[cursor[side]] = i
+        cursor[side] += 1
+    for side in range(2):
+        start, end = side_offsets[side], side_offsets[side + 1]
+        if end - start == 0:
+            continue
+        segment = px_order[start:end].copy()
+        rank = np.argsort(on_px[segment], kind='mergesort')
+        cum_amt = 0.
+        for k in range(end - start):
+            i = segment[rank[k]]
+            px_order[start + k] = i
+            px_sorted[start + k] = on_px[i]
+            cum_amt += on_amt_remain[i]
+            px_amt_cumsum[start + k] = cum_amt
+            amt_sorted[start + k] = on_amt_remain[i]
+        amt_sorted[start:end] = np.sort(amt_sorted[start:end])
+
+
+@njit(types.float64(types.float64[:], types.float64), cache=True)
+def get_sorted_percentile(sorted_values, q):
+    """升序数组的 q 分位数（0 <= q <= 1），线性插值，与 numba 下 np.percentile(values, q * 100) 逐位一致"""
+    n = len(sorted_values)
+    percentile = q * 100
+    if n == 1:
+        return sorted_values[0]
+    if percentile == 100:
+        return sorted_values[n - 1]
+    if percentile == 0:
+        return sorted_values[0]
+    rank = 1 + (n - 1) * (percentile / 100.0)
+    f = np.floor(rank)
+    m = rank - f
+    k = int(f - 1)
+    return sorted_values[k] * (1 - m) + sorted_values[k + 1] * m
+
+
+@njit(types.int64(types.float64[:], types.float64, types.float64), cache=True)
+def search_cumsum_fraction(cumsum, total, q):
+    """累计占比 cumsum / total 首个 > q 的位置（同 np.searchsorted(cumsum / total, q, side='right')），不另建数组"""
+    lo, hi = 0, len(cumsum)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cumsum[mid] / total <= q:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# %% buffers
+class SortedStats:
+    """按订单总数预分配的缓冲区，每个视图计算后以切片写入视图数据"""
+
+    def __init__(self, n_orders):
+        self.side_offsets = np.zeros(3, dtype=np.int64)
+        self.px_order = np.zeros(n_orders, dtype=np.int64)
+        self.px_sorted = np.zeros(n_orders, dtype=np.int64)
+        self.px_amt_cumsum = np.zeros(n_orders, dtype=np.float64)
+        self.amt_sorted = np.zeros(n_orders, dtype=np.float64)
+
+    @property
+    def buffers(self):
+        return self.side_offsets, self.px_order, self.px_sorted, self.px_amt_cumsum, self.amt_sorted
+
+    def update(self, view_dataset):
+        n = len(view_dataset['on_side'])
+        stats = [self.side_offsets] + [buffer[:n] for buffer in self.buffers[1:]]
+        compute_sorted_stats(*[view_dataset[col] for col in SORTED_STATS_COLUMNS], *stats)
+        view_dataset.update(zip(SORTED_STATS_INPUTS, stats))
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:41:06 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import os
+import sys
+import time
+import inspect
+import hashlib
+import importlib.util
+import numpy as np
+from pathlib import Path
+from numba import typeof
+
+
+from core.go_through_book_full import loop_until_next_ts
+from core.price_ladder import update_price_index, update_subset_price_index
+from core.predicates import PREDICATE_INPUTS, eval_predicate
+from core.sorted_stats import SORTED_STATS_INPUTS, SORTED_STATS_COLUMNS, compute_sorted_stats
+from indicators.registry import OUTPUT_NAME, get_indicator_spec
+
+
+# %%
+'''
+编译的逐步执行计划：把配置（ind_cates、view_infos、各指标 inputs）展开为一个 numba 驱动函数，
+一次调用内完成 回放到目标时间点 → 逐视图切分 → 计算全部指标，整个 symbol-day 只进出 Python 一次。
+
+- 视图：各视图声明的谓词去重为一张表（见 core.predicates.PredicateMemo），驱动每步对各谓词算一次掩码，
+  再按 view_preds 逐视图取“与”，因此视图在驱动内是循环而非展开，生成代码的长度只与指标数有关。
+- 指标：同一指标在各视图的输出在 recorded_dataset 中首尾相接，取为 (n_ts, n_views, count, 2) 的视图，
+  kernel 直接写入当步当视图的 (count, 2) 切片。
+- price_sorted：价格区间类视图改用按价格排序布局（core.price_ladder.update_price_index），
+  每步只重排一次，各视图为其上的切片。
+- resting：只取剩余量 > 0 的订单（回放时增量维护的 rest_idx），每步代价随当前盘口深度而非当日累计订单数增长。
+- 排序统计量：有指标以 core.sorted_stats 中的量为输入时，每个视图切分后排序一次，写入预分配的缓冲区切片。
+- 出错：每个指标调用各自 try/except，出错时该步输出置为 NaN 并计数，记下各 (指标, 视图) 首次出错的步，
+  结束后打印，不影响其它指标与后续步。
+
+生成的源码按内容哈希写入计划目录后作为模块导入，numba 可按文件缓存驱动的编译结果。
+驱动会内联所调用的 kernel，因此哈希中包含各依赖目录下源文件的 mtime 与大小，kernel 改动后自动重新生成。
+计划目录为配置中的 step_plan_dir，未配置时为 core/__pycache__/step_plans，不可写时（如只读部署）同 numba
+退回用户缓存目录；每次载入时更新计划的 .used 时间，生成新计划时清理 PLAN_RETENTION_DAYS 天内未用过的计划。
+'''
+PLAN_DIR = Path(__file__).resolve().parent / '__pycache__' / 'step_plans'
+PLAN_RETENTION_DAYS = 7
+UTILS_DIR = Path(__file__).resolve().parents[1] / 'utils'
+REPLAY_INPUTS = tuple(inspect.signature(loop_until_next_ts.py_func).parameters)[2:]  # 去掉 start_idx, nxt_target_ts
+
+
+# %% plan
+class StepPlan:
+
+    def __init__(self, group, memo):
+        self.memo = memo
+        self.price_sorted = memo.price_sorted
+        self.resting = group.resting
+        self.sorted_stats = group.sorted_stats
+        self.param = group.param
+        self.ind_cates = self.param['ind_cates']
+        self.view_names = list(self.param['view_infos'])
+        self.n_ts = len(group.stepper.target_ts)
+        self.prefix_cols = [col for col in group.list_to_check_valid if col in group.dataset]
+        self.dataset_arrays = [col for col, value in group.dataset.items() if isinstance(value, np.ndarray)]
+
+        self.specs = [get_indicator_spec(ind_cate, self.param[ind_cate].get('module')) 
+                      for ind_cate in self.ind_cates]
+        # 同逐步计算，按 TOML 中 inputs 的顺序按位置传参
+        self.inputs = [list(self.param[ind_cate]['inputs']) for ind_cate in self.ind_cates]
+        source = self._build_source()
+        plan_dir = get_plan_dir(self.param.get('step_plan_dir'))
+        self.driver = load_plan_module(source, self._get_dependency_files(), plan_dir).run_plan
+        self.args = self._get_args(group)
+
+    def _get_dependency_files(self):
+        # kernel 还会调用同目录或 utils 下的 njit 函数，按目录收集
+        modules = {loop_until_next_ts.py_func.__module__, update_price_index.py_func.__module__, 
+                   eval_predicate.py_func.__module__}
+        modules.update(spec.module_name for spec in self.specs)
+        dirs = {Path(sys.modules[module_name].__file__).parent for module_name in modules}
+        dirs.add(UTILS_DIR)
+        return sorted(file for dir_path in dirs for file in dir_path.glob('*.py'))
+
+    def _get_input_expr(self, i_ind, ipt_name, param_dict):
+        if ipt_name == OUTPUT_NAME:
+            return f'out{i_ind}[ts_idx, v]'
+        if ipt_name == 'ts':
+            return 'ts'
+        if ipt_name in self.prefix_cols or ipt_name in SORTED_STATS_INPUTS:
+            return f'v_{ipt_name}'
+        if ipt_name in self.dataset_arrays:
+            return f'd_{ipt_name}'
+        if ipt_name in param_dict:
+            return f'p{i_ind}_{ipt_name}'
+        raise ValueError(f'{self.ind_cates[i_ind]}: input {ipt_name} is not available in step plan')
+
+    def _build_source(self):
+        self.param_names = []
+        view_cols = [col for col in self.prefix_cols
+                     if any(col in inputs for inputs in self.inputs) 
+                     or (self.sorted_stats is not None and col in SORTED_STATS_COLUMNS)]
+
+        header = [
+            'import numpy as np',
+            'from numba import njit',
+            '',
+            f'from {loop_until_next_ts.py_func.__module__} import loop_until_next_ts',
+            f'from {update_price_index.py_func.__module__} import update_price_index, update_subset_price_index',
+            f'from {eval_predicate.py_func.__module__} import eval_predicate, select_view',
+            f'from {compute_sorted_stats.py_func.__module__} import compute_sorted_stats',
+            'from indicators.registry import load_indicator',
+            '',
+            ]
+        calls = []
+        for i_ind, spec in enumerate(self.specs):
+            header.append(f"ind{i_ind} = load_indicator('{spec.name}', '{spec.module_name}')")
+            param_dict = self.param[spec.name]['param']
+            self.param_names.extend((i_ind, k) for k in self.inputs[i_ind] if k in param_dict)
+            exprs = ', '.join(self._get_input_expr(i_ind, ipt_name, param_dict) for ipt_name in self.inputs[i_ind])
+            calls += [
+                '            try:',
+                f'                ind{i_ind}({exprs})',
+                '            except Exception:',
+                # kernel 直接写入输出块，中途出错时丢弃已写入的部分，该步保持 NaN
+                f'                out{i_ind}[ts_idx, v] = np.nan',
+                f'                if errors[{i_ind}, v] == 0:',
+                f'                    first_errors[{i_ind}, v] = ts_idx',
+                f'                errors[{i_ind}, v] += 1',
+                ]
+
+        arg_names = (['target_ts', 'start_idx'] + [f'r_{name}' for name in REPLAY_INPUTS]
+                     + [f'd_{col}' for col in self.dataset_arrays] 
+                     + ['px_perm', 'prices', 'level_offsets', 'pred_kinds', 'pred_args', 'pred_masks', 
+                        'view_preds', 'view_band', 'requires_best_px']
+                     + ([f's_{name}' for name in SORTED_STATS_INPUTS] if self.sorted_stats is not None else [])
+                     + [f'p{i_ind}_{k}' for i_ind, k in self.param_names]
+                     + [f'out{i_ind}' for i_ind in range(len(self.specs))] + ['errors', 'first_errors'])
+        replay_args = ', '.join(f'r_{name}' for name in REPLAY_INPUTS)
+        body = [
+            '',
+            '',
+            '@njit(cache=True)',
+            f"def run_plan({', '.join(arg_names)}):",
+            '    ts_idx = 0',
+            '    while ts_idx < len(target_ts) and start_idx < r_len_combined:',
+            '        ts = target_ts[ts_idx]',
+            f'        start_idx = loop_until_next_ts(start_idx, ts, {replay_args})',
+            *self._get_valid_lines(view_cols),
+            *self._get_view_lines(view_cols),
+            *calls,
+            '        ts_idx += 1',
+            '    return start_idx, ts_idx',
+            '',
+            ]
+        return '\n'.join(header + body)
+
+    def _get_valid_lines(self, view_cols):
+        # 当步参与视图切分的订单：默认为 [0, n_active) 前缀，直接切片；
+        # 按价格排序或只取剩余挂单时按下标取出（只取用到的列）
+        # lean_replay 未维护的谓词列不在 prefix_cols 中，以长度为 0 的原数组占位（不会被对应谓词读取）
+        placeholder_lines = [f'        {col} = d_{col}' for col in PREDICATE_INPUTS if col not in self.prefix_cols]
+        if not self.price_sorted and not self.resting:
+            return [
+                '        n_valid = r_n_active[0]',
+                *[f'        {col} = d_{col}[:n_valid]' for col in self.prefix_cols],
+                *placeholder_lines,
+                ]
+        
+        lines = ['        n_valid = r_n_resting[0]' if self.resting else '        n_valid = r_n_active[0]']
+        if self.price_sorted and self.resting:
+            lines += ['        update_subset_price_index(r_on_px_idx, r_on_side, r_rest_idx[:n_valid], px_perm, level_offsets)',
+                      '        valid_idx = px_perm[:n_valid]']
+        elif self.price_sorted:
+            lines += ['        update_price_index(r_on_px_idx, r_on_side, n_valid, px_perm, level_offsets)',
+                      '        valid_idx = px_perm[:n_valid]']
+        else:
+            lines += ['        valid_idx = r_rest_idx[:n_valid]']
+        gathered_cols = [col for col in self.prefix_cols if col in PREDICATE_INPUTS or col in view_cols]
+        return lines + [f'        {col} = d_{col}[valid_idx]' for col in gathered_cols] + placeholder_lines
+
+    def _get_view_lines(self, view_cols):
+        select_lines = [
+            '            if len(mask) == 0:',
+            *[f'                v_{col} = {col}[start:end]' for col in view_cols],
+            '            else:',
+            *[f'                v_{col} = {col}[start:end][mask]' for col in view_cols],
+            ] if view_cols else []
+        return [
+            '        for p in range(len(pred_kinds)):',
+            f"            eval_predicate(pred_kinds[p], pred_args[p], d_best_px, ts, {', '.join(PREDICATE_INPUTS)}, ",
+            '                           pred_masks[p, :n_valid])',
+            '        for v in range(len(view_preds)):',
+            '            status, start, end, mask = select_view(d_best_px, prices, level_offsets, pred_masks, n_valid, ',
+            '                                                   view_preds[v], view_band[v], requires_best_px)',
+            '            if status != 0:',
+            '                continue',
+            *select_lines,
+            *self._get_sorted_stats_lines(),
+            ]
+
+    def _get_sorted_stats_lines(self):
+        if self.sorted_stats is None:
+            return []
+        return [
+            '            n_view = len(v_on_side)',
+            f'            v_{SORTED_STATS_INPUTS[0]} = s_{SORTED_STATS_INPUTS[0]}',
+            *[f'            v_{name} = s_{name}[:n_view]' for name in SORTED_STATS_INPUTS[1:]],
+            f"            compute_sorted_stats({', '.join(f'v_{name}' for name in SORTED_STATS_COLUMNS + SORTED_STATS_INPUTS)})",
+            ]
+
+    def _get_args(self, group):
+        replay_kwargs = group.loop_func.keywords
+        args = [group.stepper.target_ts, group.stepper.start_idx]
+        args += [replay_kwargs[name] for name in REPLAY_INPUTS]
+        args += [group.dataset[col] for col in self.dataset_arrays]
+        memo = self.memo
+        px_perm = group.px_perm if self.price_sorted else np.zeros(0, dtype=np.int32)
+        args += [px_perm, memo.prices, memo.level_offsets, memo.pred_kinds, memo.pred_args, memo.pred_masks,
+                 memo.view_preds, memo.view_band, memo.requires_best_px]
+        if self.sorted_stats is not None:
+            args += list(self.sorted_stats.buffers)
+        args += [self.param[self.ind_cates[i_ind]]['param'][k] for i_ind, k in self.param_names]
+        args += [self._get_out_block(group, ind_cate) for ind_cate in self.ind_cates]
+        self.errors = np.zeros((len(self.ind_cates), len(self.view_names)), dtype=np.int64)
+        self.first_errors = np.full((len(self.ind_cates), len(self.view_names)), fill_value=-1, dtype=np.int64)
+        self.target_ts = group.stepper.target_ts
+        args += [self.errors, self.first_errors]
+        return args
+
+    def _get_out_block(self, group, ind_cate):
+        """同一指标各视图的输出列须首尾相接（get_info_fr_params 先按指标、再按视图排列）"""
+        factor_idx_mapping = group.param['factor_idx_mapping']
+        count = group.param['indxview_count'][(ind_cate, self.view_names[0])]
+        start = factor_idx_mapping[(ind_cate, self.view_names[0], 0, 0)]
+        for v, view_name in enumerate(self.view_names):
+            if factor_idx_mapping[(ind_cate, view_name, 0, 0)] != start + v * count * 2:
+                raise ValueError(f'columns of {ind_cate} are not contiguous across views')
+        end = start + len(self.view_names) * count * 2
+        return group.recorded_dataset[:, start:end].reshape(self.n_ts, len(self.view_names), count, 2)
+
+    def compile(self):
+        """只编译（或从缓存载入）不执行，失败时订单簿状态未被改动，调用方可退回逐步计算"""
+        self.driver.compile(tuple(typeof(arg) for arg in self.args))
+
+    def run(self):
+        return self.driver(*self.args)
+
+    def report_errors(self):
+        # 驱动内拿不到异常详情，只给出首次出错的步，可据此用 step_plan = false 逐步复现
+        for i_ind, v in zip(*np.nonzero(self.errors)):
+            ts_idx = self.first_errors[i_ind, v]
+            print(f'{self.ind_cates[i_ind]} failed at {self.errors[i_ind, v]} steps '
+                  f'in view {self.view_names[v]!r}, first at step {ts_idx} (ts {self.target_ts[ts_idx]})')
+
+
+# %% load
+def get_user_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'lob_indicators' / 'step_plans'
+
+
+def get_plan_dir(plan_dir=None):
+    """配置的 step_plan_dir；未配置时为 PLAN_DIR，不可写则退回用户缓存目录"""
+    candidates = [Path(plan_dir)] if plan_dir is not None else [PLAN_DIR, get_user_cache_dir()]
+    for candidate in candidates:
+        try:
+            candidate.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(candidate, os.W_OK):
+            return candidate
+    raise OSError(f'no writable step plan directory in {[str(candidate) for candidate in candidates]}')
+
+
+def load_plan_module(source, dependency_files, plan_dir=PLAN_DIR):
+    stamps = [f'# {file.name}: {os.stat(file).st_mtime_ns} {os.stat(file).st_size}'
+              for file in dependency_files]
+    source = '\n'.join([source] + stamps) + '\n'
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    module_name = f'step_plan_{digest}'
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    file_path = plan_dir / f'{module_name}.py'
+    if not file_path.exists():
+        # 多进程可能同时生成同一计划：先写临时文件再原子替换
+        tmp_path = plan_dir / f'{module_name}.{os.getpid()}.tmp'
+        tmp_path.write_text(source, encoding='utf-8')
+        os.replace(tmp_path, file_path)
+        prune_plan_dir(plan_dir)
+    # 计划文件本身的 mtime 是 numba 缓存的校验项，不能改动，使用时间另记在 .used 文件上
+    (plan_dir / f'{module_name}.used').touch()
+
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def prune_plan_dir(plan_dir, retention_days=PLAN_RETENTION_DAYS):
+    """删除 retention_days 天内未载入过的计划及其 numba 缓存、字节码；并发的其它进程可能正在删除同一文件"""
+    expire = time.time() - retention_days * 86400
+    for file_path in plan_dir.glob('step_plan_*.py'):
+        module_name = file_path.stem
+        used_path = plan_dir / f'{module_name}.used'
+        try:
+            last_used = max(os.stat(file_path).st_mtime, os.stat(used_path).st_mtime if used_path.exists() else 0)
+            if last_used >= expire:
+                continue
+            stale = [file_path, used_path, *(plan_dir / '__pycache__').glob(f'{module_name}.*')]
+            for stale_path in stale:
+                stale_path.unlink(missing_ok=True)
+        except OSError:
+            continue
+    for tmp_path in plan_dir.glob('step_plan_*.tmp'):
+        try:
+            if os.stat(tmp_path).st_mtime < expire:
+                tmp_path.unlink(missing_ok=True)
+        except OSError:
+            continue
@@ -13,15 +13,15 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -103,7 +103,7 @@ def ValueTimeDecayOrderAmount(best_px, on_side, on_px, on_qty_org, on_qty_remain
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -149,7 +149,7 @@ def LargeOrderAmountByValue(best_px, on_side, on_px, on_qty_org, on_qty_remain,
         index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -13,16 +13,16 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types, prange
+from numba import types, prange
 
 
 from utils.assist_calc import get_residue_time
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -74,7 +74,7 @@ def AdjustedVolumeDistribution(best_px, on_side, on_px, on_qty_remain, price_adj
             index += 1
             
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -114,7 +114,7 @@ def OrderBookEntropy(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -154,7 +154,7 @@ def AccelerationOrderVolume(best_px, on_side, on_px, on_qty_remain, curr_dataset
         curr_dataset[0, 1] = np.nan
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -199,7 +199,7 @@ def LargeOrderRemaining(best_px, on_side, on_px, on_qty_org, on_qty_remain, amou
         index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_ts_org
@@ -255,7 +255,7 @@ def TimeWeightedRemainingVolume(best_px, on_side, on_ts_org, ts, on_qty_remain,
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -13,15 +13,16 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
-from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.assist_calc import (get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar,
+                               is_arrival_ordered)
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -64,8 +65,31 @@ def ValueTimeDecayOrgOA(best_px, on_side, on_px, on_qty_org, on_ts_org, ts, valu
         curr_dataset[:, :] = np.nan
         return
     
+    # 各时间桶为最近 t_bound 内的挂单（逐层嵌套，最后一桶为全部挂单）；
+    # 挂单时间非降时即为后缀，二分定位起点，否则逐个比较
+    arrival_ordered = is_arrival_ordered(on_ts_org)
+    
+    # 各桶金额与衰减参数无关，每个 (阈值, 方向) 只算一次
+    bucket_amounts = np.zeros((len(value_thresholds), 2, num_buckets), dtype=np.float64)
+    for i_T, T in enumerate(value_thresholds):
+        for side in (0, 1):
+            # 筛选符合条件的订单：方向匹配且金额大于阈值
+            mask = (on_side == side) & (on_px * on_qty_org / 10000 >= T)
+            if not np.any(mask):
+                continue
+            valid_on_ts_org = on_ts_org[mask]
+            valid_amount = on_px[mask] * on_qty_org[mask] / 10000  # 使用原始挂单量
+            
+            for i, t_bound in enumerate(time_buckets):
+                if arrival_ordered:
+                    start = np.searchsorted(valid_on_ts_org, ts - t_bound, side='right')
+                    bucket_amounts[i_T, side, i] = np.sum(valid_amount[start:])
+                else:
+                    bucket_amounts[i_T, side, i] = np.sum(valid_amount[ts - valid_on_ts_org < t_bound])
+            bucket_amounts[i_T, side, -1] = np.sum(valid_amount)
+    
     index = 0
-    for T in value_thresholds:
+    for i_T in range(len(value_thresholds)):
         for decay in decay_list:
             # 生成每层的权重
             weights = 1 - decay * np.arange(num_buckets)
@@ -74,37 +98,9 @@ def ValueTimeDecayOrgOA(best_px, on_side, on_px, on_qty_org, on_ts_org, ts, valu
             if np.sum(weights) > 0:
                 weights /= np.sum(weights)  # 归一化权重
             
-            # Bid 和 Ask 侧分别处理
+            # Bid 和 Ask 侧分别处理，无有效挂单时各桶为 0
             for side, col in [(0, 0), (1, 1)]:
-                # 筛选符合条件的订单：方向匹配且金额大于阈值
-                mask = (on_side == side) & (on_px * on_qty_org / 10000 >= T)
-                
-                if np.any(mask):
-                    valid_on_px = on_px[mask]
-                    valid_on_qty_org = on_qty_org[mask]  # 使用原始挂单量
-                    valid_on_ts_org = on_ts_org[mask]
-                    
-                    # 计算时间差（毫秒）
-                    time_deltas = ts - valid_on_ts_org
-                    
-                    # 初始化每个时间段的金额总和
-                    bucket_amounts = np.zeros(num_buckets, dtype=np.float64)
-                    
-                    # 分时间段计算金额
-                    for i, t_bound in enumerate(time_buckets):
-                        in_bucket = time_deltas < t_bound
-                        # 计算该时间桶内的总金额
-                        bucket_amounts[i] = np.sum(valid_on_px[in_bucket] * valid_on_qty_org[in_bucket] / 10000)
-                        # 将已计算的订单排除（设置为无穷大以便后续桶不再计算）
-                        time_deltas[in_bucket] = np.inf
-                    
-                    # 剩余部分为最高时间段
-                    bucket_amounts[-1] = np.sum(valid_on_px[time_deltas != np.inf] * valid_on_qty_org[time_deltas != np.inf] / 10000)
-                    
-                    # 加权计算
-                    weighted_sum = np.sum(bucket_amounts * weights)
-                    curr_dataset[index, col] = weighted_sum
-                else:
-                    curr_dataset[index, col] = 0  # 无有效挂单记为0
+                # 加权计算
+                curr_dataset[index, col] = np.sum(bucket_amounts[i_T, side] * weights)
             
             index += 1
\ No newline at end of file
@@ -6,11 +6,11 @@ Created on Mon May 25 2025
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],    # best_px
     types.int32[:],    # on_side  
     types.int64[:],    # on_px
@@ -109,7 +109,7 @@ def OrderLifecycleEfficiency(best_px, on_side, on_px, on_qty_org, on_ts_org, on_
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],    # best_px
     types.int32[:],    # on_side
     types.int64[:],    # on_px  
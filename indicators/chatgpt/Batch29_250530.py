@@ -8,9 +8,9 @@ Created on Fri May 30 2025
 """
 
 import numpy as np
-from numba import njit, types
+from numba import types
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -13,16 +13,16 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -66,7 +66,7 @@ def PriceCenterAbsDeviation(best_px, on_side, on_px, on_qty_remain, price_thresh
         index += 1
         
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -100,7 +100,7 @@ def Momentum(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan
         
 @timeit       
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -134,7 +134,7 @@ def Inertia(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -180,7 +180,7 @@ def PriceEntropy(best_px, on_side, on_px, on_qty_remain, price_threshold, curr_d
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -230,7 +230,7 @@ def RemainingOrderSkewness(best_px, on_side, on_px, on_qty_remain, price_thresho
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -280,7 +280,7 @@ def RemainingOrderKurtosis(best_px, on_side, on_px, on_qty_remain, price_thresho
         index += 1
         
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -326,7 +326,7 @@ def LocalPriceEntropy(best_px, on_side, on_px, on_qty_remain, local_range, curr_
         index += 1
         
 @timeit      
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -382,7 +382,7 @@ def GiniCoefficient(best_px, on_side, on_px, on_qty_remain, price_threshold, cur
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -434,7 +434,7 @@ def LocalGiniCoefficient(best_px, on_side, on_px, on_qty_remain, local_range, cu
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -482,7 +482,7 @@ def WeightedPriceStd(best_px, on_side, on_px, on_qty_remain, price_threshold, cu
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -530,7 +530,7 @@ def WeightedPriceMAD(best_px, on_side, on_px, on_qty_remain, price_threshold, cu
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_qty_remain
@@ -572,7 +572,7 @@ def MaxOrderRatio(best_px, on_side, on_qty_remain, price_threshold, curr_dataset
         index += 1
 
 @timeit        
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -623,7 +623,7 @@ def OrderBookSecondDiff(best_px, on_side, on_px, on_qty_remain, price_threshold,
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -679,7 +679,7 @@ def PriceQtyCorrelation(best_px, on_side, on_px, on_qty_remain, price_threshold,
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -725,7 +725,7 @@ def HerfindahlIndex(best_px, on_side, on_px, on_qty_remain, price_threshold, cur
         index += 1
 
 @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
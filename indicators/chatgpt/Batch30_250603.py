@@ -16,7 +16,8 @@ import numpy as np
 from numba import njit, types
 
 
-from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
+from utils.assist_calc import (get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar,
+                               is_arrival_ordered)
 from utils.speedutils import timeit
 
 
@@ -91,48 +92,43 @@ def TimeRangeDataTypes(best_px, on_side, on_px, on_qty_org, on_qty_remain, on_qt
         curr_dataset[:, :] = np.nan
         return
 
+    # 挂单时间非降（有效订单按到达顺序排列）时，时间范围内的订单为后缀，二分定位起点即可，
+    # 否则逐个比较；各时间范围的订单只取一次，供所有金额阈值与数据类型共用
+    arrival_ordered = is_arrival_ordered(on_ts_org)
+    recent_orders = []
+    for time_range in time_ranges:
+        time_threshold = ts - time_range * 1000 * 60  # 计算时间阈值（转换为毫秒）
+        if arrival_ordered:
+            recent = slice(np.searchsorted(on_ts_org, time_threshold, side='left'), None)
+        else:
+            recent = on_ts_org >= time_threshold
+        recent_orders.append({
+            'on_side': on_side[recent], 'on_px': on_px[recent], 'on_qty_org': on_qty_org[recent], 
+            'on_qty_remain': on_qty_remain[recent], 'on_qty_d': on_qty_d[recent], 
+            'on_qty_t_a': on_qty_t_a[recent], 'on_qty_t_p': on_qty_t_p[recent],
+            })
+    # 数据类型 -> 计入金额的数量列（条件为该列 > 0）
+    qty_cols = {1.0: 'on_qty_org', 2.0: 'on_qty_remain', 3.0: 'on_qty_d', 4.0: 'on_qty_t_a', 5.0: 'on_qty_t_p'}
+
     index = 0
     for T in value_thresholds:  # 遍历所有金额阈值
         for data_type in data_types:  # 遍历所有数据类型
-            for time_range in time_ranges:  # 遍历所有时间范围
-                time_threshold = ts - time_range * 1000 * 60  # 计算时间阈值（转换为毫秒）
+            for recent in recent_orders:  # 遍历所有时间范围
+                r_px = recent['on_px']
                 
                 # Bid 和 Ask 侧分别处理
                 for side, col in [(0, 0), (1, 1)]:
-                    # 基础条件：方向匹配、金额大于阈值、时间在范围内
-                    base_mask = (on_side == side) & (on_px * on_qty_org / 10000 >= T) & (on_ts_org >= time_threshold)
+                    # 基础条件：方向匹配、金额大于阈值（时间范围已由 recent 限定）
+                    base_mask = (recent['on_side'] == side) & (r_px * recent['on_qty_org'] / 10000 >= T)
                     
                     total_amount = 0.0
                     
-                    if data_type == 1.0:  # 挂单金额
-                        # 条件：on_qty_org > 0
-                        mask = base_mask & (on_qty_org > 0)
-                        if np.any(mask):
-                            total_amount = np.sum(on_qty_org[mask] * on_px[mask] / 10000)
-                    
-                    elif data_type == 2.0:  # 留存挂单金额
-                        # 条件：on_qty_remain > 0
-                        mask = base_mask & (on_qty_remain > 0)
-                        if np.any(mask):
-                            total_amount = np.sum(on_qty_remain[mask] * on_px[mask] / 10000)
-                    
-                    elif data_type == 3.0:  # 撤单金额
-                        # 条件：on_qty_d > 0
-                        mask = base_mask & (on_qty_d > 0)
-                        if np.any(mask):
-                            total_amount = np.sum(on_qty_d[mask] * on_px[mask] / 10000)
-                    
-                    elif data_type == 4.0:  # 主动成交的原始金额
-                        # 条件：on_qty_t_a > 0（有主动成交）
-                        mask = base_mask & (on_qty_t_a > 0)
-                        if np.any(mask):
-                            total_amount = np.sum(on_qty_t_a[mask] * on_px[mask] / 10000)
-                    
-                    elif data_type == 5.0:  # 被动成交的原始金额
-                        # 条件：on_qty_t_p > 0（有被动成交）
-                        mask = base_mask & (on_qty_t_p > 0)
+                    # 1 挂单金额 / 2 留存挂单金额 / 3 撤单金额 / 4 主动成交的原始金额 / 5 被动成交的原始金额
+                    if data_type in qty_cols:
+                        qty = recent[qty_cols[data_type]]
+                        mask = base_mask & (qty > 0)
                         if np.any(mask):
-                            total_amount = np.sum(on_qty_t_p[mask] * on_px[mask] / 10000)
+                            total_amount = np.sum(qty[mask] * r_px[mask] / 10000)
                     
                     curr_dataset[index, col] = total_amount
                 
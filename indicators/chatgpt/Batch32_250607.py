@@ -8,11 +8,11 @@ Created on [Current Date]
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -13,16 +13,16 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_qty_remain
@@ -49,7 +49,7 @@ def OrderVolume(best_px, on_side, on_qty_remain, curr_dataset):
     curr_dataset[0, 1] = np.sum(on_qty_remain[ask_idx]) if np.any(ask_idx) else 0
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -84,7 +84,7 @@ def LargeOrderVolumeByValue(best_px, on_side, on_px, on_qty_org, on_qty_remain,
         index += 1
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -127,7 +127,7 @@ def LargeOrderProportionByValue(best_px, on_side, on_px, on_qty_org, on_qty_rema
         index += 1
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -163,7 +163,7 @@ def WeightedCenterPriceDeviation(best_px, on_side, on_px, on_qty_remain, curr_da
     curr_dataset[0, 1] = ask_weighted_price - mid_price
     
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -202,7 +202,7 @@ def WeightedCenterPriceVariance(best_px, on_side, on_px, on_qty_remain, curr_dat
         curr_dataset[0, 1] = np.nan
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -267,7 +267,7 @@ def SkewnessWeightedCenterPriceDeviation(best_px, on_side, on_px, on_qty_remain,
         index += 1
 
 # @timeit        
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -320,7 +320,7 @@ def WeightedQuantilePriceDeviation(best_px, on_side, on_px, on_qty_remain, quant
         index += 1
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -370,7 +370,7 @@ def OrderAmountVarianceRatio(best_px, on_side, on_px, on_qty_remain, price_range
         index += 1
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -414,7 +414,7 @@ def OrderAmountCVR(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[index, 1] = np.nan
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -463,7 +463,7 @@ def OrderAmountSkewness(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan
         
 # @timeit        
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -512,7 +512,7 @@ def OrderAmountKurtosis(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -568,7 +568,7 @@ def OrderAmountIQR(best_px, on_side, on_px, on_qty_remain, lower_percentiles, up
 
 
 # @timeit
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
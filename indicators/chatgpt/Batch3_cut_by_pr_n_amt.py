@@ -13,15 +13,15 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -83,7 +83,7 @@ def WeightedPriceCenterDistance(best_px, on_side, on_px, on_qty_org, on_qty_rema
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -145,7 +145,7 @@ def LogScaledPriceCenterDistance(best_px, on_side, on_px, on_qty_org, on_qty_rem
             index += 1
             
             
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -210,7 +210,7 @@ def PriceQuantileDeviation(best_px, on_side, on_px, on_qty_org, price_range, amo
                 index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -270,7 +270,7 @@ def TotalAmount(best_px, on_side, on_px, on_qty_org, on_qty_remain, price_range,
             index += 1
 
         
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -332,7 +332,7 @@ def PriceDeviationAmount(best_px, on_side, on_px, on_qty_org, on_qty_remain, pri
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -396,7 +396,7 @@ def WeightedDispersionAmount(best_px, on_side, on_px, on_qty_org, on_qty_remain,
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -462,7 +462,7 @@ def LargeOrderProportion(best_px, on_side, on_px, on_qty_org, on_qty_remain, pri
             index += 1
 
         
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -526,7 +526,7 @@ def OrderDepthConcentration(best_px, on_side, on_px, on_qty_org, on_qty_remain,
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -588,7 +588,7 @@ def OverallAmountHHI(best_px, on_side, on_px, on_qty_org, on_qty_remain, price_r
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -656,7 +656,7 @@ def PriceWeightedAmountHHI(best_px, on_side, on_px, on_qty_org, on_qty_remain, p
             index += 1
 
             
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -702,7 +702,7 @@ def MeanVarianceRatio(best_px, on_side, on_px, on_qty_org, on_qty_remain, price_
             index += 1
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
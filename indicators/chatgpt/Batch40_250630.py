@@ -11,10 +11,10 @@ TRTradeRmAuc 因子：计算去除集合竞价后的回看时间段内大单主
 """
 
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],      # best_px
     types.int32[:],      # on_side
     types.int64[:],      # on_px
@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:48:12 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+from numba import types
+
+
+from core.side_aggregates import REMAIN_QTY, get_threshold_bucket
+from core.price_ladder import (LADDER_QTY, LADDER_AMT, get_band_depth, query_ladder_prefix, 
+                               LEVEL_PX, LEVEL_QTY, LEVEL_COUNT)
+from core.predicates import get_price_bounds
+from core.sorted_stats import get_sorted_percentile, search_cumsum_fraction
+from core.side_moments import (COUNT, AMT1, AMT3, AMT4, PX_AMT, PX2_AMT, QTY, QTY_LOG_QTY, 
+                               get_side_moment, get_amount_central_moments)
+from core.age_buckets import ORG_AMT, EXCLUDE_NOON, get_age_bound_idx
+from utils.speedutils import lazy_njit
+
+
+# %%
+'''
+读取回放时维护的分方向累计量 side_agg（见 core.side_aggregates），每步 O(1)，与订单数无关。
+需在配置中设置 side_aggregate_thresholds；累计量为整簿统计，不随视图切分，
+在不切分的视图下与 Batch3 中对应的逐单求和版本结果一致。
+本文件中以 side_agg、ladder_tree、top_levels、side_moments、age_hist 为输入的指标只能在不切分视图的配置中计算
+（GroupGenerate，且不设 shared_param），否则启动时报错（见 core.auto_generate_full.WHOLE_BOOK_INPUTS）。
+'''
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # side_agg
+    types.float64[:, :]  # curr_dataset
+))
+def OrderVolumeAgg(best_px, side_agg, curr_dataset):
+    """
+    挂单总量因子（同 Batch3 OrderVolume）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    curr_dataset[0, 0] = np.sum(side_agg[REMAIN_QTY, 0])
+    curr_dataset[0, 1] = np.sum(side_agg[REMAIN_QTY, 1])
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # side_agg
+    types.float64[:],  # agg_thresholds
+    types.float64[:],  # value_thresholds
+    types.float64[:, :]  # curr_dataset
+))
+def LargeOrderVolumeByValueAgg(best_px, side_agg, agg_thresholds, value_thresholds, curr_dataset):
+    """
+    大金额挂单量总量因子（同 Batch3 LargeOrderVolumeByValue）
+    - value_thresholds：大单金额阈值，须包含在 side_aggregate_thresholds 中，否则该行为 NaN
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    index = 0
+    for T in value_thresholds:
+        first_bucket = get_threshold_bucket(agg_thresholds, T)
+        if first_bucket < 0:
+            curr_dataset[index, :] = np.nan
+        else:
+            curr_dataset[index, 0] = np.sum(side_agg[REMAIN_QTY, 0, first_bucket:])
+            curr_dataset[index, 1] = np.sum(side_agg[REMAIN_QTY, 1, first_bucket:])
+
+        index += 1
+
+
+# %%
+'''
+读取回放时维护的档位树状数组 ladder_tree（见 core.price_ladder），价格区间深度每次 O(log 档位数)，与订单数无关。
+需在配置中设置 ladder_tree = true；与 side_agg 一样为整簿统计，不随视图切分。
+'''
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # ladder_tree
+    types.int64[:],  # ladder_prices
+    types.float64[:],  # price_ranges
+    types.float64[:, :]  # curr_dataset
+))
+def BandDepthTree(best_px, ladder_tree, ladder_prices, price_ranges, curr_dataset):
+    """
+    中间价上下 price_range 内的挂单总量
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for idx, price_range in enumerate(price_ranges):
+        lower_bound, upper_bound = get_price_bounds(best_px, price_range)
+        for side in (0, 1):
+            curr_dataset[idx, side] = get_band_depth(ladder_tree, ladder_prices, LADDER_QTY, side,
+                                                     lower_bound, upper_bound)
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # ladder_tree
+    types.int64[:],  # ladder_prices
+    types.float64[:],  # price_ranges
+    types.float64[:, :]  # curr_dataset
+))
+def NearOrderAmountRatioTree(best_px, ladder_tree, ladder_prices, price_ranges, curr_dataset):
+    """
+    近处挂单金额占比（同 Batch15 NearOrderAmountRatio）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    n_levels = len(ladder_prices)
+    for idx, price_range in enumerate(price_ranges):
+        lower_bound, upper_bound = get_price_bounds(best_px, price_range)
+        for side in (0, 1):
+            total_order_amount = query_ladder_prefix(ladder_tree, LADDER_AMT, side, n_levels)
+            if total_order_amount > 0:
+                near_order_amount = get_band_depth(ladder_tree, ladder_prices, LADDER_AMT, side,
+                                                   lower_bound, upper_bound)
+                curr_dataset[idx, side] = near_order_amount / total_order_amount
+            else:
+                curr_dataset[idx, side] = np.nan
+
+
+# %%
+'''
+读取回放时维护的盘口前 K 档 top_levels（见 core.price_ladder.update_top_levels），每步 O(K)，与订单数无关。
+需在配置中设置 top_levels = K，n_levels 不超过 K；档位取自 lob_bid / lob_ask 的非空档位，同为整簿统计。
+'''
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # top_levels
+    types.float64[:],  # n_levels
+    types.float64[:, :]  # curr_dataset
+))
+def TopLevelAmount(best_px, top_levels, n_levels, curr_dataset):
+    """
+    前 n_levels 档挂单金额总量（价格 * 挂单量 / 10000）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for idx, n in enumerate(n_levels):
+        if n > top_levels.shape[2]:
+            curr_dataset[idx, :] = np.nan
+            continue
+        for side in (0, 1):
+            amount = 0.
+            for k in range(int(n)):
+                amount += top_levels[LEVEL_PX, side, k] * top_levels[LEVEL_QTY, side, k] / 10000
+            curr_dataset[idx, side] = amount
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :],  # top_levels
+    types.float64[:],  # n_levels
+    types.float64[:, :]  # curr_dataset
+))
+def TopLevelAvgOrderSize(best_px, top_levels, n_levels, curr_dataset):
+    """
+    前 n_levels 档平均每单挂单量（挂单量 / 订单数）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买1或卖1价格无效，直接填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for idx, n in enumerate(n_levels):
+        if n > top_levels.shape[2]:
+            curr_dataset[idx, :] = np.nan
+            continue
+        for side in (0, 1):
+            qty = np.sum(top_levels[LEVEL_QTY, side, :int(n)])
+            count = np.sum(top_levels[LEVEL_COUNT, side, :int(n)])
+            curr_dataset[idx, side] = qty / count if count > 0 else np.nan
+
+
+# %%
+'''
+读取每步每个视图共用的排序统计量（见 core.sorted_stats），排序只做一次，各参数只需二分查找。
+与 Batch3 中对应的逐参数排序版本含义一致；累加顺序不同，浮点结果可能有末位差异。
+'''
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:],  # sorted_side_offsets
+    types.int64[:],  # sorted_px
+    types.float64[:],  # sorted_px_amt_cumsum
+    types.float64[:],  # quantiles
+    types.float64[:, :]  # curr_dataset
+))
+def WeightedQuantilePriceDeviationSorted(best_px, sorted_side_offsets, sorted_px, sorted_px_amt_cumsum, quantiles, 
+                                         curr_dataset):
+    """
+    加权分位数价格及偏移因子（同 Batch3 WeightedQuantilePriceDeviation）
+    - quantiles: 分位数列表 (如 [0.25, 0.5, 0.75])
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    mid_price = (bid1 + ask1) / 2
+
+    for index, q in enumerate(quantiles):
+        for side in (0, 1):
+            start, end = sorted_side_offsets[side], sorted_side_offsets[side + 1]
+            if end > start:
+                cumsum = sorted_px_amt_cumsum[start:end]
+                k = min(search_cumsum_fraction(cumsum, cumsum[-1], q), end - start - 1)
+                curr_dataset[index, side] = sorted_px[start + k] - mid_price
+            else:
+                curr_dataset[index, side] = np.nan
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:],  # sorted_side_offsets
+    types.float64[:],  # sorted_amt
+    types.float64[:],  # lower_percentiles
+    types.float64[:],  # upper_percentiles
+    types.float64[:, :]  # curr_dataset
+))
+def OrderAmountIQRSorted(best_px, sorted_side_offsets, sorted_amt, lower_percentiles, upper_percentiles, curr_dataset):
+    """
+    挂单金额分位数间距因子（同 Batch3 OrderAmountIQR）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：买1或卖1价格无效时填充NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    index = 0
+    for p1 in lower_percentiles:
+        for p2 in upper_percentiles:
+            if p1 >= p2:
+                continue  # 保证分位数的逻辑顺序
+            for side in (0, 1):
+                start, end = sorted_side_offsets[side], sorted_side_offsets[side + 1]
+                if end > start:
+                    amount = sorted_amt[start:end]
+                    curr_dataset[index, side] = get_sorted_percentile(amount, p2) - get_sorted_percentile(amount, p1)
+                else:
+                    curr_dataset[index, side] = np.nan
+            index += 1
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:],  # sorted_side_offsets
+    types.int64[:],  # sorted_px
+    types.float64[:],  # sorted_px_amt_cumsum
+    types.float64[:],  # percent_changes
+    types.float64[:, :]  # curr_dataset
+))
+def OrderAmountPercentSensitivitySorted(best_px, sorted_side_offsets, sorted_px, sorted_px_amt_cumsum, percent_changes, 
+                                        curr_dataset):
+    """
+    挂单金额价格百分比敏感性因子（同 Batch3 OrderAmountPercentSensitivity）
+    - 买方取价格 <= 买一 * (1 + 变化) 的挂单，卖方取价格 >= 卖一 * (1 + 变化) 的挂单
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：买1或卖1价格无效时填充NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for index, percent_change in enumerate(percent_changes):
+        for side in (0, 1):
+            start, end = sorted_side_offsets[side], sorted_side_offsets[side + 1]
+            px = sorted_px[start:end]
+            cumsum = sorted_px_amt_cumsum[start:end]
+            if side == 0:
+                # 价格升序，价格 <= 新价格的挂单为前 k 个
+                k = np.searchsorted(px, int(bid1 * (1 + percent_change)), side='right')
+                n_adjusted = k
+                adjusted_amount = cumsum[k - 1] if k > 0 else 0.
+            else:
+                # 价格 >= 新价格的挂单为第 k 个之后
+                k = np.searchsorted(px, int(ask1 * (1 + percent_change)), side='left')
+                n_adjusted = len(px) - k
+                adjusted_amount = cumsum[-1] - (cumsum[k - 1] if k > 0 else 0.) if n_adjusted > 0 else 0.
+            if len(px) > 0 and n_adjusted > 0 and percent_change != 0:
+                curr_dataset[index, side] = (adjusted_amount - cumsum[-1]) / percent_change
+            else:
+                curr_dataset[index, side] = np.nan
+
+
+# %%
+'''
+读取回放时维护的分方向幂和 side_moments（见 core.side_moments），每步 O(1)，与订单数无关。
+需在配置中设置 side_moments = true；幂和为整簿统计，不随视图切分，在不切分的视图下与 Batch1/Batch3 中
+对应的逐单版本含义一致。中心矩由原点矩换算，浮点结果与逐单两遍计算有舍入差异；
+方差相对二阶原点矩小于 MOMENT_VAR_RTOL 时视为 0（逐单版本中标准差为 0 的情形）。
+'''
+MOMENT_VAR_RTOL = 1e-12
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.float64[:, :, :],  # side_moments
+    types.float64[:, :]  # curr_dataset
+))
+def WeightedCenterPriceVarianceMoments(best_px, side_moments, curr_dataset):
+    """
+    加权重心方差因子（同 Batch3 WeightedCenterPriceVariance），权重为剩余挂单金额
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for side in (0, 1):
+        total_weight = get_side_moment(side_moments, AMT1, side)
+        if get_side_moment(side_moments, COUNT, side) > 0 and total_weight != 0:
+            weighted_price = get_side_moment(side_moments, PX_AMT, side) / total_weight
+            curr_dataset[0, side] = get_side_moment(side_moments, PX2_AMT, side) / total_weight - weighted_price ** 2
+        else:
+            curr_dataset[0, side] = np.nan
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.float64[:, :, :],  # side_moments
+    types.float64[:, :]  # curr_dataset
+))
+def OrderAmountSkewnessMoments(best_px, side_moments, curr_dataset):
+    """
+    挂单金额偏态系数因子（同 Batch3 OrderAmountSkewness）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：买1或卖1价格无效时填充NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for side in (0, 1):
+        n = get_side_moment(side_moments, COUNT, side)
+        if n > 1:  # 至少需要两个数据点
+            mean, var, raw2 = get_amount_central_moments(side_moments, side)
+            if var > MOMENT_VAR_RTOL * raw2:
+                raw3 = get_side_moment(side_moments, AMT3, side) / n
+                curr_dataset[0, side] = (raw3 - 3 * mean * raw2 + 2 * mean ** 3) / var ** 1.5
+            else:
+                curr_dataset[0, side] = np.nan
+        else:
+            curr_dataset[0, side] = np.nan
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.float64[:, :, :],  # side_moments
+    types.float64[:, :]  # curr_dataset
+))
+def OrderAmountKurtosisMoments(best_px, side_moments, curr_dataset):
+    """
+    挂单金额峰度因子（同 Batch3 OrderAmountKurtosis）
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：买1或卖1价格无效时填充NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for side in (0, 1):
+        n = get_side_moment(side_moments, COUNT, side)
+        if n > 1:  # 至少需要两个数据点
+            mean, var, raw2 = get_amount_central_moments(side_moments, side)
+            if var > MOMENT_VAR_RTOL * raw2:
+                raw3 = get_side_moment(side_moments, AMT3, side) / n
+                raw4 = get_side_moment(side_moments, AMT4, side) / n
+                central4 = raw4 - 4 * mean * raw3 + 6 * mean ** 2 * raw2 - 3 * mean ** 4
+                curr_dataset[0, side] = central4 / var ** 2 - 3
+            else:
+                curr_dataset[0, side] = np.nan
+        else:
+            curr_dataset[0, side] = np.nan
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.float64[:, :, :],  # side_moments
+    types.float64[:, :]  # curr_dataset
+))
+def OrderBookEntropyMoments(best_px, side_moments, curr_dataset):
+    """
+    挂单熵（同 Batch1 OrderBookEntropy）：-Σ p log p = log S - Σ r log r / S，p = r / S
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    for side in (0, 1):
+        total_remain = get_side_moment(side_moments, QTY, side)
+        if total_remain > 0:
+            curr_dataset[0, side] = np.log(total_remain) - get_side_moment(side_moments, QTY_LOG_QTY, side) / total_remain
+        else:
+            curr_dataset[0, side] = np.nan
+
+
+
+# %%
+'''
+读取回放时维护的挂单时长直方图 age_hist（见 core.age_buckets），每步代价与订单数无关。
+需在配置中设置 age_bucket_bounds（秒），金额阈值须包含在 side_aggregate_thresholds 中，否则该行为 NaN；
+直方图为整簿统计，不随视图切分。金额按整数累计后再除以 10000，与逐单浮点求和的版本有舍入差异。
+挂单时长是否扣除午休由 age_bucket_exclude_noon 决定，对整个回放生效：各指标须在对应口径下计算，
+口径不符（age_clock[EXCLUDE_NOON] 与指标所需不一致）时全部为 NaN，两种口径的指标不能在同一次回放中同时得到。
+'''
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :, :],  # age_hist
+    types.int64[:],  # age_bounds
+    types.int64[:],  # age_clock
+    types.float64[:],  # agg_thresholds
+    types.float64[:],  # value_thresholds
+    types.float64[:],  # decay_list
+    types.float64[:, :]  # curr_dataset
+))
+def ValueTimeDecayOrgOAAged(best_px, age_hist, age_bounds, age_clock, agg_thresholds, value_thresholds, decay_list, curr_dataset):
+    """
+    按挂单时长衰减的原始挂单金额因子（同 Batch22 ValueTimeDecayOrgOA，挂单时长不扣除午休）
+    - age_bucket_bounds 须包含 10, 60, 600, 1800 秒，否则全部为 NaN
+    - 须 age_bucket_exclude_noon = false（默认），否则全部为 NaN
+    """
+    time_buckets = [10., 60., 10 * 60., 30 * 60.]
+    num_buckets = len(time_buckets) + 1
+
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买一或卖一价格无效，填充 NaN
+    if bid1 == 0 or ask1 == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    if age_clock[EXCLUDE_NOON] != 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    bound_idx = np.zeros(len(time_buckets), dtype=np.int64)
+    for i, t_bound in enumerate(time_buckets):
+        bound_idx[i] = get_age_bound_idx(age_bounds, t_bound)
+    if np.any(bound_idx < 0):
+        curr_dataset[:, :] = np.nan
+        return
+
+    index = 0
+    for T in value_thresholds:
+        first_bucket = get_threshold_bucket(agg_thresholds, T)
+        # 各桶为最近 t_bound 内的挂单金额（逐层嵌套，最后一桶为全部挂单），与衰减参数无关
+        bucket_amounts = np.zeros((2, num_buckets), dtype=np.float64)
+        if first_bucket >= 0:
+            for side in (0, 1):
+                for i in range(len(time_buckets)):
+                    bucket_amounts[side, i] = np.sum(age_hist[ORG_AMT, side, first_bucket:, :bound_idx[i] + 1]) / 10000
+                bucket_amounts[side, -1] = np.sum(age_hist[ORG_AMT, side, first_bucket:]) / 10000
+
+        for decay in decay_list:
+            if first_bucket < 0:
+                curr_dataset[index, :] = np.nan
+                index += 1
+                continue
+            # 生成每层的权重
+            weights = 1 - decay * np.arange(num_buckets)
+            weights = np.maximum(weights, 0)  # 确保权重非负
+            if np.sum(weights) > 0:
+                weights /= np.sum(weights)  # 归一化权重
+
+            for side in (0, 1):
+                curr_dataset[index, side] = np.sum(bucket_amounts[side] * weights)
+
+            index += 1
+
+
+@lazy_njit(types.void(
+    types.int64[:],  # best_px
+    types.int64[:, :, :, :],  # age_hist
+    types.int64[:],  # age_bounds
+    types.int64[:],  # age_clock
+    types.float64[:],  # agg_thresholds
+    types.float64[:],  # value_thresholds
+    types.float64[:],  # time_ranges
+    types.float64[:, :]  # curr_dataset
+))
+def TimeRangeOAExNoonAged(best_px, age_hist, age_bounds, age_clock, agg_thresholds, value_thresholds, time_ranges, curr_dataset):
+    """
+    不同挂单金额、不同时间范围内的原始挂单金额（同 Batch18_exnoon TimeRangeOAExNoon）
+    - 须设置 age_bucket_exclude_noon = true，挂单时长才扣除午休，否则全部为 NaN
+    - time_ranges：时间范围（分钟），须包含在 age_bucket_bounds 中（换算为秒），否则该行为 NaN
+    """
+    bid1 = best_px[0]
+    ask1 = best_px[1]
+
+    # 边界处理：如果买一或卖一价格无效，填充 NaN
+    if bid1 == 0 or ask1 == 0 or age_clock[EXCLUDE_NOON] == 0:
+        curr_dataset[:, :] = np.nan
+        return
+
+    index = 0
+    for T in value_thresholds:
+        first_bucket = get_threshold_bucket(agg_thresholds, T)
+        for time_range in time_ranges:
+            k = get_age_bound_idx(age_bounds, time_range * 60)
+            if first_bucket < 0 or k < 0:
+                curr_dataset[index, :] = np.nan
+            else:
+                for side in (0, 1):
+                    curr_dataset[index, side] = np.sum(age_hist[ORG_AMT, side, first_bucket:, :k + 1]) / 10000
+
+            index += 1
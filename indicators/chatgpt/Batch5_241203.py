@@ -13,15 +13,15 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -83,7 +83,7 @@ def OrderAmountGini(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[index, 1] = np.nan
         
         
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -139,7 +139,7 @@ def OrderAmountHHI(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[index, 1] = np.nan
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -214,7 +214,7 @@ def OrderAmountQuantileConcentration(best_px, on_side, on_px, on_qty_remain, qua
         index += len(quantiles)
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -274,7 +274,7 @@ def OrderAmountEntropy(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[index, 1] = np.nan
 
 
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],  # best_px
     types.int32[:],  # on_side
     types.int64[:],  # on_px
@@ -13,15 +13,15 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(
+@lazy_njit(
     types.void(
         types.int64[:],  # best_px (买一/卖一价格，长度为2的数组)
         types.int32[:],  # on_side (挂单方向，0为Bid，1为Ask)
@@ -80,7 +80,7 @@ def OrderDensity(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = 0  # Ask 无挂单时，数量记为 0
 
 
-@njit(
+@lazy_njit(
     types.void(
         types.int64[:],  # best_px (买一/卖一价格，长度为2的数组)
         types.int32[:],  # on_side (挂单方向，0为Bid，1为Ask)
@@ -157,7 +157,7 @@ def OrderPriceImpact(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = np.nan  # 无数据
 
 
-@njit(
+@lazy_njit(
     types.void(
         types.int64[:],  # best_px (买一/卖一价格，长度为2的数组)
         types.int32[:],  # on_side (挂单方向，0为Bid，1为Ask)
@@ -221,7 +221,7 @@ def OrderResidualGradient(best_px, on_side, on_px, on_qty_remain, curr_dataset):
         curr_dataset[0, 1] = 0  # Ask 无挂单时，数量记为 0
 
 
-@njit(
+@lazy_njit(
     types.void(
         types.int64[:],  # best_px (买一/卖一价格，长度为2的数组)
         types.int32[:],  # on_side (挂单方向，0为Bid，1为Ask)
@@ -13,15 +13,15 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types
+from numba import types
 
 
 from utils.assist_calc import get_residue_time, safe_divide, safe_divide_arrays, safe_divide_array_by_scalar
-from utils.speedutils import timeit
+from utils.speedutils import timeit, lazy_njit
 
 
 # %%
-@njit(types.void(
+@lazy_njit(types.void(
     types.int32[:],       # on_side: 挂单方向
     types.int64[:],       # on_qty_remain: 当前剩余挂单量
     types.float64[:, :]   # curr_dataset: 用于存储结果的二维数组
@@ -72,7 +72,7 @@ def SliceVolumeEntropy(
         curr_dataset[0, side] = F
         
         
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],       # on_px: 挂单价格
     types.int32[:],       # on_side: 挂单方向
     types.int64[:],       # on_qty_remain: 当前剩余挂单量
@@ -141,7 +141,7 @@ def WeightedSliceVolumeEntropy(
             curr_dataset[a_idx, side] = F
             
             
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],       # on_px: 挂单价格
     types.int32[:],       # on_side: 挂单方向
     types.int64[:],       # on_qty_remain: 当前剩余挂单量
@@ -194,7 +194,7 @@ def PriceWeightedVolumeCenterShift(
             curr_dataset[0, side] = F
             
             
-@njit(types.void(
+@lazy_njit(types.void(
     types.int64[:],       # on_px: 挂单价格
     types.int32[:],       # on_side: 挂单方向
     types.int64[:],       # on_qty_remain: 当前剩余挂单量
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:40:27 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import ast
+import warnings
+import importlib
+import importlib.util
+from pathlib import Path
+from functools import lru_cache
+
+
+from utils.naming import generate_factor_names
+from utils.speedutils import compile_lazy
+
+
+# %%
+'''
+指标注册表：按名字查找指标 kernel。
+
+各 Batch 模块中最后一个参数为 curr_dataset 的顶层函数即为指标，元数据（所在模块、输入参数名）
+通过静态解析源码得到，不 import 模块也不编译；只有配置中用到的指标才会 import 其模块并编译。
+
+同名指标出现在多个模块时，优先取 TOML 中该指标的 module 字段，其次取 indicators.chatgpt
+包 __init__ 中导出的版本，否则报错。
+'''
+INDICATOR_PACKAGES = ('indicators.chatgpt',)
+OUTPUT_NAME = 'curr_dataset'
+
+
+class IndicatorSpec:
+
+    def __init__(self, name, module_name, inputs):
+        self.name = name
+        self.module_name = module_name
+        self.inputs = inputs
+
+    def __repr__(self):
+        return f'IndicatorSpec({self.module_name}.{self.name})'
+
+    def get_output_rows(self, param_dict):
+        """curr_dataset 的行数：参数网格的组合数"""
+        return len(generate_factor_names(self.name, param_dict))
+
+    def load(self):
+        module = importlib.import_module(self.module_name)
+        return compile_lazy(getattr(module, self.name))
+
+
+# %% discover
+@lru_cache(maxsize=None)
+def discover_indicators():
+    specs = {}
+    for package in INDICATOR_PACKAGES:
+        package_dir = Path(importlib.util.find_spec(package).submodule_search_locations[0])
+        for file_path in sorted(package_dir.glob('*.py')):
+            if file_path.stem == '__init__':
+                continue
+            tree = ast.parse(file_path.read_text(encoding='utf-8'))
+            for node in tree.body:
+                if not isinstance(node, ast.FunctionDef):
+                    continue
+                inputs = [arg.arg for arg in node.args.args]
+                if inputs and inputs[-1] == OUTPUT_NAME:
+                    spec = IndicatorSpec(node.name, f'{package}.{file_path.stem}', inputs)
+                    specs.setdefault(node.name, []).append(spec)
+    return specs
+
+
+def get_indicator_spec(name, module=None):
+    candidates = discover_indicators().get(name, [])
+    if module is not None:
+        candidates = [spec for spec in candidates
+                      if spec.module_name == module or spec.module_name.endswith(f'.{module}')]
+    if not candidates:
+        raise ValueError(f'indicator {name} not found' + (f' in module {module}' if module else ''))
+    if len(candidates) == 1:
+        return candidates[0]
+
+    for package in INDICATOR_PACKAGES:
+        exported = getattr(importlib.import_module(package), name, None)
+        exported_module = getattr(getattr(exported, 'py_func', exported), '__module__', None)
+        for spec in candidates:
+            if spec.module_name == exported_module:
+                return spec
+    raise ValueError(f'indicator {name} is defined in {[spec.module_name for spec in candidates]}, '
+                     'set module in its param section')
+
+
+def load_indicator(name, module=None):
+    return get_indicator_spec(name, module).load()
+
+
+# %% validate
+def validate_indicator_param(name, ind_param, dataset_columns=None):
+    """
+    检查一个指标的 TOML 配置。inputs 按位置传给 kernel，个数不符即报错；给定 dataset_columns 时
+    各输入须由 dataset 或 param 提供，否则报错。名字与 kernel 参数名不一致、param 中有未用到的参数、
+    同名输入同时出现在 dataset 与 param（取 dataset）只提示。
+    """
+    spec = get_indicator_spec(name, ind_param.get('module'))
+    inputs = list(ind_param['inputs'])
+    param_dict = ind_param.get('param', {})
+
+    if len(inputs) != len(spec.inputs):
+        raise ValueError(f'{name}: {len(inputs)} inputs {inputs} given, {spec} takes {len(spec.inputs)} {spec.inputs}')
+    if inputs != spec.inputs:
+        warnings.warn(f'{name}: inputs {inputs} differ from {spec} arguments {spec.inputs}, bound by position')
+    unused_params = [k for k in param_dict if k not in inputs]
+    if unused_params:
+        warnings.warn(f'{name}: param {unused_params} are not inputs of {spec}, ignored')
+    if dataset_columns is not None:
+        for ipt_name in inputs:
+            if ipt_name == OUTPUT_NAME:
+                continue
+            if ipt_name in dataset_columns and ipt_name in param_dict:
+                warnings.warn(f'{name}: {ipt_name} is both a dataset column and a param, the dataset column is used')
+            if ipt_name not in dataset_columns and ipt_name not in param_dict:
+                raise ValueError(f'{name}: input {ipt_name} is neither a dataset column nor a param')
+    return spec
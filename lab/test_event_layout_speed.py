@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:05:32 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %%
+'''
+回放内核读取事件的三种布局对比（events/sec）：
+    1. indirect: data_type_arr + index_arr，再随机访问 order_named_arr / trade_named_arr（原实现）
+    2. packed: 单条结构化事件数组（AoS）
+    3. columns: 列式事件表（SoA，窄 dtype），即 core.event_stream 当前使用的布局
+分两组测：
+    scan: 只解码事件字段并累加，衡量纯读取吞吐
+    replay: 在 scan 基础上做簿记（按订单下标更新剩余量、按档位下标更新 lob），随机写入占主导
+'''
+import time
+import numpy as np
+from numba import njit
+
+
+from utils.market import Action, Side, DataType
+from core.event_stream import EVENT_COLUMNS
+
+
+# %%
+N_EVENTS = 5_000_000
+N_ORDERS = 2_000_000
+N_LEVELS = 2_000
+N_REPEAT = 5
+
+order_dtype = np.dtype([('OrderNo', 'i8'), ('OrderPx', 'f8'), ('OrderQty', 'i8'), ('Side', 'i4'),
+                        ('OrderType', 'i4'), ('no_idx', 'i4'), ('px_idx', 'i4')])
+trade_dtype = np.dtype([('tradp', 'f8'), ('tradv', 'i8'), ('buyno', 'i8'), ('sellno', 'i8'), ('Side', 'i4'),
+                        ('buy_idx', 'i4'), ('sell_idx', 'i4'), ('px_idx', 'i4')])
+packed_dtype = np.dtype([(col, dtype) for col, dtype in EVENT_COLUMNS.items()])
+
+
+# %% make data
+def make_events(seed=0):
+    rng = np.random.default_rng(seed)
+    data_type = (rng.random(N_EVENTS) < 0.3).astype(np.int8)  # 约 30% 为成交
+    is_order = data_type == DataType.Order.value
+    events = {col: np.zeros(N_EVENTS, dtype=dtype) for col, dtype in EVENT_COLUMNS.items()}
+    events['time'][:] = np.sort(rng.integers(0, 4 * 3600 * 1000, N_EVENTS))
+    events['data_type'][:] = data_type
+    events['action'][:] = np.where(is_order, np.where(rng.random(N_EVENTS) < 0.7, Action.A.value, Action.D.value),
+                                   Action.T.value)
+    events['side'][:] = rng.integers(0, 2, N_EVENTS)
+    events['qty'][:] = rng.integers(1, 100, N_EVENTS) * 100
+    events['px_idx'][:] = rng.integers(0, N_LEVELS, N_EVENTS)
+    events['px'][:] = 100000 + events['px_idx'] * 10
+    # 订单下标按到达顺序递增，撤单/成交多指向近期到达的订单，与真实数据的访问局部性接近
+    arrival = np.minimum(np.arange(N_EVENTS) * N_ORDERS // N_EVENTS, N_ORDERS - 1)
+    for col in ('buy_idx', 'sell_idx'):
+        events[col][:] = np.clip(arrival - rng.geometric(1e-3, N_EVENTS), 0, N_ORDERS - 1)
+    # 与 build_event_stream 一致：order 事件另一方向的订单下标记为 -1
+    events['buy_idx'][is_order & (events['side'] != Side.Bid.value)] = -1
+    events['sell_idx'][is_order & (events['side'] != Side.Ask.value)] = -1
+    events['buyno'][:] = events['buy_idx']
+    events['sellno'][:] = events['sell_idx']
+    return events
+
+
+def to_indirect(events):
+    is_order = events['data_type'] == DataType.Order.value
+    order_pos = np.flatnonzero(is_order)
+    trade_pos = np.flatnonzero(~is_order)
+    index_arr = np.empty(N_EVENTS, dtype=np.int64)
+    index_arr[order_pos] = np.arange(len(order_pos))
+    index_arr[trade_pos] = np.arange(len(trade_pos))
+
+    order_named_arr = np.zeros(len(order_pos), dtype=order_dtype)
+    order_named_arr['OrderPx'] = events['px'][order_pos] / 10000
+    order_named_arr['OrderQty'] = events['qty'][order_pos]
+    order_named_arr['Side'] = events['side'][order_pos]
+    order_named_arr['OrderType'] = events['action'][order_pos]
+    order_named_arr['no_idx'] = np.where(events['side'][order_pos] == Side.Bid.value,
+                                         events['buy_idx'][order_pos], events['sell_idx'][order_pos])
+    order_named_arr['px_idx'] = events['px_idx'][order_pos]
+    trade_named_arr = np.zeros(len(trade_pos), dtype=trade_dtype)
+    trade_named_arr['tradp'] = events['px'][trade_pos] / 10000
+    trade_named_arr['tradv'] = events['qty'][trade_pos]
+    trade_named_arr['Side'] = events['side'][trade_pos]
+    trade_named_arr['buy_idx'] = events['buy_idx'][trade_pos]
+    trade_named_arr['sell_idx'] = events['sell_idx'][trade_pos]
+    trade_named_arr['px_idx'] = events['px_idx'][trade_pos]
+    return events['data_type'].copy(), index_arr, events['time'].copy(), order_named_arr, trade_named_arr
+
+
+def to_packed(events):
+    packed = np.zeros(N_EVENTS, dtype=packed_dtype)
+    for col in EVENT_COLUMNS:
+        packed[col] = events[col]
+    return packed
+
+
+# %% scan kernels
+@njit
+def scan_indirect(data_type_arr, index_arr, time_arr, order_named_arr, trade_named_arr):
+    acc = 0
+    for c_idx in range(len(data_type_arr)):
+        acc += time_arr[c_idx]
+        idx = index_arr[c_idx]
+        if data_type_arr[c_idx] == DataType.Order.value:
+            row = order_named_arr[idx]
+            acc += row['OrderType'] + row['Side'] + row['px_idx'] + row['OrderQty'] + row['no_idx'] - 1
+        else:
+            row = trade_named_arr[idx]
+            acc += Action.T.value + row['Side'] + row['px_idx'] + row['tradv'] + row['buy_idx'] + row['sell_idx']
+    return acc
+
+
+@njit
+def scan_packed(events):
+    acc = 0
+    for c_idx in range(len(events)):
+        event = events[c_idx]
+        acc += (event['time'] + event['action'] + event['side'] + event['px_idx'] + event['qty'] 
+                + event['buy_idx'] + event['sell_idx'])
+    return acc
+
+
+@njit
+def scan_columns(ev_time, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side):
+    acc = 0
+    for c_idx in range(len(ev_time)):
+        acc += (ev_time[c_idx] + ev_action[c_idx] + ev_side[c_idx] + ev_px_idx[c_idx] + ev_qty[c_idx] 
+                + ev_buy_idx[c_idx] + ev_sell_idx[c_idx])
+    return acc
+
+
+# %% replay kernels
+@njit
+def apply_event(action, side, px_idx, qty, buy_idx, sell_idx, qty_remain, lob_bid, lob_ask):
+    if action == Action.T.value:
+        qty_remain[buy_idx] -= qty
+        qty_remain[sell_idx] -= qty
+        lob_bid[px_idx] -= qty
+        lob_ask[px_idx] -= qty
+    else:
+        no_idx = buy_idx if side == Side.Bid.value else sell_idx
+        sign = 1 if action == Action.A.value else -1
+        qty_remain[no_idx] += sign * qty
+        if side == Side.Bid.value:
+            lob_bid[px_idx] += sign * qty
+        else:
+            lob_ask[px_idx] += sign * qty
+
+
+@njit
+def loop_indirect(data_type_arr, index_arr, time_arr, order_named_arr, trade_named_arr,
+                  qty_remain, lob_bid, lob_ask):
+    ts_sum = 0
+    for c_idx in range(len(data_type_arr)):
+        ts_sum += time_arr[c_idx]
+        idx = index_arr[c_idx]
+        if data_type_arr[c_idx] == DataType.Order.value:
+            row = order_named_arr[idx]
+            apply_event(row['OrderType'], row['Side'], row['px_idx'], row['OrderQty'],
+                        row['no_idx'], row['no_idx'], qty_remain, lob_bid, lob_ask)
+        else:
+            row = trade_named_arr[idx]
+            apply_event(Action.T.value, row['Side'], row['px_idx'], row['tradv'],
+                        row['buy_idx'], row['sell_idx'], qty_remain, lob_bid, lob_ask)
+    return ts_sum
+
+
+@njit
+def loop_packed(events, qty_remain, lob_bid, lob_ask):
+    ts_sum = 0
+    for c_idx in range(len(events)):
+        event = events[c_idx]
+        ts_sum += event['time']
+        apply_event(event['action'], event['side'], event['px_idx'], np.int64(event['qty']),
+                    event['buy_idx'], event['sell_idx'], qty_remain, lob_bid, lob_ask)
+    return ts_sum
+
+
+@njit
+def loop_columns(ev_time, ev_px_idx, ev_qty, ev_buy_idx, ev_sell_idx, ev_action, ev_side,
+                 qty_remain, lob_bid, lob_ask):
+    ts_sum = 0
+    for c_idx in range(len(ev_time)):
+        ts_sum += ev_time[c_idx]
+        apply_event(ev_action[c_idx], ev_side[c_idx], ev_px_idx[c_idx], np.int64(ev_qty[c_idx]),
+                    ev_buy_idx[c_idx], ev_sell_idx[c_idx], qty_remain, lob_bid, lob_ask)
+    return ts_sum
+
+
+# %% bench
+def timing(func, *args):
+    res = func(*args)  # 编译
+    cost = []
+    for _ in range(N_REPEAT):
+        t0 = time.perf_counter()
+        func(*args)
+        cost.append(time.perf_counter() - t0)
+    return res, min(cost)
+
+
+def report(name, cost, nbytes):
+    print(f'{name:>10}: {cost * 1e3:8.1f} ms  {N_EVENTS / cost / 1e6:6.1f} M events/sec  '
+          f'{nbytes / N_EVENTS:5.1f} bytes/event')
+
+
+def bench_scan(name, func, *args):
+    res, cost = timing(func, *args)
+    report(name, cost, sum(arr.nbytes for arr in args))
+    return res
+
+
+def bench_replay(name, func, *args):
+    qty_remain = np.zeros(N_ORDERS, dtype=np.int64)
+    lob_bid = np.zeros(N_LEVELS, dtype=np.int64)
+    lob_ask = np.zeros(N_LEVELS, dtype=np.int64)
+    _, cost = timing(func, *args, qty_remain, lob_bid, lob_ask)
+    report(name, cost, sum(arr.nbytes for arr in args))
+    # 各布局重复执行次数相同，结果应一致
+    return lob_bid.sum(), lob_ask.sum(), qty_remain.sum()
+
+
+if __name__ == '__main__':
+    events = make_events()
+    indirect_args = to_indirect(events)
+    packed = to_packed(events)
+    columns_args = [events[col] for col in ('time', 'px_idx', 'qty', 'buy_idx', 'sell_idx', 'action', 'side')]
+    
+    print('scan')
+    res = [bench_scan('indirect', scan_indirect, *indirect_args),
+           bench_scan('packed', scan_packed, packed),
+           bench_scan('columns', scan_columns, *columns_args)]
+    assert res[0] == res[1] == res[2]
+    
+    print('replay')
+    res = [bench_replay('indirect', loop_indirect, *indirect_args),
+           bench_replay('packed', loop_packed, packed),
+           bench_replay('columns', loop_columns, *columns_args)]
+    assert res[0] == res[1] == res[2]
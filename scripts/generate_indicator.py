@@ -36,7 +36,7 @@ from core.processor import *
 def main():
     '''read args'''
     parser = argparse.ArgumentParser(description='To initialize Processor.')
-    parser.add_argument('-indv', '--ind_ver_name', type=str, help='Indicator Version name')
+    parser.add_argument('-indv', '--ind_ver_name', type=str, help='Indicator Version name, comma separated for IndicatorProcessorByL2MultiVersion')
     parser.add_argument('-p', '--processor', type=str, help='Indicator Processor name')
     parser.add_argument('-sd', '--start_date', type=str, help='start_date')
     parser.add_argument('-ed', '--end_date', type=str, default=None, help='end_date')
@@ -13,11 +13,26 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 """
 # %% imports
 import numpy as np
-from numba import njit, types, prange
+from numba import types, prange
+
+
+from utils.speedutils import lazy_njit
 
 
 # %%
-@njit(types.int64[:](types.int64, types.int64[:]))
+@lazy_njit(types.boolean(types.int64[:]))
+def is_arrival_ordered(ts_arr):
+    """
+    挂单时间是否非降。有效订单默认按首次挂单顺序排列（见 GoThroughBook._get_orderno_by_arrival），
+    此时“最近 N 分钟内的挂单”为后缀，可用 searchsorted 定位；price_sorted_views / resting_views 下不成立。
+    """
+    for i in range(1, len(ts_arr)):
+        if ts_arr[i] < ts_arr[i-1]:
+            return False
+    return True
+
+
+@lazy_njit(types.int64[:](types.int64, types.int64[:]))
 def get_residue_time(ts, ts_arr):
     """
     计算挂单剩余时间，考虑中午非交易时段，使用numba加速和向量化。
@@ -33,10 +48,29 @@ def get_residue_time(ts, ts_arr):
     MORNING_END = 11 * 60 + 30  # 上午结束时间：11:30，单位分钟
     AFTERNOON_START = 13 * 60  # 下午开始时间：13:00，单位分钟
     NON_TRADING_INTERVAL = 90 * 60 * 1000  # 非交易时段90分钟，单位毫秒
+    DAY_MS = 1440 * 60000
+
+    current_time_minutes = (ts // 60000) % 1440
+    
+    # 挂单时间非降时有效数据（0 < ts_arr <= ts）为连续区间 [lo, hi)，
+    # 同一自然日内需扣除午休的上午挂单为其前缀 [lo, mid)，按区间计算，不再逐个打标记
+    if is_arrival_ordered(ts_arr):
+        residual_time = np.zeros_like(ts_arr, dtype=np.int64)
+        lo = np.searchsorted(ts_arr, 0, side='right')
+        hi = np.searchsorted(ts_arr, ts, side='right')
+        if lo >= hi:
+            return residual_time
+        if ts_arr[lo] // DAY_MS == ts_arr[hi-1] // DAY_MS:
+            mid = lo
+            if current_time_minutes >= AFTERNOON_START:
+                noon_ts = ts_arr[lo] - ts_arr[lo] % DAY_MS + (MORNING_END + 1) * 60000
+                mid = lo + np.searchsorted(ts_arr[lo:hi], noon_ts, side='left')
+            residual_time[lo:mid] = np.maximum(0, ts - ts_arr[lo:mid] - NON_TRADING_INTERVAL)
+            residual_time[mid:hi] = ts - ts_arr[mid:hi]
+            return residual_time
 
     # 转换时间戳为分钟单位
     on_time_minutes = (ts_arr // 60000) % 1440
-    current_time_minutes = (ts // 60000) % 1440
 
     # 计算初始时间差
     time_differences = ts - ts_arr
@@ -64,7 +98,7 @@ def get_residue_time(ts, ts_arr):
     return residual_time
 
 
-@njit(types.float64(types.float64, types.float64))
+@lazy_njit(types.float64(types.float64, types.float64))
 def safe_divide(a, b):
     try:
         return a / b
@@ -72,7 +106,7 @@ def safe_divide(a, b):
         return np.nan
    
     
-@njit(types.float64[:](types.float64[:], types.float64[:]))
+@lazy_njit(types.float64[:](types.float64[:], types.float64[:]))
 def safe_divide_arrays(arr1, arr2):
     # 初始化结果数组，类型为浮点数，以支持 np.nan
     result = np.empty_like(arr1, dtype=np.float64)
@@ -88,7 +122,7 @@ def safe_divide_arrays(arr1, arr2):
     return result
 
 
-@njit(types.float64[:](types.float64[:], types.float64))
+@lazy_njit(types.float64[:](types.float64[:], types.float64))
 def safe_divide_array_by_scalar(arr, scalar):
     # 初始化结果数组，类型为浮点数，以支持 np.nan
     result = np.empty_like(arr, dtype=np.float64)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 10:12:31 2026
+
+@author: Xintang Zheng
+
+星星: ★ ☆ ✪ ✩ 🌟 ⭐ ✨ 🌠 💫 ⭐️
+勾勾叉叉: ✓ ✔ ✕ ✖ ✅ ❎
+报警啦: ⚠ ⓘ ℹ ☣
+箭头: ➔ ➜ ➙ ➤ ➥ ↩ ↪
+emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵 🎶 🧭 📅 🤔 🧮 🔢 📊 📈 📉 🧠 📝
+
+"""
+# %% imports
+import numpy as np
+
+
+# %%
+def map_to_dense_idx(values, keys):
+    """
+    将 values 向量化映射为其在 keys 中的位置，替代逐个插入的 numba typed.Dict。
+    
+    :param values: 待映射的数组（如 OrderNo / buyno / sellno / 价格）
+    :param keys: 唯一键数组，无需有序
+    :return: int32 数组，values[i] 在 keys 中的下标，不存在的记为 -1
+    """
+    values = np.asarray(values)
+    if len(keys) == 0:
+        return np.full(len(values), -1, dtype=np.int32)
+    sorter = np.argsort(keys, kind='stable')
+    pos = np.searchsorted(keys, values, sorter=sorter)
+    idx = sorter[np.minimum(pos, len(keys) - 1)]
+    found = keys[idx] == values
+    return np.where(found, idx, -1).astype(np.int32)
@@ -12,7 +12,13 @@ emoji: 🔔 ⏳ ⏰ 🔒 🔓 🛑 🚫 ❗ ❓ ❌ ⭕ 🚀 🔥 💧 💡 🎵
 
 """
 # %% imports
+import os
+import sys
 import time
+import hashlib
+from pathlib import Path
+from numba import njit
+from numba.core.registry import CPUDispatcher
 
 
 # %%
@@ -24,4 +30,81 @@ def timeit(func):
         end_time = time.time()  # 记录函数结束时间
         print(f"{func.__name__} ran in {end_time - start_time:.10f} seconds")
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+# %% lazy jit
+def lazy_njit(*signatures, **kwargs):
+    """
+    与 njit(signature) 写法相同，但 import 时不编译：只记录签名，由 compile_lazy 按需编译。
+    默认 cache=True，编译结果落盘，重复运行与新起的 worker 直接从缓存加载。
+    被其它 njit 函数调用的辅助函数无需 compile_lazy，会随调用方一起编译。
+    numba 的磁盘缓存只检查 kernel 自身所在文件，compile_lazy 另对 kernel（逐层）调用的 njit 辅助函数所在文件
+    计算摘要，摘要变化即清空该 kernel 的缓存，改动辅助函数后不会加载旧的编译结果；
+    未经 compile_lazy 直接调用时不做此校验。
+    """
+    kwargs.setdefault('cache', True)
+    
+    def decorator(func):
+        dispatcher = njit(**kwargs)(func)
+        dispatcher.lazy_signatures = signatures
+        return dispatcher
+    return decorator
+
+
+def get_dependency_files(dispatcher):
+    """kernel 直接或经其它辅助函数间接调用的 njit 函数所在的源文件（含 kernel 自身）"""
+    files = set()
+    seen = set()
+    stack = [dispatcher]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        py_func = current.py_func
+        files.add(Path(sys.modules[py_func.__module__].__file__).resolve())
+        stack.extend(value for value in py_func.__globals__.values() 
+                     if isinstance(value, CPUDispatcher) and value.py_func.__name__ in py_func.__code__.co_names)
+    return sorted(files)
+
+
+def get_dependency_digest(dispatcher):
+    digest = hashlib.sha1()
+    for file in get_dependency_files(dispatcher):
+        digest.update(str(file).encode('utf-8'))
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def get_cache_hook(dispatcher):
+    """numba 缓存的 cache_path / flush 接口（numba.core.caching._Cache），缺失时报错而非静默跳过校验"""
+    cache = getattr(dispatcher, '_cache', None)
+    if not (hasattr(cache, 'cache_path') and callable(getattr(cache, 'flush', None))):
+        raise RuntimeError(f'{dispatcher.py_func.__qualname__}: numba cache interface not found, '
+                           'cannot check helper changes for the on-disk cache')
+    return cache
+
+
+def compile_lazy(dispatcher):
+    """按声明的签名编译（命中缓存则直接加载），之后与 njit(signature) 一样不再按新类型编译"""
+    signatures = getattr(dispatcher, 'lazy_signatures', ())
+    if signatures and not getattr(dispatcher, 'lazy_compiled', False):
+        cache = get_cache_hook(dispatcher)
+        stamp_path = None
+        if cache.cache_path is not None:
+            # 依赖摘要记在缓存目录下的旁路文件中，与上次编译时不同则先清空该 kernel 的缓存
+            py_func = dispatcher.py_func
+            stamp_path = Path(cache.cache_path) / f'{py_func.__module__}.{py_func.__qualname__}.deps'
+            digest = get_dependency_digest(dispatcher)
+            if not stamp_path.exists() or stamp_path.read_text() != digest:
+                cache.flush()
+        for signature in signatures:
+            dispatcher.compile(signature)
+        dispatcher.disable_compile()
+        dispatcher.lazy_compiled = True
+        if stamp_path is not None:
+            # 多进程可能同时写入：先写临时文件再原子替换
+            tmp_path = stamp_path.with_name(f'{stamp_path.name}.{os.getpid()}.tmp')
+            tmp_path.write_text(digest)
+            os.replace(tmp_path, stamp_path)
+    return dispatcher